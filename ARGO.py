@@ -3,8 +3,8 @@
 #
 
 import os
-import requests
-import json
+
+from argo_transport import default_transport
 
 MODEL_GPT35 = "gpt35"
 MODEL_GPT4 = "gpt4"
@@ -18,21 +18,33 @@ class ArgoWrapper:
                  system = "",
                  temperature = 0.8, 
                  top_p=0.7, 
-                 user = os.getenv("USER"))-> None:
+                 user = os.getenv("USER"),
+                 transport = None,
+                 cache = None,
+                 semantic_cache = None,
+                 stream_url = None)-> None:
         self.url = url
         if self.url is None:
             self.url = ArgoWrapper.default_url
+        # Endpoint used by stream/astream; a non-streaming endpoint still
+        # works, its reply is then delivered in chunks once it arrives.
+        self.stream_url = self.url if stream_url is None else stream_url
         self.model = model
         self.temperature = temperature
         self.top_p = top_p
         self.user = user
         self.system = ""
+        self.transport = transport
+        if self.transport is None:
+            self.transport = default_transport()
+        # Optional argo_cache.ResponseCache; only deterministic calls use it
+        # unless the cache was created with force=True.
+        self.cache = cache
+        # Optional semantic_cache.SemanticCache for near-duplicate prompts
+        self.semantic_cache = semantic_cache
 
-    def invoke(self, prompt: str):
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = {
+    def _payload(self, prompt: str):
+        return {
                 "user": self.user,
                 "model": self.model,
                 "system": self.system,
@@ -41,13 +53,26 @@ class ArgoWrapper:
                 "temperature": self.temperature,
                 "top_p": self.top_p
         }
-            
-        data_json = json.dumps(data)    
-        response = requests.post(self.url, headers=headers, data=data_json)
-
-        if response.status_code == 200:
-            parsed = json.loads(response.text)
-            return parsed
-        else:
-            raise Exception(f"Request failed with status code: {response.status_code}")
-    
\ No newline at end of file
+
+    def invoke(self, prompt: str):
+        return self.transport.request(self.url, self._payload(prompt),
+                                      cache=self.cache,
+                                      semantic_cache=self.semantic_cache)
+
+    async def ainvoke(self, prompt: str):
+        # Concurrency is bounded by the transport's max_in_flight semaphore
+        return await self.transport.arequest(self.url, self._payload(prompt),
+                                             cache=self.cache,
+                                             semantic_cache=self.semantic_cache)
+
+    def stream(self, prompt: str, chunk_size: int = 64):
+        """Yield the reply text in pieces as it arrives."""
+        return self.transport.stream(self.stream_url, self._payload(prompt), chunk_size,
+                                     cache=self.cache,
+                                     semantic_cache=self.semantic_cache)
+
+    def astream(self, prompt: str, chunk_size: int = 64):
+        """Async generator counterpart of stream."""
+        return self.transport.astream(self.stream_url, self._payload(prompt), chunk_size,
+                                      cache=self.cache,
+                                      semantic_cache=self.semantic_cache)
@@ -1,11 +1,17 @@
-from typing import Any, List, Mapping, Optional
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from typing import Any, AsyncIterator, Iterator, List, Mapping, Optional
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
 from langchain_core.language_models.llms import LLM
-import requests
-import json
+from langchain_core.outputs import GenerationChunk
 import os
 from pydantic import Field
 
+from argo_cache import ResponseCache
+from argo_transport import ArgoTransport, default_transport
+from semantic_cache import SemanticCache
+
 from enum import Enum
 
 class ModelType(Enum):
@@ -16,10 +22,14 @@ class ArgoLLM(LLM):
 
     model_type: ModelType = ModelType.GPT35
     url: str = "https://apps-dev.inside.anl.gov/argoapi/api/v1/resource/chat/"
+    stream_url: Optional[str] = None
     temperature: Optional[float] = 0.8
     system: Optional[str]
     top_p: Optional[float]= 0.7
     user: str = os.getenv("USER")
+    transport: Optional[ArgoTransport] = None
+    response_cache: Optional[ResponseCache] = None
+    semantic_cache: Optional[SemanticCache] = None
     
     @property
     def _llm_type(self) -> str:
@@ -33,25 +43,75 @@ class ArgoLLM(LLM):
         **kwargs: Any,
     ) -> str:
 
-        headers = {
-            "Content-Type": "application/json"
-        }
-        params = {
+        params = self._params(prompt, **kwargs)
+        parsed = self._transport.request(self.url, params,
+                                         cache=self.response_cache,
+                                         semantic_cache=self.semantic_cache)
+        return parsed['response']
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+
+        params = self._params(prompt, **kwargs)
+        parsed = await self._transport.arequest(self.url, params,
+                                                cache=self.response_cache,
+                                                semantic_cache=self.semantic_cache)
+        return parsed['response']
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+
+        params = self._params(prompt, **kwargs)
+        for text in self._transport.stream(self._stream_url, params,
+                                           cache=self.response_cache,
+                                           semantic_cache=self.semantic_cache):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+
+        params = self._params(prompt, **kwargs)
+        async for text in self._transport.astream(self._stream_url, params,
+                                                  cache=self.response_cache,
+                                                  semantic_cache=self.semantic_cache):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    @property
+    def _stream_url(self) -> str:
+        return self.url if self.stream_url is None else self.stream_url
+
+    def _params(self, prompt: str, **kwargs: Any):
+        return {
             **self._get_model_default_parameters,
             **kwargs,
             "prompt": [prompt],
             "stop": []
         }
 
-        params_json = json.dumps(params);
-        print(params_json)
-        response = requests.post(self.url, headers=headers, data=params_json)
-
-        if response.status_code == 200:
-            parsed = json.loads(response.text)
-            return parsed['response']
-        else:
-            raise Exception(f"Request failed with status code: {response.status_code} {response.text}")
+    @property
+    def _transport(self) -> ArgoTransport:
+        return default_transport() if self.transport is None else self.transport
 
     @property
     def _get_model_default_parameters(self):
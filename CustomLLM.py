@@ -1,13 +1,20 @@
-from typing import Any, List, Mapping, Optional
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from typing import Any, AsyncIterator, Iterator, List, Mapping, Optional
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
 from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
 import requests
 import json
+import tracing
 from ARGO import ArgoWrapper
 
 
 # The ARGO_LLM class. Uses the _invoke_model helper function.
-# It implements the _call function.
+# It implements the _call function, _acall for the asyncio paths
+# (ainvoke, abatch), and _stream/_astream for token streaming.
+# Calls are traced by the transport (see tracing.py) instead of printed.
 
 
 class ARGO_LLM(LLM):
@@ -26,13 +33,52 @@ class ARGO_LLM(LLM):
         **kwargs: Any,
     ) -> str:
         if stop is not None:
-            print(f"STOP={stop}")
+            # stop sequences are not sent to Argo
+            tracing.count("llm.stop_ignored")
             # raise ValueError("stop kwargs are not permitted.")
 
-        response = self.argo.invoke(prompt)       
-        print(f"ARGO Response: {response['response']}\nEND ARGO RESPONSE")
+        response = self.argo.invoke(prompt)
         return response['response']
 
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        if stop is not None:
+            tracing.count("llm.stop_ignored")
+
+        response = await self.argo.ainvoke(prompt)
+        return response['response']
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for text in self.argo.stream(prompt):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        async for text in self.argo.astream(prompt):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
         """Get the identifying parameters."""
@@ -12,23 +12,155 @@
 #   http://www.apache.org/licenses/LICENSE-2.0 
 # END: License 
 
+# As a clean/smudge filter git starts an interpreter for every file:
+#   git config filter.localize.clean  "gitTools/localize.py clean <local>"
+#   git config filter.localize.smudge "gitTools/localize.py smudge <local>"
+# As a long running filter one interpreter serves all files over git's pkt-line
+# filter protocol (see gitattributes(5), "Long Running Filter Process"):
+#   git config filter.localize.process "gitTools/localize.py process <local>"
+
 import sys
 import argparse
 
-parser = argparse.ArgumentParser(description="localize: clean and smudge filter.")
-parser.add_argument("mode", nargs=1, choices=['clean', 'smudge'], help='The mode of the localization.')
-parser.add_argument("local", nargs=1, help='The top level directory of the git repository.')
+REMOTE = b'https://raw.githubusercontent.com/NSSAC/EpiHiper-Schema/master'
+CHUNK_SIZE = 65536
+MAX_PACKET_DATA = 65516
+
+class Replacer:
+    """Replace old by new in a byte stream fed in arbitrary chunks.
+
+    Up to len(old) - 1 bytes are held back after each chunk, since they
+    may be the start of a match completed by the next chunk.
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.pending = b''
+
+    def feed(self, chunk):
+        buffer = self.pending + chunk
+        cut = len(buffer) - (len(self.old) - 1)
+        out = []
+        position = 0
+        while True:
+            found = buffer.find(self.old, position)
+            if found < 0 or found >= cut:
+                break
+            out.append(buffer[position:found])
+            out.append(self.new)
+            position = found + len(self.old)
+        end = max(position, cut)
+        out.append(buffer[position:end])
+        self.pending = buffer[end:]
+        return b''.join(out)
+
+    def finish(self):
+        rest, self.pending = self.pending, b''
+        return rest
 
-arguments = parser.parse_args()
-mode = arguments.mode[0]
-local = arguments.local[0]
+def replace_stream(source, target, old, new):
+    replacer = Replacer(old, new)
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        target.write(replacer.feed(chunk))
+    target.write(replacer.finish())
+    target.flush()
 
 def clean(local):
-    for line in sys.stdin:
-        sys.stdout.write(line.replace(local, 'https://raw.githubusercontent.com/NSSAC/EpiHiper-Schema/master'))
-    
+    replace_stream(sys.stdin.buffer, sys.stdout.buffer, local.encode(), REMOTE)
+
 def smudge(local):
-    for line in sys.stdin:
-        sys.stdout.write(line.replace('https://raw.githubusercontent.com/NSSAC/EpiHiper-Schema/master', local))
-    
-{'clean': clean, 'smudge': smudge}[mode](local)
+    replace_stream(sys.stdin.buffer, sys.stdout.buffer, REMOTE, local.encode())
+
+# pkt-line: a 4 digit hex length (including itself) and data; "0000" is a flush.
+
+def read_packet(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        raise EOFError
+    length = int(header, 16)
+    if length == 0:
+        return None
+    data = stream.read(length - 4)
+    if len(data) < length - 4:
+        raise EOFError
+    return data
+
+def read_text_list(stream):
+    """Text packets up to the next flush, or None at end of input."""
+    try:
+        packet = read_packet(stream)
+    except EOFError:
+        return None
+    lines = []
+    while packet is not None:
+        lines.append(packet.rstrip(b'\n').decode())
+        packet = read_packet(stream)
+    return lines
+
+def write_packet(stream, data):
+    stream.write(b'%04x' % (len(data) + 4))
+    stream.write(data)
+
+def write_text(stream, *lines):
+    for line in lines:
+        write_packet(stream, line.encode() + b'\n')
+    stream.write(b'0000')
+
+def write_content(stream, data):
+    for start in range(0, len(data), MAX_PACKET_DATA):
+        write_packet(stream, data[start:start + MAX_PACKET_DATA])
+    stream.write(b'0000')
+
+def process(local):
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    replacements = {'clean': (local.encode(), REMOTE), 'smudge': (REMOTE, local.encode())}
+
+    welcome = read_text_list(stdin)
+    if not welcome or welcome[0] != 'git-filter-client' or 'version=2' not in welcome[1:]:
+        sys.exit('localize: unexpected filter handshake %r' % welcome)
+    write_text(stdout, 'git-filter-server', 'version=2')
+    capabilities = read_text_list(stdin) or []
+    write_text(stdout, *['capability=' + command for command in replacements
+                         if 'capability=' + command in capabilities])
+    stdout.flush()
+
+    while True:
+        headers = read_text_list(stdin)
+        if headers is None:
+            return
+        request = dict(line.split('=', 1) for line in headers if '=' in line)
+
+        # Git sends the whole content before it reads the response, so the
+        # content is read (and replaced chunk by chunk) before answering.
+        replacement = replacements.get(request.get('command'))
+        replacer = Replacer(*replacement) if replacement else None
+        out = []
+        packet = read_packet(stdin)
+        while packet is not None:
+            if replacer:
+                out.append(replacer.feed(packet))
+            packet = read_packet(stdin)
+
+        if replacer is None:
+            write_text(stdout, 'status=error')
+        else:
+            out.append(replacer.finish())
+            write_text(stdout, 'status=success')
+            write_content(stdout, b''.join(out))
+            write_text(stdout)
+        stdout.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="localize: clean and smudge filter.")
+    parser.add_argument("mode", nargs=1, choices=['clean', 'smudge', 'process'], help='The mode of the localization.')
+    parser.add_argument("local", nargs=1, help='The top level directory of the git repository.')
+
+    arguments = parser.parse_args()
+    mode = arguments.mode[0]
+    local = arguments.local[0]
+
+    {'clean': clean, 'smudge': smudge, 'process': process}[mode](local)
@@ -36,22 +36,21 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 
 from ARGO import ArgoWrapper
+from schema_context import SchemaContextBuilder
+from schema_registry import default_registry
 
 wrapper = ArgoWrapper()
 client = ARGO_LLM(argo = wrapper)
 
 # client = ARGO_LLM() #OpenAI()
 
-from langchain_community.tools import DuckDuckGoSearchRun
-duck_search_tool = DuckDuckGoSearchRun()
+# DuckDuckGo, PubMed and Semantic Scholar are searched concurrently in one tool
+# call; results are merged by DOI/PMID/URL and cached under ~/.cache/search
+from federated_search import FederatedSearch, LiteratureSearchTool
+literature_search = FederatedSearch(max_results=5)
+search_tool = LiteratureSearchTool(search=literature_search)
 
-from langchain_community.tools.pubmed.tool import PubmedQueryRun
-pubmed_tool = PubmedQueryRun()
-
-from langchain_community.tools.semanticscholar.tool import SemanticScholarQueryRun
-scholar_tool = SemanticScholarQueryRun()
-
-search_tools = [duck_search_tool,pubmed_tool,scholar_tool]
+search_tools = [search_tool]
 
 import zipfile
 from langchain_community.document_loaders import DirectoryLoader
@@ -59,32 +58,9 @@ import glob
 import unstructured
 import os
 
-# Step 1: Absolute path (replace with the actual absolute path)
-absolute_path = './EpiHiper-Schema-master/'
-
-# Step 2: Check if the directory exists
-if not os.path.exists(absolute_path):
-    print(f"Directory does not exist: {absolute_path}")
-else:
-    print(f"Directory exists: {absolute_path}")
-
-    # Step 3: Manually list files
-    file_paths = glob.glob(absolute_path + '/**/*.*', recursive=True)
-    print(f"Manually found {len(file_paths)} files:")
-    #for file_path in file_paths:
-    #    print(file_path)
-    file_contents_dict={}
-    for file_path in file_paths:
-        try:
-            filename = os.path.basename(file_path)
-            with open(file_path, 'r') as file_pt:
-                content = file_pt.read()
-            if filename in file_contents_dict:
-                file_contents_dict[filename] += '\n' + content
-            else:
-                file_contents_dict[filename] = content
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
+# Schema files are indexed once (cached under ~/.cache/epihiper) and parsed on first use
+schema_registry = default_registry()
+print(f"EpiHiper schema files: {len(schema_registry.files())}, definitions: {len(schema_registry.definitions)}")
 
 #loader2 = DirectoryLoader('./EpiHiper-Schema-master/', glob="**/*.*", show_progress=True)
 #abm_codes = loader2.load()
@@ -95,8 +71,7 @@ else:
 #vectorstore = Chroma.from_documents(documents=abm_codes, embedding=OpenAIEmbeddings())
 #ABM_retriever = vectorstore.as_retriever()
 
-disease_model_schema = file_contents_dict['diseaseModelSchema.json']
-disease_model_rules = file_contents_dict['diseaseModelRules.json']
+disease_model_rules = schema_registry.text('diseaseModelRules.json')
 
 
 # In[20]:
@@ -172,15 +147,13 @@ query_executor = Agent(
 
         Primary Objectives:
         1. Identify the type of information that is needed. Scientific knowledge or general knowledge.
-        2. Use the appropriate tool. Scientific information can be searched using either Pubmed or Semantic Scholar.
-        General knowledge can be searched using a DuckDuckGo web search.
+        2. Use the literature_search tool. It searches a DuckDuckGo web search, Pubmed and
+        Semantic Scholar at the same time and returns one merged list of results.
         3. Determine if the information found answers the question.
-        4. If not, then search again using a different tool.
+        4. If not, then search again with a rephrased query.
 
         The list of tools are:
-        -duck_search_tool which is called by DuckDuckGoSearchRun()
-        -pubmed_tool which is called by PubmedQueryRun()
-        -scholar_tool which is called by SemanticScholarQueryRun()
+        -literature_search which is called by LiteratureSearchTool()
     """,
     goal=textwrap.dedent("""
         To efficiently retrieve, analyze, and synthesize information from diverse sources to answer 
@@ -239,6 +212,12 @@ param_executor = Agent(
 
 user_query = "Model the current flavivirus outbreak using an agent based model"
 
+# Only the schema fragments relevant to the query, with their typeRegistry.json
+# types resolved, go into the prompt instead of the whole schema file
+disease_model_schema, schema_report = SchemaContextBuilder(schema_registry).build('diseaseModelSchema.json', user_query)
+print(f"diseaseModelSchema context: {schema_report['tokens_before']} tokens as pasted, "
+      f"{schema_report['tokens_after']} selected")
+
 task1 = Task(
     description=textwrap.dedent(f"""
         Your task is to go through a json file in the agent-based model code base understand
@@ -264,8 +243,7 @@ task2 = Task(
     agent=query_executor
 )
 
-task3 = Task(
-    description=textwrap.dedent(f"""
+review_instructions = textwrap.dedent(f"""
         You will recieve a set of queries and information from the previous task. You will:
         1. Examine the information, critique it, and decide if the numbers are numerically reasonable 
         in light of the data provided for the meta-analysis.
@@ -277,25 +255,54 @@ task3 = Task(
         provided.
         Your final answer must a range of values for all the parameters extracted from the original
         JSON file.
-    """),
-    agent=PRISMA_expert
-)
+    """)
 
 
 # In[22]:
 
 
-crew = Crew(
-    agents=[param_executor,PRISMA_expert,query_executor],
-    tasks=[task1,task2,task3],
+# task1 -> (one branch per parameter, in parallel) -> task3. The sub-questions
+# from task1 are answered concurrently (task_dag.py) and joined before the
+# PRISMA_expert review, so this step takes as long as the slowest parameter.
+# If no sub-questions can be parsed, task2 runs as before.
+from task_dag import parse_subquestions, answer_subquestions
+
+dag_workers = int(os.getenv("PRISMA_WORKERS", "8"))
+
+plan = str(Crew(
+    agents=[param_executor],
+    tasks=[task1],
     verbose=2,  # print what tasks are being worked on, can set it to 1 or 2
     process=Process.sequential,
+).kickoff())
+
+branches = parse_subquestions(plan)
+if branches:
+    print(f"Answering {sum(len(b.questions) for b in branches)} sub-questions for "
+          f"{len(branches)} parameters with {dag_workers} workers")
+    answers, dag = answer_subquestions(branches, llm, search=literature_search,
+                                       workers=dag_workers, context=user_query)
+    print(f"sub-question DAG: {dag.stats()}")
+else:
+    task2.description += "\n" + plan
+    answers = str(Crew(agents=[query_executor], tasks=[task2], verbose=2,
+                       process=Process.sequential).kickoff())
+
+task3 = Task(
+    description=review_instructions + "\nThe information from the previous task:\n" + answers,
+    agent=PRISMA_expert
 )
 
-result = crew.kickoff()
+result = Crew(
+    agents=[PRISMA_expert],
+    tasks=[task3],
+    verbose=2,
+    process=Process.sequential,
+).kickoff()
 
 print("######################")
 print(result)
+print(f"literature search: {literature_search.stats()}")
 
 
 # In[ ]:
@@ -1,11 +1,19 @@
 import datetime
 import time
 
-def _print(txt="HERE", last_time=time.time()):
+# New code should use tracing.span(); _print is kept for the notebooks.
+
+_last_time = time.time()
+
+def _print(txt="HERE", last_time=None):
+    """Print the time since last_time (default: the previous _print call)."""
+    global _last_time
     this_time = time.time()
+    if last_time is None:
+        last_time = _last_time
     print("{}\t{}\t{}".format(datetime.datetime.now(),
                               this_time-last_time,
                               txt)
          )
-    return time.time()
-
+    _last_time = time.time()
+    return _last_time
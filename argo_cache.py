@@ -0,0 +1,146 @@
+#
+# Persistent response cache for the Argo LLM wrappers
+#
+# Replies are stored in a local SQLite file keyed by a hash of the canonical
+# request payload, so re-running the same deterministic prompt (PRISMA_test
+# reruns, notebook re-executions, eval sweeps) does not go back to Argo.
+# The file is bounded in size (least recently used entries go first) and
+# entries older than ttl seconds are treated as misses.
+#
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "argo", "responses.sqlite")
+
+
+def request_key(url, payload):
+    """Hash of the canonical JSON form of url and payload."""
+    canonical = json.dumps([url, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LRU/TTL cache of parsed Argo replies.
+
+    By default only deterministic calls (temperature 0) are cached; pass
+    force=True to cache every call regardless of sampling parameters.
+    """
+
+    def __init__(self,
+                 path=DEFAULT_PATH,
+                 max_bytes=256 * 1024 * 1024,
+                 ttl=30 * 24 * 3600,
+                 force=False) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         "key TEXT PRIMARY KEY, value BLOB, size INTEGER, "
+                         "created REAL, accessed REAL, latency REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._total = self._sum_sizes()
+
+    def applies(self, payload):
+        """True if a call with this payload may be served from the cache."""
+        return self.force or payload.get("temperature") == 0
+
+    def get(self, url, payload):
+        """Return the cached reply for this request, or None."""
+        key = request_key(url, payload)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, size, created, latency FROM entries WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total -= row[1]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.bytes_read += row[1]
+            self.saved_latency += row[3] or 0.0
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, payload, reply, latency=0.0):
+        """Store reply; latency is what the upstream call took, for stats."""
+        key = request_key(url, payload)
+        value = zlib.compress(json.dumps(reply).encode("utf-8"), 1)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, value, len(value), now, now, latency))
+            self._total += len(value) - (old[0] if old else 0)
+            self.bytes_written += len(value)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _sum_sizes(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        # Other processes may share the file, so start from the real total.
+        self._total = self._sum_sizes()
+        if self.ttl is not None:
+            cur = self._db.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += cur.rowcount
+        self._total = self._sum_sizes()
+        if self._total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "evictions": self.evictions,
+            "saved_latency": self.saved_latency,
+            "entries": entries,
+            "bytes": self._total,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,386 @@
+#
+# Client-side rate limiting and adaptive concurrency for the Argo endpoint
+#
+# Each model gets a token bucket (requests per second with a burst) and an
+# AIMD concurrency limit: the limit grows by about one every round trip
+# while replies are healthy (by one per reply, doubling every round trip,
+# until the first overload), and is cut multiplicatively on 429/5xx,
+# connection failures, or a latency well above the running baseline. Callers
+# beyond the limit queue instead of piling more load onto a struggling
+# service.
+#
+# The request rate adapts too. By default a model is not paced at all until
+# the service pushes back: once 429/5xx replies make up 10% of the last few
+# seconds' calls, the rate is set to half the recent throughput and a
+# Retry-After header pauses the bucket for that long. Healthy replies then
+# raise the rate by about 10% a second. Once the rate is well above what
+# callers actually use, pacing is switched off again. A rate given in the
+# limits is the starting rate and the ceiling.
+#
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+# model: (rate per second or None for unpaced, burst, initial concurrency,
+# max concurrency)
+DEFAULT_LIMITS = {
+    "gpt35": (None, 20, 8, 64),
+    "gpt4": (None, 5, 2, 16),
+}
+FALLBACK_LIMITS = (None, 10, 4, 32)
+
+OVERLOAD_STATUS = frozenset([429, 500, 502, 503, 504])
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() sleeps until a token is available.
+
+    A rate of None lets every call through (only pause() holds them back).
+    """
+
+    def __init__(self, rate, burst) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is None:
+            self._tokens = float(self.burst)
+        else:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _reserve(self):
+        # Take a token now, possibly going negative, and return how long
+        # the caller has to wait for it to have been earned.
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            pause = max(0.0, self._paused_until - now)
+            if self.rate is None:
+                return pause
+            self._tokens -= 1
+            return max(pause, 0.0 if self._tokens >= 0 else -self._tokens / self.rate)
+
+    def set_rate(self, rate):
+        """Change the rate (None: unpaced), keeping the tokens earned so far."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if rate is not None and self.rate is None:
+                # Start pacing from an empty bucket, or the burst goes out at once.
+                self._tokens = 0.0
+            self.rate = rate
+
+    def pause(self, seconds):
+        """Hold every call back for seconds from now (e.g. Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            if self.rate is None:
+                return float(self.burst)
+            elapsed = time.monotonic() - self._stamp
+            return min(self.burst, self._tokens + elapsed * self.rate)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency gate shared by threads and asyncio tasks."""
+
+    def __init__(self,
+                 initial=4,
+                 min_limit=1,
+                 max_limit=64,
+                 decrease=0.5,
+                 latency_tolerance=3.0,
+                 smoothing=0.05) -> None:
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline = None
+        self.in_flight = 0
+        self.queued = 0
+        self.successes = 0
+        self.overloads = 0
+        self._last_decrease = 0.0
+        # Grow by one per success, like TCP slow start, until the first overload.
+        self.slow_start = True
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    def _try_acquire(self):
+        if self.in_flight < max(self.min_limit, int(self.limit)):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._cond:
+            if self._try_acquire():
+                return
+            self.queued += 1
+            try:
+                while not self._try_acquire():
+                    self._cond.wait()
+            finally:
+                self.queued -= 1
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._try_acquire():
+                return
+            self.queued += 1
+        try:
+            while True:
+                future = loop.create_future()
+                with self._cond:
+                    if self._try_acquire():
+                        return
+                    self._async_waiters.append((loop, future))
+                try:
+                    # The timeout covers a release racing the append above.
+                    await asyncio.wait_for(future, 0.5)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self.queued -= 1
+
+    def release(self, latency=None, overloaded=False):
+        """Free a slot and feed the outcome of the call into the limit."""
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded or self._too_slow(latency):
+                self._on_overload()
+            elif latency is not None:
+                self._on_success(latency)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _too_slow(self, latency):
+        return (latency is not None and self.baseline is not None
+                and latency > self.baseline * self.latency_tolerance)
+
+    def _on_success(self, latency):
+        self.successes += 1
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += self.smoothing * (latency - self.baseline)
+        step = 1.0 if self.slow_start else 1.0 / self.limit
+        self.limit = min(self.max_limit, self.limit + step)
+
+    def _on_overload(self):
+        self.overloads += 1
+        self.slow_start = False
+        # Cut at most once per baseline round trip so that one burst of
+        # failures does not collapse the limit to the floor.
+        now = time.monotonic()
+        if now - self._last_decrease < (self.baseline or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+
+
+def _seconds(retry_after):
+    # Only the delta-seconds form of Retry-After; an HTTP date is ignored.
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return None
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Outcomes:
+    """Completions and overloads over the last `window` seconds."""
+
+    def __init__(self, window=5.0) -> None:
+        self.window = window
+        self._events = deque()      # (time, overloaded)
+        self._overloads = 0
+
+    def add(self, overloaded, now):
+        self._events.append((now, overloaded))
+        self._overloads += overloaded
+        while now - self._events[0][0] > self.window:
+            self._overloads -= self._events.popleft()[1]
+
+    def overload_fraction(self):
+        return self._overloads / len(self._events) if self._events else 0.0
+
+    def throughput(self, now):
+        """Successful completions per second."""
+        if not self._events:
+            return 0.0
+        # At least one second of history, so a burst at start-up is not a rate.
+        span = max(1.0, min(self.window, now - self._events[0][0]))
+        return (len(self._events) - self._overloads) / span
+
+
+class AdaptiveRate:
+    """Drives a TokenBucket's rate from the outcome of calls.
+
+    A cut sets the rate to `decrease` times the current rate or, when
+    unpaced, times the recent throughput. Successes raise it by `increase`
+    (a fraction) per second, at least min_step requests per second per
+    second. At max_rate, or for an unlimited ceiling when the rate is twice
+    the recent throughput, pacing stops.
+    """
+
+    def __init__(self,
+                 bucket,
+                 max_rate=None,
+                 min_rate=0.5,
+                 decrease=0.5,
+                 increase=0.1,
+                 min_step=1.0) -> None:
+        self.bucket = bucket
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.min_step = min_step
+        self.cuts = 0
+        self._last_cut = 0.0
+
+    def on_success(self, throughput):
+        rate = self.bucket.rate
+        if rate is None:
+            return
+        # Per success, so that the rate grows by `increase` per second.
+        rate += max(self.min_step, self.increase * rate) / rate
+        if self.max_rate is not None:
+            rate = min(rate, self.max_rate)
+        elif rate >= 2.0 * throughput:
+            rate = None
+        self.bucket.set_rate(rate)
+
+    def cut(self, throughput, now, retry_after=None, interval=1.0):
+        """Cut the rate, at most once per interval, and honour Retry-After."""
+        if retry_after:
+            self.bucket.pause(retry_after)
+        if now - self._last_cut < interval:
+            return
+        self._last_cut = now
+        self.cuts += 1
+        current = self.bucket.rate
+        if current is None:
+            current = throughput or self.min_rate
+        self.bucket.set_rate(max(self.min_rate, current * self.decrease))
+
+
+class ModelLimiter:
+    """Adaptive token bucket plus adaptive concurrency gate for one model.
+
+    A 429/5xx or connection failure counts as congestion, and cuts the rate
+    and the concurrency limit, only once overloads are at least
+    `congestion` of the calls in the last `window` seconds. A few scattered
+    errors are left to the transport's retries. At low volume a single
+    overload is enough.
+    """
+
+    def __init__(self, rate, burst, initial, max_limit, congestion=0.1, window=5.0) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.rate = AdaptiveRate(self.bucket, max_rate=rate)
+        self.concurrency = AdaptiveLimit(initial=initial, max_limit=max_limit)
+        self.congestion = congestion
+        self.outcomes = Outcomes(window)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        self.concurrency.acquire()
+        self.bucket.acquire()
+
+    async def aacquire(self):
+        await self.concurrency.aacquire()
+        try:
+            await self.bucket.aacquire()
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self, latency=None, overloaded=False, retry_after=None):
+        """Free the slot; retry_after is the server's Retry-After, if any."""
+        if latency is None and not overloaded:
+            # Cancelled or failed locally: no signal either way.
+            self.concurrency.release()
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.outcomes.add(overloaded, now)
+            throughput = self.outcomes.throughput(now)
+            congested = overloaded and self.outcomes.overload_fraction() >= self.congestion
+            if congested:
+                interval = max(1.0, self.concurrency.baseline or 0.0)
+                self.rate.cut(throughput, now, _seconds(retry_after), interval)
+            elif not overloaded:
+                self.rate.on_success(throughput)
+        if overloaded and not congested:
+            self.concurrency.release()
+        else:
+            self.concurrency.release(latency, overloaded)
+
+    def stats(self):
+        return {
+            "limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "queue_depth": self.concurrency.queued,
+            "latency_baseline": self.concurrency.baseline,
+            "rate": self.bucket.rate,
+            "rate_cuts": self.rate.cuts,
+            "overload_fraction": self.outcomes.overload_fraction(),
+            "tokens": self.bucket.tokens,
+            "successes": self.concurrency.successes,
+            "overloads": self.concurrency.overloads,
+        }
+
+
+class ArgoLimiter:
+    """Per-model limiters, created on first use from limits or DEFAULT_LIMITS."""
+
+    def __init__(self, limits=None) -> None:
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model):
+        with self._lock:
+            limiter = self._models.get(model)
+            if limiter is None:
+                limiter = ModelLimiter(*self.limits.get(model, FALLBACK_LIMITS))
+                self._models[model] = limiter
+            return limiter
+
+    def stats(self):
+        with self._lock:
+            models = dict(self._models)
+        return {model: limiter.stats() for model, limiter in models.items()}
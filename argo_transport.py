@@ -0,0 +1,620 @@
+#
+# Shared HTTP transport for the Argo LLM wrappers
+#
+# ArgoWrapper and ArgoLLM both post JSON to the Argo chat endpoint. Rather
+# than paying a TCP+TLS handshake on every prompt with a bare requests.post,
+# they share one pooled keep-alive session that retries 5xx responses and
+# connection resets with jittered exponential backoff, and records the
+# connect / time-to-first-byte / total time of each call. With tracing on
+# (see tracing.py) every request is an "llm" span with its prompt and
+# response sizes.
+#
+
+import asyncio
+import codecs
+import json
+import random
+import threading
+import time
+import weakref
+from collections import deque, namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import tracing
+from argo_cache import request_key
+from argo_limiter import OVERLOAD_STATUS, ArgoLimiter
+from singleflight import SingleFlight
+
+RETRY_STATUS = frozenset([429, 500, 502, 503, 504])
+
+# connect is the time spent opening new sockets (including the TLS
+# handshake) for this call; it is 0.0 when a pooled connection was reused.
+# attempts counts retries too, and status is None if no reply ever arrived.
+CallTiming = namedtuple("CallTiming", ["connect", "ttfb", "total", "attempts", "status"])
+
+_local = threading.local()
+
+
+class ArgoRequestError(Exception):
+    """Raised when the Argo service answers with a non-200 status."""
+
+    def __init__(self, status_code, text=""):
+        super().__init__(f"Request failed with status code: {status_code} {text}".rstrip())
+        self.status_code = status_code
+        self.text = text
+
+
+def _add_connect_time(seconds):
+    _local.connect = getattr(_local, "connect", 0.0) + seconds
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class _AsyncState:
+    """The aiohttp session and in-flight semaphore belonging to one event loop."""
+
+    def __init__(self, session, semaphore):
+        self.session = session
+        self.semaphore = semaphore
+
+
+class ArgoTransport:
+    """A pooled keep-alive session with retry/backoff and per-call timings.
+
+    post/request are the blocking path. apost/arequest are the asyncio path;
+    they use an aiohttp session per event loop and let at most
+    max_in_flight requests be outstanding at once on that loop.
+
+    With single_flight on, concurrent identical requests share one upstream
+    call; transport.single_flight.stats() reports how many were coalesced.
+
+    limiter (an argo_limiter.ArgoLimiter, or True for the default per-model
+    limits) caps the attempts in flight for each model and, once the
+    service answers 429/5xx, paces them; both adapt to overload.
+    transport.limiter.stats() reports the current limits, rates and queue
+    depths. Pass limiter=None to disable it.
+    """
+
+    def __init__(self,
+                 pool_connections=4,
+                 pool_maxsize=32,
+                 connect_timeout=10.0,
+                 read_timeout=300.0,
+                 max_retries=3,
+                 backoff_base=0.5,
+                 backoff_max=30.0,
+                 keep_timings=1000,
+                 max_in_flight=256,
+                 single_flight=True,
+                 limiter=True) -> None:
+        self.pool_maxsize = pool_maxsize
+        self.max_in_flight = max_in_flight
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timings = deque(maxlen=keep_timings)
+
+        adapter = _TimedAdapter(pool_connections=pool_connections,
+                                pool_maxsize=pool_maxsize,
+                                pool_block=False,
+                                max_retries=0)
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async = weakref.WeakKeyDictionary()
+        self.single_flight = SingleFlight() if single_flight else None
+        self.limiter = ArgoLimiter() if limiter is True else limiter
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Backoff delay, stretched to the server's Retry-After if it sent one."""
+        delay = self.backoff(attempt)
+        try:
+            return max(delay, min(self.backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            return delay
+
+    def _model_limiter(self, payload):
+        if self.limiter is None:
+            return None
+        return self.limiter.for_model(payload.get("model"))
+
+    def post(self, url, payload, stream=False):
+        """POST payload as JSON, retrying 429/5xx and connection errors.
+
+        Returns the final requests.Response, whatever its status. With
+        stream=True its body is left unread for the caller to iterate and
+        close, and the recorded total stops at the response headers. The
+        limiter slot of a streamed 200 reply is held until it is closed.
+        """
+        body = json.dumps(payload)
+        limiter = self._model_limiter(payload)
+        _local.connect = 0.0
+        start = time.perf_counter()
+        ttfb = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            if limiter is not None:
+                limiter.acquire()
+            sent = time.perf_counter()
+            try:
+                response = self.session.post(url, data=body, timeout=self.timeout, stream=True)
+                ttfb = time.perf_counter() - start
+                if not stream:
+                    response.content  # drain so the connection goes back to the pool
+            except (requests.ConnectionError, requests.Timeout):
+                if limiter is not None:
+                    limiter.release(overloaded=True)
+                if attempt > self.max_retries:
+                    self._record(start, ttfb, attempt, None)
+                    raise
+                time.sleep(self.backoff(attempt - 1))
+                continue
+            except BaseException:
+                if limiter is not None:
+                    limiter.release()
+                raise
+
+            status = response.status_code
+            if limiter is not None:
+                if stream and status == 200:
+                    _release_on_close(response, "close", limiter, sent)
+                else:
+                    limiter.release(time.perf_counter() - sent, status in OVERLOAD_STATUS,
+                                    response.headers.get("Retry-After"))
+            if status in RETRY_STATUS and attempt <= self.max_retries:
+                response.close()
+                time.sleep(self.retry_delay(attempt - 1, response.headers.get("Retry-After")))
+                continue
+
+            self._record(start, ttfb, attempt, status)
+            return response
+
+    def request(self, url, payload, cache=None, semantic_cache=None):
+        """POST payload and return the parsed JSON reply, raising on non-200.
+
+        cache (an argo_cache.ResponseCache) and semantic_cache (a
+        semantic_cache.SemanticCache) are consulted in that order when they
+        apply to this payload; a stored reply is returned without contacting
+        the service.
+        """
+        with tracing.span("llm", model=payload.get("model")) as span:
+            reply = self._request(url, payload, cache, semantic_cache)
+            if tracing.enabled():
+                span.set(**tracing.llm_usage(_prompt_text(payload), reply.get("response") or ""))
+            return reply
+
+    def _request(self, url, payload, cache, semantic_cache):
+        caches = _applicable(payload, cache, semantic_cache)
+        reply = _lookup(caches, url, payload)
+        if reply is not None:
+            return reply
+
+        def fetch():
+            start = time.perf_counter()
+            response = self.post(url, payload)
+            if response.status_code != 200:
+                raise ArgoRequestError(response.status_code, response.text)
+            reply = json.loads(response.text)
+            _store(caches, url, payload, reply, time.perf_counter() - start)
+            return reply
+
+        if self.single_flight is None:
+            return fetch()
+        return self.single_flight.do(request_key(url, payload), fetch)
+
+    def stream(self, url, payload, chunk_size=64, cache=None, semantic_cache=None):
+        """POST payload and yield the reply text piece by piece as it arrives.
+
+        Server-sent events and plain chunked text are passed through as they
+        are received. A buffered JSON reply, and any cache hit, is yielded in
+        chunk_size pieces. The assembled reply is stored in the caches.
+        """
+        # A generator cannot hold a span open across yields (the caller's
+        # context would see it as current), so the call is recorded at the
+        # end: also when it fails or the caller stops early (GeneratorExit).
+        start = time.perf_counter()
+        parts = [] if tracing.enabled() else None
+        error = None
+        try:
+            for piece in self._stream(url, payload, chunk_size, cache, semantic_cache):
+                if parts is not None:
+                    parts.append(piece)
+                yield piece
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if parts is not None:
+                _record_stream(start, payload, parts, error)
+
+    def _stream(self, url, payload, chunk_size, cache, semantic_cache):
+        caches = _applicable(payload, cache, semantic_cache)
+        reply = _lookup(caches, url, payload)
+        if reply is not None:
+            yield from _chunked(reply["response"], chunk_size)
+            return
+
+        start = time.perf_counter()
+        response = self.post(url, payload, stream=True)
+        parts = []
+        try:
+            if response.status_code != 200:
+                raise ArgoRequestError(response.status_code, response.text)
+            decoder = _StreamDecoder(response.headers.get("Content-Type", ""), chunk_size)
+            for data in response.iter_content(chunk_size=None):
+                for piece in decoder.feed(data):
+                    parts.append(piece)
+                    yield piece
+            for piece in decoder.finish():
+                parts.append(piece)
+                yield piece
+        finally:
+            response.close()
+        _store(caches, url, payload, {"response": "".join(parts)}, time.perf_counter() - start)
+
+    def _async_state(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        state = self._async.get(loop)
+        if state is None or state.session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_start.append(_on_connect_start)
+            trace.on_connection_create_end.append(_on_connect_end)
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                            sock_read=self.read_timeout)
+            session = aiohttp.ClientSession(connector=connector,
+                                            timeout=timeout,
+                                            headers={"Content-Type": "application/json"},
+                                            trace_configs=[trace])
+            state = _AsyncState(session, asyncio.Semaphore(self.max_in_flight))
+            self._async[loop] = state
+        return state
+
+    async def _aopen(self, state, url, payload, stream):
+        # Send with retries and return the final aiohttp response. Unless
+        # stream is set its body has already been read and released; a
+        # streamed 200 reply keeps its limiter slot until it is released.
+        import aiohttp
+
+        body = json.dumps(payload)
+        limiter = self._model_limiter(payload)
+        ctx = {"connect": 0.0}
+        start = time.perf_counter()
+        ttfb = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            if limiter is not None:
+                await limiter.aacquire()
+            sent = time.perf_counter()
+            try:
+                response = await state.session.post(url, data=body, trace_request_ctx=ctx)
+                ttfb = time.perf_counter() - start
+                if not stream or response.status != 200:
+                    await response.read()
+                    response.release()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if limiter is not None:
+                    limiter.release(overloaded=True)
+                if attempt > self.max_retries:
+                    self._record(start, ttfb, attempt, None, ctx["connect"])
+                    raise
+                await asyncio.sleep(self.backoff(attempt - 1))
+                continue
+            except BaseException:
+                if limiter is not None:
+                    limiter.release()
+                raise
+
+            status = response.status
+            if limiter is not None:
+                if stream and status == 200:
+                    _release_on_close(response, "release", limiter, sent)
+                else:
+                    limiter.release(time.perf_counter() - sent, status in OVERLOAD_STATUS,
+                                    response.headers.get("Retry-After"))
+            if status in RETRY_STATUS and attempt <= self.max_retries:
+                await asyncio.sleep(self.retry_delay(attempt - 1, response.headers.get("Retry-After")))
+                continue
+
+            self._record(start, ttfb, attempt, status, ctx["connect"])
+            return response
+
+    async def apost(self, url, payload):
+        """Async POST of payload as JSON, with the same retry policy as post.
+
+        Returns (status, text) of the final reply.
+        """
+        state = self._async_state()
+        async with state.semaphore:
+            response = await self._aopen(state, url, payload, stream=False)
+            return response.status, await response.text()
+
+    async def arequest(self, url, payload, cache=None, semantic_cache=None):
+        """Async counterpart of request.
+
+        Cache lookups and stores run in a worker thread, so SQLite reads and
+        prompt embedding do not hold up the event loop.
+        """
+        with tracing.span("llm", model=payload.get("model")) as span:
+            reply = await self._arequest(url, payload, cache, semantic_cache)
+            if tracing.enabled():
+                span.set(**tracing.llm_usage(_prompt_text(payload), reply.get("response") or ""))
+            return reply
+
+    async def _arequest(self, url, payload, cache, semantic_cache):
+        caches = _applicable(payload, cache, semantic_cache)
+        reply = await _alookup(caches, url, payload)
+        if reply is not None:
+            return reply
+
+        async def fetch():
+            start = time.perf_counter()
+            status, text = await self.apost(url, payload)
+            if status != 200:
+                raise ArgoRequestError(status, text)
+            reply = json.loads(text)
+            await _astore(caches, url, payload, reply, time.perf_counter() - start)
+            return reply
+
+        if self.single_flight is None:
+            return await fetch()
+        return await self.single_flight.ado(request_key(url, payload), fetch)
+
+    async def astream(self, url, payload, chunk_size=64, cache=None, semantic_cache=None):
+        """Async counterpart of stream."""
+        start = time.perf_counter()
+        parts = [] if tracing.enabled() else None
+        error = None
+        try:
+            async for piece in self._astream(url, payload, chunk_size, cache, semantic_cache):
+                if parts is not None:
+                    parts.append(piece)
+                yield piece
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if parts is not None:
+                _record_stream(start, payload, parts, error)
+
+    async def _astream(self, url, payload, chunk_size, cache, semantic_cache):
+        caches = _applicable(payload, cache, semantic_cache)
+        reply = await _alookup(caches, url, payload)
+        if reply is not None:
+            for piece in _chunked(reply["response"], chunk_size):
+                yield piece
+            return
+
+        state = self._async_state()
+        start = time.perf_counter()
+        parts = []
+        async with state.semaphore:
+            response = await self._aopen(state, url, payload, stream=True)
+            try:
+                if response.status != 200:
+                    raise ArgoRequestError(response.status, await response.text())
+                decoder = _StreamDecoder(response.headers.get("Content-Type", ""), chunk_size)
+                async for data in response.content.iter_any():
+                    for piece in decoder.feed(data):
+                        parts.append(piece)
+                        yield piece
+                for piece in decoder.finish():
+                    parts.append(piece)
+                    yield piece
+            finally:
+                response.release()
+        await _astore(caches, url, payload, {"response": "".join(parts)}, time.perf_counter() - start)
+
+    def _record(self, start, ttfb, attempts, status, connect=None):
+        if connect is None:
+            connect = getattr(_local, "connect", 0.0)
+        timing = CallTiming(connect=connect,
+                            ttfb=ttfb,
+                            total=time.perf_counter() - start,
+                            attempts=attempts,
+                            status=status)
+        self.timings.append(timing)
+        _local.last_timing = timing
+
+    @property
+    def last_timing(self):
+        """Timing of the most recent call made from the current thread."""
+        return getattr(_local, "last_timing", None)
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        """Close the aiohttp session of the running event loop, if any."""
+        state = self._async.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.session.close()
+
+
+def _prompt_text(payload):
+    return "\n".join([payload.get("system") or ""] + list(payload.get("prompt") or []))
+
+
+def _record_stream(start, payload, parts, error=None):
+    attrs = tracing.llm_usage(_prompt_text(payload), "".join(parts))
+    if error is not None:
+        attrs["error"] = error
+    tracing.record("llm", time.perf_counter() - start, model=payload.get("model"), stream=True, **attrs)
+
+
+def _chunked(text, chunk_size):
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def _sse_text(line):
+    line = line.rstrip("\r")
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, dict):
+        return event.get("response") or event.get("content") or None
+    return event if isinstance(event, str) else None
+
+
+class _StreamDecoder:
+    """Turns the raw bytes of a streamed reply into text pieces.
+
+    text/event-stream replies yield the data of each event, other non-JSON
+    replies are passed through as decoded text, and a buffered JSON reply
+    is split into chunk_size pieces once it is complete.
+    """
+
+    def __init__(self, content_type, chunk_size):
+        if "application/json" in content_type:
+            self.mode = "json"
+        elif "text/event-stream" in content_type:
+            self.mode = "sse"
+        else:
+            self.mode = "text"
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+
+    def feed(self, data):
+        text = self._decoder.decode(data)
+        if self.mode == "text":
+            return [text] if text else []
+        self._buffer += text
+        if self.mode == "json":
+            return []
+        *lines, self._buffer = self._buffer.split("\n")
+        return [piece for piece in map(_sse_text, lines) if piece]
+
+    def finish(self):
+        text = self._buffer + self._decoder.decode(b"", final=True)
+        self._buffer = ""
+        if self.mode == "json":
+            return _chunked(json.loads(text)["response"], self.chunk_size) if text else []
+        if self.mode == "sse":
+            return [piece for piece in map(_sse_text, text.split("\n")) if piece]
+        return [text] if text else []
+
+
+def _applicable(payload, *caches):
+    return [c for c in caches if c is not None and c.applies(payload)]
+
+
+def _lookup(caches, url, payload):
+    for cache in caches:
+        reply = cache.get(url, payload)
+        if reply is not None:
+            return reply
+    return None
+
+
+def _store(caches, url, payload, reply, latency):
+    for cache in caches:
+        cache.put(url, payload, reply, latency)
+
+
+def _release_on_close(response, method, limiter, sent):
+    # A streamed reply keeps its limiter slot until the caller closes it
+    # (after the last chunk, or on abandoning the stream), and the latency fed
+    # back to the limiter covers the whole body, not just the headers.
+    close = getattr(response, method)
+    released = []
+
+    def release(*args, **kwargs):
+        if not released:
+            released.append(True)
+            limiter.release(time.perf_counter() - sent)
+        return close(*args, **kwargs)
+
+    setattr(response, method, release)
+
+
+async def _alookup(caches, url, payload):
+    # SQLite reads and prompt embedding block: keep them off the event loop.
+    if not caches:
+        return None
+    return await asyncio.to_thread(_lookup, caches, url, payload)
+
+
+async def _astore(caches, url, payload, reply, latency):
+    if caches:
+        await asyncio.to_thread(_store, caches, url, payload, reply, latency)
+
+
+async def _on_connect_start(session, ctx, params):
+    ctx.connect_start = time.perf_counter()
+
+
+async def _on_connect_end(session, ctx, params):
+    if ctx.trace_request_ctx is not None:
+        ctx.trace_request_ctx["connect"] += time.perf_counter() - ctx.connect_start
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def default_transport():
+    """The process-wide transport shared by ArgoWrapper and ArgoLLM."""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = ArgoTransport()
+        return _default_transport
@@ -0,0 +1,413 @@
+#
+# Local arXiv paper cache for ArxivLoader / ArxivRetriever style loading
+#
+# openai-rag-arxiv.py and agent.ipynb search arXiv, download the PDFs and
+# extract their text on every run. ArxivCache keeps each paper's PDF,
+# extracted text and metadata on disk, keyed by arXiv ID. It also keeps the
+# ID list returned for each (query, max_docs, sort order). A repeat run reads both from
+# disk without touching the network.
+#
+# Layout of the cache directory:
+#   index.sqlite         papers(id, metadata, bytes, created, accessed) and
+#                        queries(key, query, max_docs, ids, created)
+#   papers/<id>/         paper.pdf and text.txt ("/" in old IDs becomes "_")
+#
+# Papers are evicted least recently used first once they take more than
+# max_bytes. Query results older than query_ttl are searched again when
+# online. With offline=True (or ARXIV_OFFLINE=1) nothing is fetched: known
+# queries are answered from the cache and others by a keyword match over
+# the cached titles and abstracts.
+#
+# Callers that only need abstracts (full_text=False, as CachedArxivRetriever
+# uses by default) get the metadata from the search results; no PDF is
+# downloaded until some caller asks for a paper's full text.
+#
+# Where papers come from is pluggable. ArxivSource uses the arxiv package
+# and PyMuPDF, like LangChain's ArxivAPIWrapper. LocalCorpus serves a
+# directory of <id>.json metadata next to <id>.pdf or <id>.txt files, as a
+# stand-in corpus for tests.
+#
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "arxiv")
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+def pdf_text(path):
+    """Text of a PDF, page after page, as ArxivAPIWrapper extracts it."""
+    import fitz
+
+    with fitz.open(path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+class ArxivSource:
+    """Searches arxiv.org and downloads PDFs through the arxiv package."""
+
+    def __init__(self, sort_by=None) -> None:
+        # sort_by is an arXiv API value: relevance, lastUpdatedDate, submittedDate
+        self.sort_by = sort_by
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import arxiv
+
+            self._arxiv = arxiv
+            self._client = arxiv.Client()
+        return self._client
+
+    def _paper(self, result):
+        return {
+            "id": result.get_short_id(),
+            "metadata": {
+                "Published": str(result.updated.date()),
+                "Title": result.title,
+                "Authors": ", ".join(a.name for a in result.authors),
+                "Summary": result.summary,
+                "entry_id": result.entry_id,
+            },
+            "pdf_url": result.pdf_url,
+        }
+
+    def search(self, query, max_results):
+        """[{"id", "metadata", ...}] for the top results of a query."""
+        client = self.client
+        kwargs = {}
+        if self.sort_by is not None:
+            kwargs["sort_by"] = self._arxiv.SortCriterion(self.sort_by)
+        search = self._arxiv.Search(query=query[:300], max_results=max_results, **kwargs)
+        return [self._paper(r) for r in client.results(search)]
+
+    def lookup(self, ids):
+        client = self.client
+        search = self._arxiv.Search(id_list=list(ids))
+        return [self._paper(r) for r in client.results(search)]
+
+    def fetch(self, paper, directory):
+        """Download the paper's PDF into directory and return its text."""
+        import urllib.request
+
+        pdf = os.path.join(directory, "paper.pdf")
+        urllib.request.urlretrieve(paper["pdf_url"], pdf)
+        return pdf_text(pdf)
+
+
+class LocalCorpus:
+    """A directory of <id>.json metadata with <id>.pdf and/or <id>.txt."""
+
+    def __init__(self, path) -> None:
+        self.path = path
+
+    def _papers(self):
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.path, name)) as f:
+                    yield {"id": name[:-5].replace("_", "/"), "metadata": json.load(f)}
+
+    def search(self, query, max_results):
+        terms = set(_WORD.findall(query.lower()))
+        scored = []
+        for paper in self._papers():
+            text = f"{paper['metadata'].get('Title', '')} {paper['metadata'].get('Summary', '')}".lower()
+            score = len(terms & set(_WORD.findall(text)))
+            if score:
+                scored.append((-score, paper["id"], paper))
+        return [paper for _, _, paper in sorted(scored)[:max_results]]
+
+    def lookup(self, ids):
+        wanted = set(ids)
+        return [p for p in self._papers() if p["id"] in wanted]
+
+    def fetch(self, paper, directory):
+        base = os.path.join(self.path, paper["id"].replace("/", "_"))
+        if os.path.exists(base + ".pdf"):
+            shutil.copyfile(base + ".pdf", os.path.join(directory, "paper.pdf"))
+        if os.path.exists(base + ".txt"):
+            with open(base + ".txt", encoding="utf-8") as f:
+                return f.read()
+        return pdf_text(base + ".pdf")
+
+
+class ArxivCache:
+    """Disk cache of arXiv papers (PDF, text, metadata) and query results."""
+
+    def __init__(self,
+                 path=DEFAULT_PATH,
+                 source=None,
+                 max_bytes=2 * 1024 ** 3,
+                 query_ttl=7 * 24 * 3600,
+                 offline=None,
+                 workers=1,
+                 keep_pdf=True) -> None:
+        self.path = path
+        self._source = source
+        self.max_bytes = max_bytes
+        self.query_ttl = query_ttl
+        self.offline = offline if offline is not None else os.getenv("ARXIV_OFFLINE", "") not in ("", "0")
+        self.workers = workers
+        self.keep_pdf = keep_pdf
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.evictions = 0
+        self.failures = 0
+
+        os.makedirs(os.path.join(path, "papers"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS papers ("
+                         "id TEXT PRIMARY KEY, metadata TEXT, bytes INTEGER, created REAL, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS papers_accessed ON papers(accessed)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS queries ("
+                         "key TEXT PRIMARY KEY, query TEXT, max_docs INTEGER, ids TEXT, created REAL)")
+
+    @property
+    def source(self):
+        if self._source is None:
+            self._source = ArxivSource()
+        return self._source
+
+    def _dir(self, paper_id):
+        return os.path.join(self.path, "papers", paper_id.replace("/", "_"))
+
+    # -- papers -------------------------------------------------------------
+
+    def _cached(self, paper_id, full_text=True):
+        with self._lock:
+            row = self._db.execute("SELECT metadata FROM papers WHERE id = ?", (paper_id,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE papers SET accessed = ? WHERE id = ?", (time.time(), paper_id))
+        if row is None or (full_text and not self._has_text(paper_id)):
+            return None
+        return json.loads(row[0])
+
+    def _has_text(self, paper_id):
+        return os.path.exists(os.path.join(self._dir(paper_id), "text.txt"))
+
+    def _remember(self, papers):
+        # Metadata only, for abstract-only callers; a later download replaces the row.
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO papers VALUES (?, ?, 0, ?, ?)",
+                                 [(p["id"], json.dumps(p["metadata"]), now, now) for p in papers])
+
+    def _download(self, paper):
+        directory = self._dir(paper["id"])
+        os.makedirs(directory, exist_ok=True)
+        try:
+            text = self.source.fetch(paper, directory)
+        except Exception as e:
+            # Skipped, like ArxivAPIWrapper does with unreadable PDFs.
+            logger.warning("could not fetch arXiv paper %s: %s", paper["id"], e)
+            shutil.rmtree(directory, ignore_errors=True)
+            self.failures += 1
+            return False
+        pdf = os.path.join(directory, "paper.pdf")
+        if not self.keep_pdf and os.path.exists(pdf):
+            os.remove(pdf)
+        tmp = os.path.join(directory, "text.txt.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, os.path.join(directory, "text.txt"))
+        size = sum(os.path.getsize(os.path.join(directory, n)) for n in os.listdir(directory))
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?)",
+                             (paper["id"], json.dumps(paper["metadata"]), size, now, now))
+        return True
+
+    def text(self, paper_id):
+        with open(os.path.join(self._dir(paper_id), "text.txt"), encoding="utf-8") as f:
+            return f.read()
+
+    def papers(self, papers, full_text=True):
+        """Ensure papers ({"id", "metadata", ...}) are cached; returns
+        [(id, metadata)] for those available, in order.
+
+        With full_text=False only their metadata is stored; nothing is
+        downloaded.
+        """
+        out, missing = [], []
+        for paper in papers:
+            metadata = self._cached(paper["id"], full_text)
+            if metadata is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing.append(paper)
+            out.append((paper["id"], metadata or paper["metadata"]))
+        if not full_text:
+            self._remember(missing)
+            return out
+        fetched = set()
+        if missing and not self.offline:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for paper, ok in zip(missing, pool.map(self._download, missing)):
+                    if ok:
+                        fetched.add(paper["id"])
+            self._evict(keep={p["id"] for p in papers})
+        gone = {p["id"] for p in missing} - fetched
+        return [item for item in out if item[0] not in gone]
+
+    def get(self, ids, full_text=True):
+        """[(id, metadata)] for arXiv IDs, fetching any that are not cached."""
+        known = [(i, self._cached(i, full_text)) for i in ids]
+        if all(metadata is not None for _, metadata in known) or self.offline:
+            self.hits += sum(metadata is not None for _, metadata in known)
+            return [(i, metadata) for i, metadata in known if metadata is not None]
+        # The source may list them in its own order.
+        found = {p["id"]: p for p in self.source.lookup(list(ids))}
+        return self.papers([found[i] for i in ids if i in found], full_text)
+
+    # -- queries ------------------------------------------------------------
+
+    def search(self, query, max_docs=3, full_text=True):
+        """[(id, metadata)] of the top papers for a query, cached.
+
+        full_text=False is enough for documents(full_text=False) and
+        downloads no PDFs.
+        """
+        sort_by = getattr(self._source, "sort_by", None)
+        key = hashlib.sha256(json.dumps([query, max_docs, sort_by]).encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute("SELECT ids, created FROM queries WHERE key = ?", (key,)).fetchone()
+        if row is not None and (self.offline or time.time() - row[1] <= self.query_ttl):
+            self.query_hits += 1
+            return self.get(json.loads(row[0]), full_text)
+        self.query_misses += 1
+        if self.offline:
+            return self.search_cached(query, max_docs, full_text)
+
+        results = self.papers(self.source.search(query, max_docs), full_text)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                             (key, query, max_docs, json.dumps([i for i, _ in results]), time.time()))
+        return results
+
+    def search_cached(self, query, max_docs=3, full_text=True):
+        """Keyword match of query over the titles and abstracts on disk."""
+        terms = set(_WORD.findall(query.lower()))
+        with self._lock:
+            rows = self._db.execute("SELECT id, metadata FROM papers").fetchall()
+        scored = []
+        for paper_id, metadata in rows:
+            metadata = json.loads(metadata)
+            text = f"{metadata.get('Title', '')} {metadata.get('Summary', '')}".lower()
+            score = len(terms & set(_WORD.findall(text)))
+            if score and (not full_text or self._has_text(paper_id)):
+                scored.append((-score, paper_id, metadata))
+        return [(paper_id, metadata) for _, paper_id, metadata in sorted(scored)[:max_docs]]
+
+    # -- housekeeping -------------------------------------------------------
+
+    def _evict(self, keep=()):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM papers").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute("SELECT id, bytes FROM papers ORDER BY accessed").fetchall()
+            doomed = []
+            for paper_id, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if paper_id in keep:
+                    continue
+                doomed.append(paper_id)
+                total -= size
+            self._db.executemany("DELETE FROM papers WHERE id = ?", [(i,) for i in doomed])
+            self.evictions += len(doomed)
+        for paper_id in doomed:
+            shutil.rmtree(self._dir(paper_id), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM papers").fetchone()
+            queries = self._db.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "query_hits": self.query_hits,
+            "query_misses": self.query_misses,
+            "evictions": self.evictions,
+            "failures": self.failures,
+            "papers": entries,
+            "bytes": size,
+            "queries": queries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -- documents ----------------------------------------------------------
+
+    def documents(self, results, full_text=True, max_chars=None):
+        docs = []
+        for paper_id, metadata in results:
+            content = self.text(paper_id) if full_text else metadata.get("Summary", "")
+            docs.append(Document(page_content=content[:max_chars] if max_chars else content,
+                                 metadata=dict(metadata)))
+        return docs
+
+
+class CachedArxivLoader(BaseLoader):
+    """Drop-in for ArxivLoader(query, load_max_docs).load() over an ArxivCache."""
+
+    def __init__(self, query, load_max_docs=100, cache=None, doc_content_chars_max=None) -> None:
+        self.query = query
+        self.load_max_docs = load_max_docs
+        self.cache = cache if cache is not None else ArxivCache()
+        self.doc_content_chars_max = doc_content_chars_max
+
+    def lazy_load(self):
+        # One paper's text in memory at a time.
+        for result in self.cache.search(self.query, self.load_max_docs):
+            yield from self.cache.documents([result], max_chars=self.doc_content_chars_max)
+
+
+class CachedArxivRetriever(BaseRetriever):
+    """Drop-in for ArxivRetriever over an ArxivCache.
+
+    Like ArxivRetriever, documents hold the abstract unless
+    get_full_documents is set.
+    """
+
+    cache: Any = None
+    load_max_docs: int = 3
+    get_full_documents: bool = False
+    doc_content_chars_max: int = 4000
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.cache is None:
+            self.cache = ArxivCache()
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        results = self.cache.search(query, self.load_max_docs, full_text=self.get_full_documents)
+        return self.cache.documents(results, full_text=self.get_full_documents,
+                                    max_chars=self.doc_content_chars_max)
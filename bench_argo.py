@@ -0,0 +1,204 @@
+#
+# Benchmark: Argo client throughput and latency against a local mock server
+#
+#   python bench_argo.py --clients wrapper argollm argo_llm --concurrency 1 8 32 \
+#       --requests 400 --latency 0.05 --jitter 0.02 --error-rate 0.01 --output bench.jsonl
+#
+# Starts mock_argo.MockArgoServer in a child process and drives ArgoWrapper,
+# ArgoLLM and CustomLLM.ARGO_LLM with the given number of requests at each
+# concurrency. Blocking calls use a thread pool and async calls use
+# ainvoke in one event loop. Every prompt is distinct, so single-flight
+# coalescing never hides requests. Each (client, api, concurrency) run
+# prints one JSON line with:
+#   req_per_s, p50/p95/p99/max latency in ms, error count, mean attempts,
+#   client CPU ms per request (this process only; the server is elsewhere),
+#   RSS growth per request in KiB and peak RSS.
+# The first line describes the run (commit, Python version, server
+# settings), so files from different commits can be compared directly.
+#
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ARGO import ArgoWrapper
+from argo_transport import ArgoTransport
+from mock_argo import start_process
+
+CLIENTS = ("wrapper", "argollm", "argo_llm")
+APIS = ("sync", "async")
+
+
+def make_client(kind, url, transport):
+    if kind == "wrapper":
+        return ArgoWrapper(url=url, transport=transport)
+    if kind == "argollm":
+        from ArgoLLM import ArgoLLM
+        return ArgoLLM(url=url, transport=transport, system="")
+    from CustomLLM import ARGO_LLM
+    return ARGO_LLM(argo=ArgoWrapper(url=url, transport=transport))
+
+
+def _rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    # Nearest rank.
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100.0 * len(values)) - 1))]
+
+
+def _timed(call, prompt):
+    start = time.perf_counter()
+    try:
+        call(prompt)
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, type(e).__name__
+
+
+async def _atimed(call, prompt, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            await call(prompt)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+
+
+def run(kind, api, concurrency, requests, url, args, round_id):
+    transport = ArgoTransport(pool_maxsize=max(32, concurrency),
+                              max_in_flight=max(256, concurrency),
+                              backoff_base=args.backoff_base,
+                              max_retries=args.max_retries,
+                              limiter=None if args.no_limiter else True)
+    client = make_client(kind, url, transport)
+    prompts = [f"round {round_id} request {i}: what is the transmissibility of the virus?"
+               for i in range(requests)]
+    # One warm-up call so connection setup and imports are not in the numbers.
+    client.invoke(f"warm-up {round_id}")
+
+    rss_before = _rss_kb()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    if api == "sync":
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda p: _timed(client.invoke, p), prompts))
+    else:
+        async def drive():
+            semaphore = asyncio.Semaphore(concurrency)
+            try:
+                return await asyncio.gather(*(_atimed(client.ainvoke, p, semaphore) for p in prompts))
+            finally:
+                await transport.aclose()
+        results = asyncio.run(drive())
+    wall = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss_after = _rss_kb()
+    transport.close()
+
+    latencies = sorted(seconds for seconds, error in results if error is None)
+    errors = {}
+    for _, error in results:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    timings = list(transport.timings)[-requests:]
+    cpu = (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime)
+
+    def ms(value):
+        return None if value is None else round(1000.0 * value, 3)
+
+    return {
+        "type": "result",
+        "client": kind,
+        "api": api,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "req_per_s": round(len(results) / wall, 2),
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "mean_attempts": round(sum(t.attempts for t in timings) / len(timings), 3) if timings else None,
+        "cpu_ms_per_req": round(1000.0 * cpu / requests, 4),
+        "rss_kb_per_req": round((rss_after - rss_before) / requests, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Argo clients against a local mock server.")
+    parser.add_argument("--clients", nargs="+", choices=CLIENTS, default=list(CLIENTS))
+    parser.add_argument("--api", nargs="+", choices=APIS, default=list(APIS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server delay, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform delay, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After the server sends with errors")
+    parser.add_argument("--response-chars", type=int, default=2048)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--backoff-base", type=float, default=0.05)
+    parser.add_argument("--no-limiter", action="store_true", help="drop the transport's per-model limiter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="also append the JSON lines to this file")
+    args = parser.parse_args()
+
+    out = open(args.output, "a") if args.output else None
+
+    def emit(record):
+        line = json.dumps(record)
+        print(line)
+        sys.stdout.flush()
+        if out is not None:
+            out.write(line + "\n")
+            out.flush()
+
+    server = start_process(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           error_status=args.error_status, response_chars=args.response_chars,
+                           seed=args.seed, retry_after=args.retry_after)
+    try:
+        emit({"type": "run", "commit": _commit(), "time": time.time(), "python": platform.python_version(),
+              "server": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                         "error_status": args.error_status, "response_chars": args.response_chars,
+                         "retry_after": args.retry_after},
+              "requests": args.requests, "max_retries": args.max_retries,
+              "backoff_base": args.backoff_base, "limiter": not args.no_limiter})
+        round_id = 0
+        for kind in args.clients:
+            for api in args.api:
+                for concurrency in args.concurrency:
+                    round_id += 1
+                    emit(run(kind, api, concurrency, args.requests, server.url, args, round_id))
+        emit({"type": "server", **server.stats()})
+    finally:
+        server.stop()
+        if out is not None:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#
+# Benchmark: EmbeddingEngine throughput vs. batch budget and worker count
+#
+#   python bench_embedding_engine.py --texts 20000 --workers 1 2 4 8
+#
+# Texts are synthetic chunks with a long-tailed length mix like the output
+# of RecursiveCharacterTextSplitter. The baseline is HuggingFaceEmbeddings
+# with its defaults, as in embedding_test.py.
+#
+
+import argparse
+import json
+import random
+import time
+
+from embedding_engine import EmbeddingEngine, MODEL_NAME
+
+WORDS = ("virus host transmission rate incubation period model agent network "
+         "parameter schema infection recovery susceptible exposed vaccine "
+         "antibiotic deep learning protein binding assay").split()
+
+
+def synthetic_texts(n, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = min(250, int(rng.paretovariate(1.2) * 8))
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(words)))
+    return texts
+
+
+def timed(fn, texts):
+    start = time.perf_counter()
+    fn(texts)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure embedding throughput in texts/s.")
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[4096, 16384, 65536])
+    parser.add_argument("--baseline", action="store_true", help="also time HuggingFaceEmbeddings")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts)
+    results = []
+
+    if args.baseline:
+        from langchain.embeddings import HuggingFaceEmbeddings
+        hf = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+        hf.embed_documents(texts[:64])  # warm up
+        results.append({"engine": "HuggingFaceEmbeddings", "texts_per_s": timed(hf.embed_documents, texts)})
+
+    for workers in args.workers:
+        for max_tokens in args.max_tokens:
+            engine = EmbeddingEngine(workers=workers, max_tokens=max_tokens)
+            engine.encode(texts[:1024])  # warm up model and pool
+            rate = timed(engine.encode, texts)
+            engine.close()
+            results.append({"engine": "EmbeddingEngine", "workers": workers,
+                            "max_tokens": max_tokens, "texts_per_s": rate})
+
+    for r in results:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
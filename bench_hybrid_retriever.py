@@ -0,0 +1,101 @@
+#
+# Benchmark: hybrid BM25 + vector retrieval vs. dense retrieval
+#
+#   python bench_hybrid_retriever.py --store vector_store --queries 200
+#
+# Uses the chunks of a LocalVectorStore built by pdf_store_loader.py.
+# Each query is a random span of words from one chunk and recall@k is the
+# fraction of queries whose chunk comes back in the top k. Compared are:
+#   chroma   Chroma.from_texts(...).as_retriever(), as in openai-rag-arxiv.py
+#            (skipped when chromadb is not installed)
+#   dense    LocalVectorStore.as_retriever()
+#   hybrid   HybridRetriever for each --lexical-weight
+# Latencies include embedding the query, which all three share.
+#
+
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from embedding_cache import CachedEmbeddings
+from embedding_engine import EmbeddingEngine
+from hybrid_retriever import BM25Index, HybridRetriever
+from local_vectorstore import LocalVectorStore
+
+
+def make_queries(records, n, words, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for row, record in rng.sample(records, min(n, len(records))):
+        tokens = record["text"].split()
+        start = rng.randrange(max(1, len(tokens) - words))
+        queries.append((" ".join(tokens[start:start + words]), record["text"]))
+    return queries
+
+
+def measure(name, retrieve, queries, **extra):
+    found = 0
+    latencies = []
+    for query, text in queries:
+        start = time.perf_counter()
+        docs = retrieve(query)
+        latencies.append(time.perf_counter() - start)
+        found += any(doc.page_content == text for doc in docs)
+    latencies.sort()
+    return dict(retriever=name, recall=found / len(queries),
+                p50_ms=latencies[len(latencies) // 2] * 1000,
+                p95_ms=latencies[int(len(latencies) * 0.95)] * 1000, **extra)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hybrid and dense retrieval latency and recall.")
+    parser.add_argument("--store", default="vector_store")
+    parser.add_argument("--embedding-cache", default=None,
+                        help="embedding cache directory (default: <store>/embeddings)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=8, help="words per query")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=200)
+    parser.add_argument("--lexical-weight", type=float, nargs="+", default=[0.0, 0.3, 0.5, 0.7])
+    args = parser.parse_args()
+
+    embeddings = CachedEmbeddings(EmbeddingEngine(), args.embedding_cache or f"{args.store}/embeddings")
+    store = LocalVectorStore(args.store, embedding=embeddings)
+    records = list(store.records())
+    queries = make_queries(records, args.queries, args.words)
+    print(json.dumps({"chunks": len(records), "queries": len(queries)}))
+
+    start = time.perf_counter()
+    index = BM25Index.for_store(store)
+    print(json.dumps({"bm25_open_s": time.perf_counter() - start, "terms": len(index.vocab),
+                      "postings": len(index.rows)}))
+
+    results = []
+    try:
+        from langchain.vectorstores import Chroma
+    except ImportError:
+        Chroma = None
+    if Chroma is not None:
+        with tempfile.TemporaryDirectory() as scratch:
+            chroma = Chroma.from_texts([r["text"] for _, r in records], embeddings, persist_directory=scratch)
+            retriever = chroma.as_retriever(search_kwargs={"k": args.k})
+            results.append(measure("chroma", retriever.invoke, queries))
+            chroma.delete_collection()
+
+    dense = store.as_retriever(search_kwargs={"k": args.k})
+    results.append(measure("dense", dense.invoke, queries))
+
+    for weight in args.lexical_weight:
+        hybrid = HybridRetriever(store=store, index=index, k=args.k, candidates=args.candidates,
+                                 lexical_weight=weight, dense_weight=1.0 - weight)
+        results.append(measure("hybrid", hybrid.invoke, queries, lexical_weight=weight,
+                               candidates=args.candidates))
+
+    for r in results:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#
+# Benchmark: gitTools/localize.py as per-file clean/smudge vs filter process
+#
+#   python bench_localize.py --files 2000 --size 16384
+#
+# Builds a synthetic tree of JSON files that reference the local schema
+# directory, in a fresh git repository for each mode. Times `git add`
+# (clean on every file) and a full checkout after deleting the tree
+# (smudge on every file). Also checks that both modes store the same
+# blobs and check out the same files.
+#
+
+import argparse
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+LOCALIZE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EpiHiper-Schema-master", "gitTools",
+                        "localize.py")
+REMOTE = "https://raw.githubusercontent.com/NSSAC/EpiHiper-Schema/master"
+
+
+def git(repo, *args):
+    return subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True).stdout
+
+
+def synthetic_tree(root, local, files, size, seed=0):
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = os.path.join(root, f"d{i % 32:02d}")
+        os.makedirs(directory, exist_ok=True)
+        lines = []
+        length = 0
+        while length < size:
+            line = json.dumps({"$ref": f"{local}/schema/typeRegistry.json#/definitions/x{rng.randrange(1000)}",
+                               "value": rng.random()}) + "\n"
+            lines.append(line)
+            length += len(line)
+        with open(os.path.join(directory, f"config{i:05d}.json"), "w") as f:
+            f.write("".join(lines))
+
+
+def run(mode, args, base):
+    repo = os.path.join(base, mode)
+    local = os.path.join(base, "local-schema")
+    os.makedirs(repo)
+    git(repo, "init", "-q")
+    command = f"{shlex.quote(sys.executable)} {shlex.quote(LOCALIZE)}"
+    if mode == "process":
+        git(repo, "config", "filter.localize.process", f"{command} process {shlex.quote(local)}")
+    else:
+        git(repo, "config", "filter.localize.clean", f"{command} clean {shlex.quote(local)}")
+        git(repo, "config", "filter.localize.smudge", f"{command} smudge {shlex.quote(local)}")
+    git(repo, "config", "filter.localize.required", "true")
+    with open(os.path.join(repo, ".gitattributes"), "w") as f:
+        f.write("*.json filter=localize\n")
+    synthetic_tree(repo, local, args.files, args.size)
+
+    start = time.perf_counter()
+    git(repo, "add", "-A")
+    add_s = time.perf_counter() - start
+    git(repo, "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "tree")
+
+    for entry in os.listdir(repo):
+        if entry.startswith("d"):
+            subprocess.run(["rm", "-rf", os.path.join(repo, entry)], check=True)
+    start = time.perf_counter()
+    git(repo, "checkout", "--", ".")
+    checkout_s = time.perf_counter() - start
+
+    blob = git(repo, "cat-file", "-p", "HEAD:d00/config00000.json").decode()
+    with open(os.path.join(repo, "d00", "config00000.json")) as f:
+        checked_out = f.read()
+    if local in blob or REMOTE not in blob or checked_out != blob.replace(REMOTE, local):
+        raise SystemExit(f"{mode}: clean/smudge output is wrong")
+    tree = git(repo, "rev-parse", "HEAD^{tree}").decode().strip()
+    return {"mode": mode, "files": args.files, "bytes_per_file": args.size, "add_s": add_s,
+            "checkout_s": checkout_s, "add_files_per_s": args.files / add_s,
+            "checkout_files_per_s": args.files / checkout_s}, tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time localize.py per-file filters against the filter process.")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=16384, help="approximate bytes per file")
+    args = parser.parse_args()
+
+    trees = set()
+    with tempfile.TemporaryDirectory() as base:
+        for mode in ("per-file", "process"):
+            result, tree = run(mode, args, base)
+            trees.add(tree)
+            print(json.dumps(result))
+    if len(trees) != 1:
+        raise SystemExit("the two modes stored different trees")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#
+# Benchmark: reading pages from the page store vs. re-extracting the PDFs
+#
+#   python bench_page_store.py --pdfs pdfs
+#
+# Extracts every PDF with PyPDFLoader once (what every re-chunking run used
+# to pay), writes the pages to a scratch PageStore, then times reading them
+# all back and splitting them with the 1000/200 settings of
+# openai-rag-arxiv.py.
+#
+
+import argparse
+import tempfile
+import time
+
+from langchain.document_loaders import PyPDFLoader
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from ingest_manifest import file_hash
+from page_store import PageStore
+from pdf_store_loader import list_pdfs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time page store reads against PDF re-extraction.")
+    parser.add_argument("--pdfs", default="pdfs")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = list_pdfs(args.pdfs)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store = PageStore(scratch)
+        hashes = {}
+
+        start = time.perf_counter()
+        extracted = 0
+        for path in paths:
+            pages = PyPDFLoader(path).load()
+            extracted += len(pages)
+            hashes[path] = file_hash(path)
+            store.put(hashes[path], [(p.page_content, p.metadata) for p in pages])
+        store.flush()
+        extract_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunks = 0
+        for path in paths:
+            pages = PyPDFLoader(path).load()
+            chunks += len(splitter.split_documents(pages))
+        reextract_time = time.perf_counter() - start
+
+        reader = PageStore(scratch, readonly=True)
+        start = time.perf_counter()
+        read = 0
+        for path in paths:
+            read += len(reader.get(hashes[path], source=path))
+        read_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stored_chunks = 0
+        for path in paths:
+            docs = [Document(page_content=t, metadata=m) for t, m in reader.get(hashes[path], source=path)]
+            stored_chunks += len(splitter.split_documents(docs))
+        resplit_time = time.perf_counter() - start
+
+        print(f"files: {len(paths)}\tpages: {extracted}\tstore bytes: {store.stats()['bytes']}")
+        print(f"extract + store:        {extract_time:8.3f}s")
+        print(f"re-extract + split:     {reextract_time:8.3f}s\t{chunks} chunks")
+        print(f"page store read:        {read_time:8.3f}s\t{read / read_time if read_time else 0:.0f} pages/s")
+        print(f"page store read + split:{resplit_time:8.3f}s\t{stored_chunks} chunks")
+        if resplit_time:
+            print(f"speedup: {reextract_time / resplit_time:.1f}x")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
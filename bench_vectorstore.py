@@ -0,0 +1,75 @@
+#
+# Benchmark: LocalVectorStore open time, query latency and IVF recall
+#
+#   python bench_vectorstore.py --rows 200000 --dim 384 --dtype float16
+#
+# Vectors are random clusters of the dimension of all-MiniLM-L6-v2. Queries
+# are perturbed copies of stored rows; recall@k is measured against an
+# exact scan of the same store (nprobe = number of lists).
+#
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from local_vectorstore import DTYPES, LocalVectorStore
+
+
+def clustered(rows, dim, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    return centers[labels] + 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time LocalVectorStore queries and measure IVF recall.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--dtype", choices=DTYPES, default="float32")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    vectors = clustered(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(args.rows, args.queries, replace=False)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store = LocalVectorStore(scratch, dtype=args.dtype)
+        start = time.perf_counter()
+        for i in range(0, args.rows, 10000):
+            n = min(10000, args.rows - i)
+            store.add_embeddings([str(j) for j in range(i, i + n)], vectors[i:i + n],
+                                 ids=[str(j) for j in range(i, i + n)])
+        store.build_index()
+        build = time.perf_counter() - start
+        store.close()
+
+        start = time.perf_counter()
+        store = LocalVectorStore(scratch)
+        opened = time.perf_counter() - start
+
+        store.nprobe = store.meta["nlist"]
+        exact = [{r["id"] for r, _ in store.search_vector(q, args.k)} for q in queries]
+        print(json.dumps({"rows": args.rows, "dim": args.dim, "dtype": args.dtype,
+                          "nlist": store.meta["nlist"], "build_s": build, "open_ms": opened * 1000}))
+
+        for nprobe in args.nprobe:
+            store.nprobe = nprobe
+            start = time.perf_counter()
+            found = [{r["id"] for r, _ in store.search_vector(q, args.k)} for q in queries]
+            elapsed = time.perf_counter() - start
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+            print(json.dumps({"nprobe": nprobe, "ms_per_query": elapsed / args.queries * 1000,
+                              f"recall@{args.k}": float(recall)}))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#
+# Content-addressed embedding cache
+#
+# pdf_store_loader runs, the arXiv RAG script and notebook experiments keep
+# re-embedding the same chunk texts and queries. CachedEmbeddings wraps any
+# LangChain Embeddings and keys vectors by the hash of (model name,
+# normalized text). Recently used vectors are kept in an in-memory LRU; all
+# vectors are kept on disk in an append-only matrix that is read through a
+# memory map. Only the misses of a call are computed, in one batch.
+# embed_documents() and embed_query() return lists, as LangChain vector
+# stores expect; encode() returns the float32 array.
+#
+# Layout of the cache directory:
+#   meta.json     model name, dtype and dimension; reopening with another
+#                 model or dtype, or appending vectors of another width,
+#                 raises ValueError
+#   vectors.bin   row-major float16/float32 matrix, one row per key
+#   keys.bin      32-byte sha256 digests; row i of vectors.bin is key i
+#   lock          flock()ed while appending, so processes can share a cache
+#
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WHITESPACE = re.compile(r"\s+")
+KEY_SIZE = 32
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with a hot LRU tier and a memory-mapped disk tier."""
+
+    def __init__(self,
+                 embeddings,
+                 path,
+                 model_name=None,
+                 dtype=None,
+                 memory_entries=50000) -> None:
+        self.embeddings = embeddings
+        self.path = path
+        self.model_name = model_name or getattr(embeddings, "model_name", None) \
+            or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.dtype = np.dtype(dtype or "float32")
+        self.memory_entries = memory_entries
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._keys_path = os.path.join(path, "keys.bin")
+        self._lock_path = os.path.join(path, "lock")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._dim = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta["model_name"] != self.model_name:
+                raise ValueError(f"embedding cache {path} holds vectors of {meta['model_name']!r}, "
+                                 f"not {self.model_name!r}")
+            if dtype is not None and np.dtype(dtype) != np.dtype(meta["dtype"]):
+                raise ValueError(f"embedding cache {path} stores {meta['dtype']}, not {np.dtype(dtype).name}")
+            self.dtype = np.dtype(meta["dtype"])
+            self._dim = meta["dim"]
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._rows = {}
+        self._keys_read = 0
+        self._matrix = None
+        self._refresh()
+
+    def _refresh(self):
+        # Pick up keys appended since the last look, by us or other processes.
+        if not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_read * KEY_SIZE)
+            data = f.read()
+        count = len(data) // KEY_SIZE
+        for i in range(count):
+            self._rows[data[i * KEY_SIZE:(i + 1) * KEY_SIZE]] = self._keys_read + i
+        self._keys_read += count
+
+    def _disk_vectors(self):
+        if self._dim is None or self._keys_read == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] < self._keys_read:
+            self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                     shape=(self._keys_read, self._dim))
+        return self._matrix
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _append(self, keys, vectors):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self._dim is None and os.path.exists(self._meta_path):
+                    # Another process created the cache since we opened it.
+                    with open(self._meta_path) as f:
+                        self._dim = json.load(f)["dim"]
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    tmp = self._meta_path + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump({"model_name": self.model_name, "dtype": self.dtype.name,
+                                   "dim": self._dim}, f)
+                    os.replace(tmp, self._meta_path)
+                if vectors.ndim != 2 or vectors.shape[1] != self._dim:
+                    raise ValueError(f"embedding cache {self.path} holds {self._dim}-dimensional vectors, "
+                                     f"got shape {vectors.shape}")
+                fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+                if not fresh:
+                    return
+                row_bytes = self._dim * self.dtype.itemsize
+                with open(self._vectors_path, "ab") as f:
+                    # Drop rows left behind by a writer that died before
+                    # appending their keys.
+                    f.truncate(self._keys_read * row_bytes)
+                    f.write(np.ascontiguousarray(vectors[fresh], dtype=self.dtype).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(keys[i] for i in fresh))
+                self._refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def encode(self, texts):
+        """Embed texts as a float32 array, computing only the cache misses."""
+        texts = list(texts)
+        keys = [text_key(self.model_name, t) for t in texts]
+        out = [None] * len(texts)
+        missing = OrderedDict()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    out[i] = vector
+            if any(v is None for v in out):
+                self._refresh()
+                matrix = self._disk_vectors()
+                for i, key in enumerate(keys):
+                    if out[i] is not None:
+                        continue
+                    row = self._rows.get(key)
+                    if row is not None and matrix is not None and row < matrix.shape[0]:
+                        out[i] = np.asarray(matrix[row], dtype=np.float32)
+                        self._remember(key, out[i])
+                        self.disk_hits += 1
+                    else:
+                        missing.setdefault(key, []).append(i)
+
+        if missing:
+            first = [positions[0] for positions in missing.values()]
+            # An EmbeddingEngine hands back its array without a detour through lists.
+            embed = getattr(self.embeddings, "encode", self.embeddings.embed_documents)
+            computed = np.asarray(embed([texts[i] for i in first]), dtype=np.float32)
+            miss_keys = list(missing)
+            with self._lock:
+                self.misses += len(miss_keys)
+                self._append(miss_keys, computed)
+                for key, vector, positions in zip(miss_keys, computed, missing.values()):
+                    self._remember(key, vector)
+                    for i in positions:
+                        out[i] = vector
+
+        if not out:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        return np.stack(out).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+    def __len__(self):
+        return self._keys_read
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": self._keys_read,
+            "memory_entries": len(self._memory),
+        }
+
+    def __getstate__(self):
+        # Reopened lazily in the receiving process.
+        state = dict(self.__dict__)
+        state.update(_lock=None, _matrix=None, _memory=OrderedDict(), _rows={}, _keys_read=0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._refresh()
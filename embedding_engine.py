@@ -0,0 +1,167 @@
+#
+# Length-bucketed, multi-process batch embedding for all-MiniLM-L6-v2
+#
+# HuggingFaceEmbeddings (see embedding_test.py) encodes texts in the order
+# given, with a fixed batch size, on one core. With mixed-length chunks most
+# of each batch is padding. EmbeddingEngine sorts texts by token length,
+# packs batches up to a padded-token budget, and spreads the batches over a
+# pool of processes that each load the model once. encode() returns one
+# float32 NumPy matrix in the original order.
+#
+# It implements the LangChain Embeddings interface, so it can be used
+# wherever HuggingFaceEmbeddings is used today; like it, embed_documents()
+# and embed_query() return lists of floats.
+#
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256
+
+# Per-process model set up by _init_worker.
+_model = None
+
+
+def _load_model(model_name, threads=None):
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    return SentenceTransformer(model_name)
+
+
+def _init_worker(model_name, threads):
+    global _model
+    _model = _load_model(model_name, threads)
+
+
+def _encode(model, texts, normalize):
+    return model.encode(texts,
+                        batch_size=len(texts),
+                        convert_to_numpy=True,
+                        normalize_embeddings=normalize,
+                        show_progress_bar=False).astype(np.float32, copy=False)
+
+
+def _encode_in_worker(texts, normalize):
+    return _encode(_model, texts, normalize)
+
+
+def plan_batches(lengths, max_tokens=16384, max_batch_size=256):
+    """Group text indices into batches of similar length.
+
+    Indices are taken in order of decreasing length and a batch is closed
+    once its padded size (count x longest) would exceed max_tokens, so short
+    texts share batches with short texts and long with long.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches, batch, longest = [], [], 0
+    for i in order:
+        n = max(1, min(int(lengths[i]), MAX_SEQ_LENGTH))
+        longest_after = max(longest, n)
+        if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * longest_after > max_tokens):
+            batches.append(batch)
+            batch, longest_after = [], n
+        batch.append(int(i))
+        longest = longest_after
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class EmbeddingEngine(Embeddings):
+    """Batch embedding engine; workers=1 encodes in this process."""
+
+    def __init__(self,
+                 model_name=MODEL_NAME,
+                 workers=1,
+                 max_tokens=16384,
+                 max_batch_size=256,
+                 normalize=False) -> None:
+        self.model_name = model_name
+        self.workers = workers
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.normalize = normalize
+        self._model = None
+        self._tokenizer = None
+        self._pool = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = _load_model(self.model_name)
+        return self._model
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def _pool_executor(self):
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             initializer=_init_worker,
+                                             initargs=(self.model_name, threads))
+        return self._pool
+
+    def token_lengths(self, texts):
+        """Token counts from the model's tokenizer, or a character estimate."""
+        if self._tokenizer is None:
+            try:
+                from transformers import AutoTokenizer
+                name = self.model_name if "/" in self.model_name else "sentence-transformers/" + self.model_name
+                self._tokenizer = AutoTokenizer.from_pretrained(name)
+            except Exception:
+                self._tokenizer = False
+        if self._tokenizer:
+            encoded = self._tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                                      max_length=MAX_SEQ_LENGTH)["input_ids"]
+            return [len(ids) for ids in encoded]
+        return [len(t) // 4 + 2 for t in texts]
+
+    def encode(self, texts):
+        """Embed texts; returns a (len(texts), dim) float32 array."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = plan_batches(self.token_lengths(texts), self.max_tokens, self.max_batch_size)
+        chunks = [[texts[i] for i in batch] for batch in batches]
+
+        if self.workers > 1 and len(batches) > 1:
+            pool = self._pool_executor()
+            results = pool.map(_encode_in_worker, chunks, [self.normalize] * len(chunks))
+        else:
+            results = (_encode(self.model, chunk, self.normalize) for chunk in chunks)
+
+        out = None
+        for batch, vectors in zip(batches, results):
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+        return out
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __getstate__(self):
+        # Models and pools stay in the process that created them.
+        state = dict(self.__dict__)
+        state.update(_model=None, _tokenizer=None, _pool=None)
+        return state
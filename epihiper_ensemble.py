@@ -0,0 +1,293 @@
+#
+# Ensembles of perturbed EpiHiper configs for uncertainty sweeps
+#
+# EpiHiper-Schema-master/lib/epiHiperAddNoise.js perturbs the numbers at
+# one JSONPath in one file with one draw per run. An Ensemble applies the
+# same perturbations to a base config (usually a disease model or a
+# scenario) for N variants at once. The semantics are the same:
+#
+#   normal    value * (1 + sigma * z)                   needs sigma
+#   uniform   min + u * (max - min), or an integer      needs min and max
+#             in [min, max] with integer
+#   fixed     value                                     needs value
+#
+# Results are clamped at 0 unless negative is set and rounded when integer
+# is set. Only numbers are perturbed. Perturbations apply in order, so a
+# later one on the same path perturbs the earlier result.
+#
+# All draws come from one seeded numpy Generator in one (variants x
+# targets) array. The base config is serialized once with placeholders at
+# the targets, so writing a variant only formats its numbers into that
+# template. Variants are written one at a time, to a directory of files or
+# to a JSON-lines file. samples.npy and manifest.json record the drawn
+# values and where they went. With validate, the variants are checked in
+# bulk with epihiper_validator.py and invalid ones are removed.
+#
+#   python epihiper_ensemble.py diseaseModel.json -n 10000 --seed 7 --out sweep \
+#       --path '$..transmissibility' --distribution normal --sigma 0.1
+#   python epihiper_ensemble.py diseaseModel.json -n 10000 --spec perturbations.json --out sweep
+#
+
+import argparse
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+from epihiper_validator import jsonpath_nodes, validate_many
+
+DISTRIBUTIONS = ("normal", "uniform", "fixed")
+_PLACEHOLDER = "@@noise:{}@@"
+_SLOT = re.compile(r'"@@noise:(\d+)@@"')
+
+
+class Perturbation:
+    """One path/distribution pair, checked like EpiHiperAddNoise."""
+
+    def __init__(self,
+                 path,
+                 distribution,
+                 sigma=math.nan,
+                 min=math.nan,
+                 max=math.nan,
+                 value=math.nan,
+                 integer=False,
+                 negative=False) -> None:
+        if not path:
+            raise ValueError("Perturbation: missing path")
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Perturbation: invalid distribution {distribution!r} [normal|uniform|fixed]")
+        self.path = path
+        self.distribution = distribution
+        self.sigma = float(sigma)
+        self.min = float(min)
+        self.max = float(max)
+        self.value = float(value)
+        self.integer = bool(integer)
+        self.negative = bool(negative)
+
+        if distribution == "normal" and math.isnan(self.sigma):
+            raise ValueError("Perturbation: missing sigma for normal distribution")
+        if distribution == "uniform" and (math.isnan(self.min) or math.isnan(self.max)):
+            raise ValueError("Perturbation: missing min or max for uniform distribution")
+        if distribution == "fixed" and math.isnan(self.value):
+            raise ValueError("Perturbation: missing value for fixed distribution")
+
+        if distribution == "uniform":
+            if self.integer:
+                self.min, self.max = float(round(self.min)), float(round(self.max))
+            if self.min == self.max:
+                self.distribution, self.value = "fixed", self.min
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(**spec)
+
+    def to_dict(self):
+        return {k: v for k, v in vars(self).items() if not (isinstance(v, float) and math.isnan(v))}
+
+    def draw(self, rng, current):
+        """New values for an (n, targets) array of current values."""
+        n, k = current.shape
+        if self.distribution == "normal":
+            values = current * (1.0 + self.sigma * rng.standard_normal((n, k)))
+        elif self.distribution == "uniform" and self.integer:
+            values = rng.integers(int(self.min), int(self.max), size=(n, k), endpoint=True).astype(float)
+        elif self.distribution == "uniform":
+            values = self.min + rng.random((n, k)) * (self.max - self.min)
+        else:
+            values = np.full((n, k), self.value)
+        if not self.negative:
+            np.maximum(values, 0.0, out=values)
+        if self.integer:
+            # Math.round rounds halves up.
+            values = np.floor(values + 0.5)
+        return values
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _get(node, location):
+    for key in location:
+        node = node[key]
+    return node
+
+
+def _set(node, location, value):
+    for key in location[:-1]:
+        node = node[key]
+    node[location[-1]] = value
+
+
+class Ensemble:
+    """N perturbed variants of one base config."""
+
+    def __init__(self, base, perturbations, seed=None) -> None:
+        self.base = base
+        self.perturbations = [p if isinstance(p, Perturbation) else Perturbation.from_dict(p)
+                              for p in perturbations]
+        self.seed = seed
+
+        # Targets are the numeric locations any perturbation touches; each
+        # perturbation keeps the column indexes of its own targets.
+        self.targets = []
+        self.columns = []
+        index = {}
+        for perturbation in self.perturbations:
+            columns = []
+            for location, value in jsonpath_nodes(base, perturbation.path):
+                if not _is_number(value):
+                    continue
+                if location not in index:
+                    index[location] = len(self.targets)
+                    self.targets.append(location)
+                columns.append(index[location])
+            self.columns.append(np.array(columns, dtype=np.intp))
+        self.integer = np.zeros(len(self.targets), dtype=bool)
+        for perturbation, columns in zip(self.perturbations, self.columns):
+            self.integer[columns] = perturbation.integer
+
+        template = json.loads(json.dumps(base))
+        for t, location in enumerate(self.targets):
+            _set(template, location, _PLACEHOLDER.format(t))
+        parts = _SLOT.split(json.dumps(template))
+        self._text = parts[0::2]
+        self._slots = [int(t) for t in parts[1::2]]
+
+    def sample(self, n):
+        """An (n, targets) array of drawn values, in one pass per perturbation."""
+        rng = np.random.default_rng(self.seed)
+        values = np.tile(np.array([_get(self.base, location) for location in self.targets], dtype=float),
+                         (n, 1))
+        for perturbation, columns in zip(self.perturbations, self.columns):
+            if len(columns):
+                values[:, columns] = perturbation.draw(rng, values[:, columns])
+        return values
+
+    def render(self, row):
+        """JSON text of the variant with the values in row."""
+        numbers = [str(int(v)) if integer else repr(float(v)) for v, integer in zip(row.tolist(), self.integer)]
+        out = [self._text[0]]
+        for slot, text in zip(self._slots, self._text[1:]):
+            out.append(numbers[slot])
+            out.append(text)
+        return "".join(out)
+
+    def variants(self, n):
+        """Yield (index, json text) for n variants."""
+        samples = self.sample(n)
+        for i in range(n):
+            yield i, self.render(samples[i])
+
+    def manifest(self, n):
+        return {
+            "seed": self.seed,
+            "variants": n,
+            "perturbations": [p.to_dict() for p in self.perturbations],
+            "targets": ["$" + "".join(f"[{k}]" if isinstance(k, int) else f".{k}" for k in location)
+                        for location in self.targets],
+        }
+
+    def write(self, out, n, jsonl=False, validate=False, workers=None):
+        """Write n variants under directory out; returns a stats dict.
+
+        Variants go to out/variant-<i>.json, or to out/variants.jsonl with
+        jsonl. The drawn values are saved as out/samples.npy.
+        """
+        os.makedirs(out, exist_ok=True)
+        start = time.perf_counter()
+        samples = self.sample(n)
+        drawn = time.perf_counter()
+        np.save(os.path.join(out, "samples.npy"), samples)
+
+        width = len(str(max(n - 1, 0)))
+        paths = []
+        if jsonl:
+            with open(os.path.join(out, "variants.jsonl"), "w") as f:
+                for i in range(n):
+                    f.write(self.render(samples[i]))
+                    f.write("\n")
+        else:
+            for i in range(n):
+                path = os.path.join(out, f"variant-{i:0{width}d}.json")
+                with open(path, "w") as f:
+                    f.write(self.render(samples[i]))
+                paths.append(path)
+        written = time.perf_counter()
+
+        manifest = self.manifest(n)
+        if validate:
+            if jsonl:
+                with open(os.path.join(out, "variants.jsonl")) as f:
+                    items = [json.loads(line) for line in f]
+            else:
+                items = paths
+            invalid = [i for i, result in enumerate(validate_many(items, workers)) if not result["valid"]]
+            if not jsonl:
+                for i in invalid:
+                    os.remove(paths[i])
+            manifest["invalid"] = invalid
+        validated = time.perf_counter()
+
+        with open(os.path.join(out, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return {
+            "variants": n,
+            "targets": len(self.targets),
+            "sample_s": drawn - start,
+            "write_s": written - drawn,
+            "validate_s": validated - written if validate else None,
+            "invalid": len(manifest.get("invalid", ())),
+            "variants_per_s": n / (written - start) if written > start else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write N perturbed variants of an EpiHiper config.")
+    parser.add_argument("base", help="the config to perturb")
+    parser.add_argument("-n", "--variants", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--jsonl", action="store_true", help="write one variants.jsonl instead of one file each")
+    parser.add_argument("--spec", help='JSON file with {"perturbations": [{"path": ..., "distribution": ...}, ...]}')
+    parser.add_argument("--path", help="JSONPath of the values to perturb")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS)
+    parser.add_argument("--sigma", type=float, default=math.nan)
+    parser.add_argument("--min", type=float, default=math.nan)
+    parser.add_argument("--max", type=float, default=math.nan)
+    parser.add_argument("--value", type=float, default=math.nan)
+    parser.add_argument("--integer", action="store_true")
+    parser.add_argument("--negative", action="store_true")
+    parser.add_argument("--validate", action="store_true", help="validate the variants and remove invalid ones")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    perturbations = []
+    if args.spec:
+        with open(args.spec) as f:
+            perturbations.extend(json.load(f)["perturbations"])
+    if args.path:
+        perturbations.append({"path": args.path, "distribution": args.distribution, "sigma": args.sigma,
+                              "min": args.min, "max": args.max, "value": args.value,
+                              "integer": args.integer, "negative": args.negative})
+    if not perturbations:
+        parser.error("give --spec or --path and --distribution")
+
+    with open(args.base) as f:
+        base = json.load(f)
+    try:
+        ensemble = Ensemble(base, perturbations, args.seed)
+    except ValueError as e:
+        # A bad distribution or a JSONPath outside the supported subset.
+        parser.error(str(e))
+    stats = ensemble.write(args.out, args.variants, args.jsonl, args.validate, args.workers)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
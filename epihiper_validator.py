@@ -0,0 +1,471 @@
+#
+# Bulk validation of EpiHiper configs against schemas and jsontron rules
+#
+# The Python counterpart of EpiHiper-Schema-master/lib/epiHiperValidator.js.
+# A config names its schema in epiHiperSchema (or $schema). It is checked
+# against that *Schema.json with jsonschema and then against the matching
+# *Rules.json. runParameters and modelScenario configs also validate the
+# files they reference, as the Node validator does.
+#
+# Each schema is compiled into a jsonschema validator once and cached, and
+# each rule assertion into a Python check. The jsontron tests are
+# JavaScript, but every test in the EpiHiper rules is one of three forms:
+#   jp.query(X, 'p').length == new Set(jp.query(X, 'p')).size   unique ids
+#   jp.query(X, 'p').includes(jp.query(Y, 'q')[0] | contextNode[0])
+#   the summed transition probabilities out of a state being 1
+# Other forms are reported as "unsupported" instead of passing silently.
+# JSONPath queries use the subset those rules and epihiper_ensemble.py
+# need (JSONPATH_SUBSET); other paths raise ValueError.
+#
+# Batches of configs are spread over a process pool. Each worker compiles
+# the validators once. Results are structured dicts, and the command line
+# reports configs per second:
+#
+#   python epihiper_validator.py --workers 8 configs/*.json
+#
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from schema_registry import SCHEMA_DIR, SchemaRegistry
+
+REFERENCING_SCHEMAS = ("runParametersSchema.json", "modelScenarioSchema.json")
+REFERENCE_KEYS = ("modelScenario", "diseaseModel", "initialization", "intervention", "traits", "personTraitDB")
+BASE_URI = "file:///epihiper/"
+
+# -- JSONPath subset ----------------------------------------------------------
+
+JSONPATH_SUBSET = """$, .name, ..name, .*, ..*, [*], [n], ['name'] and [?(@.name == "value")]"""
+
+_STEP = re.compile(r"""
+    \.\.(?P<deep>[\w$-]+|\*)
+  | \.(?P<child>[\w$-]+|\*)
+  | \[(?P<wild>\*)\]
+  | \[(?P<index>\d+)\]
+  | \['(?P<quoted>[^']*)'\]
+  | \[\?\(@\.(?P<key>[\w$-]+)\s*==\s*(?P<q>["'])(?P<value>.*?)(?P=q)\)\]
+""", re.X)
+
+_paths = {}
+
+
+def _children(node, location=()):
+    if isinstance(node, dict):
+        return [(location + (k,), v) for k, v in node.items()]
+    if isinstance(node, list):
+        return [(location + (i,), v) for i, v in enumerate(node)]
+    return []
+
+
+def _descendants(node, location=()):
+    yield location, node
+    for sub_location, child in _children(node, location):
+        yield from _descendants(child, sub_location)
+
+
+def _compile_path(path):
+    if path not in _paths:
+        unsupported = f"unsupported JSONPath {path!r} (supported: {JSONPATH_SUBSET})"
+        if not path.startswith("$"):
+            raise ValueError(unsupported)
+        steps, position = [], 1
+        while position < len(path):
+            match = _STEP.match(path, position)
+            if match is None:
+                raise ValueError(unsupported)
+            steps.append({k: v for k, v in match.groupdict().items() if v is not None})
+            position = match.end()
+        _paths[path] = steps
+    return _paths[path]
+
+
+def jsonpath_nodes(node, path):
+    """(location, value) pairs matched by a JSONPath, in document order.
+
+    A location is the tuple of keys and indexes leading to the value.
+    """
+    nodes = [((), node)]
+    for step in _compile_path(path):
+        found = []
+        for location, current in nodes:
+            if "deep" in step:
+                name = step["deep"]
+                for sub_location, sub in _descendants(current, location):
+                    if name == "*":
+                        found.extend(_children(sub, sub_location))
+                    elif isinstance(sub, dict) and name in sub:
+                        found.append((sub_location + (name,), sub[name]))
+            elif "wild" in step:
+                found.extend(_children(current, location))
+            elif "child" in step or "quoted" in step:
+                name = step.get("child", step.get("quoted"))
+                if name == "*":
+                    found.extend(_children(current, location))
+                elif isinstance(current, dict) and name in current:
+                    found.append((location + (name,), current[name]))
+            elif "index" in step:
+                i = int(step["index"])
+                if isinstance(current, list) and i < len(current):
+                    found.append((location + (i,), current[i]))
+            else:
+                found.extend((loc, c) for loc, c in _children(current, location)
+                             if isinstance(c, dict) and str(c.get(step["key"])) == step["value"])
+        nodes = found
+    return nodes
+
+
+def jsonpath(node, path):
+    """Values matched by a JSONPath, in document order."""
+    return [value for _, value in jsonpath_nodes(node, path)]
+
+
+# -- jsontron rules -----------------------------------------------------------
+
+_Q = r"jp\.query\((contextNode|documentRoot),\s*'([^']*)'\)"
+_UNIQUE = re.compile(rf"^{_Q}\.length == new Set\({_Q}\)\.size$")
+_INCLUDES = re.compile(rf"^{_Q}\.includes\((?:{_Q}\[0\]|contextNode\[0\])\)$")
+_PROBABILITY = re.compile(
+    r"""^const Q = '(?P<prefix>[^']*)' \+ contextNode\[0\] \+ '(?P<suffix>[^']*)';\s*"""
+    r"""const T = eval\(jp\.query\(documentRoot, Q\)\.join\('\+'\)\);\s*"""
+    r"""typeof T === 'undefined' \|\| T\.toPrecision\(14\) == 1$""")
+_TERM = re.compile(r"""\s*(?:'(?P<s1>[^']*)'|"(?P<s2>[^"]*)"|(?P<ctx>contextNode\[0\])"""
+                   r"""|jp\.query\((?P<scope>contextNode|documentRoot),\s*'(?P<path>[^']*)'\)(?P<first>\[0\])?)"""
+                   r"""\s*(?:\+|$)""")
+
+
+def _hashable(value):
+    return value if isinstance(value, (str, int, float, bool, type(None))) else json.dumps(value, sort_keys=True)
+
+
+def _js_string(value):
+    # How JavaScript concatenates arrays and scalars into strings.
+    if isinstance(value, list):
+        return ",".join(_js_string(v) for v in value)
+    if value is None:
+        return "undefined"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class Root:
+    """The document root of one instance, with its queries memoized.
+
+    Rules with a per-node context ask the same documentRoot query once
+    per node, so the results (and their value sets) are computed once.
+    """
+
+    def __init__(self, value) -> None:
+        self.value = value
+        self._found = {}
+        self._sets = {}
+
+    def query(self, path):
+        if path not in self._found:
+            self._found[path] = jsonpath(self.value, path)
+        return self._found[path]
+
+    def values(self, path):
+        if path not in self._sets:
+            self._sets[path] = {_hashable(v) for v in self.query(path)}
+        return self._sets[path]
+
+
+def _query(which, path, context, root):
+    return jsonpath(context, path) if which == "contextNode" else root.query(path)
+
+
+def compile_test(test):
+    """A Python check(context, root) -> bool for a jsontron test, or None.
+
+    context is the one-element list jsontron passes as contextNode and
+    root a Root.
+    """
+    test = " ".join(test.split())
+
+    match = _UNIQUE.match(test)
+    if match and match.group(1, 2) == match.group(3, 4):
+        which, path = match.group(1, 2)
+        _compile_path(path)
+
+        def unique(context, root):
+            values = [_hashable(v) for v in _query(which, path, context, root)]
+            return len(values) == len(set(values))
+        return unique
+
+    match = _INCLUDES.match(test)
+    if match:
+        which, path, other, other_path = match.groups()
+        _compile_path(path)
+        if other_path:
+            _compile_path(other_path)
+
+        def includes(context, root):
+            if other is None:
+                needle = context[0]
+            else:
+                found = _query(other, other_path, context, root)
+                if not found:
+                    return False
+                needle = found[0]
+            if which == "documentRoot":
+                return _hashable(needle) in root.values(path)
+            return any(needle == v for v in jsonpath(context, path))
+        return includes
+
+    match = _PROBABILITY.match(test)
+    if match:
+        prefix, suffix = match.group("prefix", "suffix")
+
+        def probability(context, root):
+            values = root.query(f"{prefix}{context[0]}{suffix}")
+            return not values or float(f"{sum(values):.14g}") == 1
+        return probability
+
+    return None
+
+
+def compile_message(message):
+    """A function(context, root) -> str for a jsontron message expression."""
+    if not message.startswith(("'", '"')):
+        return lambda context, root: message
+    terms, position = [], 0
+    while position < len(message):
+        match = _TERM.match(message, position)
+        if match is None or match.end() == position:
+            return lambda context, root: message
+        terms.append(match.groupdict())
+        position = match.end()
+
+    def render(context, root):
+        out = []
+        for term in terms:
+            if term["s1"] is not None or term["s2"] is not None:
+                out.append(term["s1"] if term["s1"] is not None else term["s2"])
+            elif term["ctx"]:
+                out.append(_js_string(context[0]))
+            else:
+                found = _query(term["scope"], term["path"], context, root)
+                out.append(_js_string((found[0] if found else None) if term["first"] else found))
+        return "".join(out)
+    return render
+
+
+class CompiledRules:
+    """A *Rules.json with each active assertion compiled once."""
+
+    def __init__(self, rules) -> None:
+        schema = rules["schema"]
+        phases = {p["id"]: set(p.get("active", ())) for p in schema.get("phase", ())}
+        active = phases.get(schema.get("defaultPhase"))
+        self.assertions = []
+        self.unsupported = []
+        for pattern in schema.get("pattern", ()):
+            if pattern.get("abstract") or (active is not None and pattern["id"] not in active):
+                continue
+            for rule in pattern.get("rule", ()):
+                _compile_path(rule["context"])
+                for assertion in rule.get("assert", ()):
+                    check = compile_test(assertion["test"])
+                    if check is None:
+                        self.unsupported.append(assertion["id"])
+                        continue
+                    self.assertions.append((pattern["id"], rule["id"], rule["context"], assertion["id"],
+                                            check, compile_message(assertion.get("message", ""))))
+
+    def validate(self, instance):
+        errors = []
+        root = Root(instance)
+        for pattern, rule, context_path, assertion, check, message in self.assertions:
+            for node in root.query(context_path):
+                context = [node]
+                try:
+                    passed = check(context, root)
+                except (ValueError, TypeError) as e:
+                    # Malformed instance data (e.g. an id that breaks the
+                    # JSONPath built from it, or a non-numeric probability)
+                    # fails this config, not the whole batch.
+                    errors.append({"kind": "rule", "pattern": pattern, "rule": rule, "assert": assertion,
+                                   "context": context_path,
+                                   "message": f"cannot evaluate for {_js_string(node)}: {e}"})
+                    continue
+                if not passed:
+                    errors.append({"kind": "rule", "pattern": pattern, "rule": rule, "assert": assertion,
+                                   "context": context_path, "message": message(context, root)})
+        for assertion in self.unsupported:
+            errors.append({"kind": "unsupported", "assert": assertion,
+                           "message": "test expression not supported by the Python validator"})
+        return errors
+
+
+# -- validator ----------------------------------------------------------------
+
+def schema_name(instance):
+    uri = instance.get("epiHiperSchema") or instance.get("$schema") or ""
+    return os.path.basename(uri)
+
+
+def resolve_path(spec, relative_to):
+    match = re.match(r"^self://(.+)$", spec)
+    if match:
+        return os.path.normpath(os.path.join(relative_to, match.group(1)))
+    return os.path.abspath(spec)
+
+
+class EpiHiperValidator:
+    """Schema and rules validation with compiled validators cached per file."""
+
+    def __init__(self, schema_dir=SCHEMA_DIR, registry=None) -> None:
+        self.registry = registry if registry is not None else SchemaRegistry(schema_dir)
+        self._schemas = {}
+        self._rules = {}
+        self._resources = None
+
+    def _resource_registry(self):
+        from referencing import Registry, Resource
+        from referencing.jsonschema import DRAFT7
+
+        if self._resources is None:
+            resources = []
+            for name in self.registry.files("Schema.json") + self.registry.files("typeRegistry.json"):
+                try:
+                    document = dict(self.registry.document(name), **{"$id": BASE_URI + name})
+                except (KeyError, ValueError):
+                    continue
+                resources.append((BASE_URI + name, Resource.from_contents(document, default_specification=DRAFT7)))
+            self._resources = Registry().with_resources(resources)
+        return self._resources
+
+    def schema_validator(self, name):
+        """The compiled jsonschema validator for a *Schema.json, or None."""
+        if name not in self._schemas:
+            from jsonschema import Draft7Validator
+
+            if name not in self.registry.files(name):
+                self._schemas[name] = None
+            else:
+                resources = self._resource_registry()
+                self._schemas[name] = Draft7Validator(resources.contents(BASE_URI + name), registry=resources)
+        return self._schemas[name]
+
+    def rules(self, name):
+        """The compiled rules for a *Rules.json, or None."""
+        if name not in self._rules:
+            self._rules[name] = CompiledRules(self.registry.document(name)) if name in self.registry.files(name) else None
+        return self._rules[name]
+
+    def validate(self, instance, path=None, rules=True, seen=None):
+        """Validation result dict for one parsed config."""
+        name = schema_name(instance)
+        result = {"path": path, "schema": name, "valid": True, "errors": [], "referenced": []}
+        validator = self.schema_validator(name) if name else None
+        if validator is None:
+            result["errors"].append({"kind": "schema", "message": f"Schema: {name or '(none)'} not found."})
+        else:
+            from jsonschema.exceptions import SchemaError
+            from referencing.exceptions import Unresolvable
+
+            try:
+                for error in validator.iter_errors(instance):
+                    result["errors"].append({"kind": "schema",
+                                             "path": "/" + "/".join(map(str, error.absolute_path)),
+                                             "validator": error.validator, "message": error.message})
+            except Unresolvable as e:
+                # A broken schema (e.g. a $ref to a file missing from the
+                # tree) fails this config, not the whole batch.
+                result["errors"].append({"kind": "schema", "validator": "$ref", "message": f"{name}: {e}"})
+            except SchemaError as e:
+                result["errors"].append({"kind": "schema", "validator": "schema",
+                                         "message": f"{name}: invalid schema: {e.message}"})
+            if rules and not result["errors"]:
+                compiled = self.rules(name.replace("Schema.json", "Rules.json"))
+                if compiled is not None:
+                    result["errors"].extend(compiled.validate(instance))
+
+        if name in REFERENCING_SCHEMAS and not result["errors"] and path is not None:
+            seen = seen if seen is not None else {os.path.abspath(path)}
+            for key in REFERENCE_KEYS:
+                specs = instance.get(key)
+                for spec in specs if isinstance(specs, list) else [specs] if specs else []:
+                    target = resolve_path(spec, os.path.dirname(os.path.abspath(path)))
+                    if target in seen:
+                        continue
+                    seen.add(target)
+                    sub = self.validate_file(target, rules, seen)
+                    result["referenced"].append(sub)
+                    result["valid"] &= sub["valid"]
+        result["valid"] &= not result["errors"]
+        return result
+
+    def validate_file(self, path, rules=True, seen=None):
+        try:
+            with open(path) as f:
+                instance = json.load(f)
+        except (OSError, ValueError) as e:
+            return {"path": path, "schema": None, "valid": False, "referenced": [],
+                    "errors": [{"kind": "load", "message": str(e)}]}
+        return self.validate(instance, path, rules, seen)
+
+
+# -- process pool -------------------------------------------------------------
+
+_validator = None
+
+
+def _init_worker(schema_dir):
+    global _validator
+    _validator = EpiHiperValidator(schema_dir)
+
+
+def _validate_in_worker(item, rules):
+    kind, value = item
+    if kind == "path":
+        return _validator.validate_file(value, rules)
+    return _validator.validate(value, rules=rules)
+
+
+def validate_many(items, workers=None, rules=True, schema_dir=SCHEMA_DIR, chunksize=16):
+    """Validate file paths and/or parsed configs (dicts) across a process pool.
+
+    Yields result dicts in input order.
+    """
+    items = [("config", i) if isinstance(i, dict) else ("path", i) for i in items]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < 2 * chunksize:
+        _init_worker(schema_dir)
+        for item in items:
+            yield _validate_in_worker(item, rules)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema_dir,)) as pool:
+        yield from pool.map(_validate_in_worker, items, [rules] * len(items), chunksize=chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate EpiHiper configs against their schemas and rules.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--schema-dir", default=SCHEMA_DIR)
+    parser.add_argument("--no-rules", action="store_true", help="only check the JSON schemas")
+    parser.add_argument("--quiet", action="store_true", help="print only invalid files and the summary")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = invalid = 0
+    for result in validate_many(args.files, args.workers, not args.no_rules, args.schema_dir):
+        count += 1
+        invalid += not result["valid"]
+        if not (args.quiet and result["valid"]):
+            print(json.dumps(result))
+    elapsed = time.perf_counter() - start
+    print(f"configs: {count}\tinvalid: {invalid}\t{elapsed:.2f}s\t{count / elapsed:.1f} configs/s",
+          file=sys.stderr)
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+#
+# One search tool over DuckDuckGo, PubMed and Semantic Scholar
+#
+# PRISMA_test.py's query_executor used to try DuckDuckGoSearchRun,
+# PubmedQueryRun and SemanticScholarQueryRun one at a time, with an LLM
+# round trip between attempts. FederatedSearch sends a query to every
+# backend at once and waits at most `timeout` seconds, so a search takes as
+# long as the slowest backend. Results that refer to the same paper are
+# merged: the same DOI, the same PMID, or the same URL once it is
+# normalized. Every backend's results are cached per (backend, query,
+# max_results) in a SQLite file for `ttl` seconds, so reruns skip the
+# network. A backend that fails or times out leaves no cache entry, and the
+# others still answer.
+#
+#   search = FederatedSearch()                       # the three web backends
+#   tool = LiteratureSearchTool(search=search)       # for crewAI / LangChain agents
+#   print(tool.run("dengue basic reproduction number"))
+#
+# Backends are plain objects with a `name` and search(query, max_results)
+# returning result dicts (title, url, doi, pmid, abstract, published,
+# authors, venue). LocalBackend serves a fixed list of results, or a JSON
+# file of them, with optional delay and failures, as a stand-in for tests.
+#
+#   python federated_search.py "zika incubation period" --max-results 5
+#
+
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from langchain_core.callbacks.manager import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+
+import tracing
+from singleflight import SingleFlight
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "search", "results.sqlite")
+
+FIELDS = ("title", "url", "doi", "pmid", "abstract", "published", "authors", "venue")
+
+_DOI = re.compile(r"10\.\d{4,9}/\S+", re.IGNORECASE)
+_PUBMED_URL = re.compile(r"^(?:www\.)?(?:pubmed\.ncbi\.nlm\.nih\.gov|ncbi\.nlm\.nih\.gov/pubmed)/(\d+)")
+
+
+def normalize_doi(value):
+    """Lower-case bare DOI ("10.1000/xyz"), or None."""
+    if not value:
+        return None
+    match = _DOI.search(str(value))
+    return match.group(0).rstrip(".").lower() if match else None
+
+
+def normalize_url(value):
+    """URL without scheme, "www.", query tracking, fragment or trailing "/"."""
+    if not value:
+        return None
+    parts = urlsplit(value.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    query = "&".join(q for q in parts.query.split("&") if q and not q.startswith("utm_"))
+    return host + path + ("?" + query if query else "")
+
+
+def result_keys(result):
+    """Identity keys of a result: ("doi", ...), ("pmid", ...), ("url", ...)."""
+    keys = []
+    url = normalize_url(result.get("url"))
+    doi = normalize_doi(result.get("doi"))
+    if doi is None and url and url.startswith("doi.org/"):
+        doi = normalize_doi(url)
+    if doi:
+        keys.append(("doi", doi))
+    pmid = str(result.get("pmid") or "").strip()
+    if not pmid and url:
+        match = _PUBMED_URL.match(url)
+        pmid = match.group(1) if match else ""
+    if pmid:
+        keys.append(("pmid", pmid))
+    if url:
+        keys.append(("url", url))
+    return keys
+
+
+def merge_results(results_by_backend):
+    """Merge [(backend name, [result])] into one deduplicated list.
+
+    Results sharing any key are one paper; its fields come from the first
+    backend (in the given order) that has them, and "sources" lists every
+    backend that found it. Papers are ordered by their best rank in any
+    backend, ties broken by backend order.
+    """
+    groups = []     # [{"result": merged, "rank": (rank, backend index)}]
+    owner = {}      # key -> index into groups
+
+    for index, (name, results) in enumerate(results_by_backend):
+        for rank, result in enumerate(results):
+            keys = result_keys(result)
+            found = sorted({owner[k] for k in keys if k in owner})
+            if found:
+                target = found[0]
+                # A result can link groups found so far only by DOI and only by PMID.
+                for other in found[1:]:
+                    _absorb(groups[target], groups[other])
+                    groups[other] = None
+                    for k, g in owner.items():
+                        if g == other:
+                            owner[k] = target
+            else:
+                target = len(groups)
+                groups.append({"result": {"sources": []}, "rank": (rank, index)})
+            group = groups[target]
+            result = dict(result, sources=[name])
+            if result.get("doi"):
+                result["doi"] = normalize_doi(result["doi"])
+            _absorb(group, {"result": result, "rank": (rank, index)})
+            for k in keys:
+                owner[k] = target
+
+    merged = sorted((g for g in groups if g is not None), key=lambda g: g["rank"])
+    return [g["result"] for g in merged]
+
+
+def _absorb(group, other):
+    result = group["result"]
+    for field in FIELDS:
+        if not result.get(field) and other["result"].get(field):
+            result[field] = other["result"][field]
+    for name in other["result"]["sources"]:
+        if name not in result["sources"]:
+            result["sources"].append(name)
+    group["rank"] = min(group["rank"], other["rank"])
+
+
+def format_results(results, max_abstract=500):
+    """Plain text listing of merged results, for an LLM."""
+    if not results:
+        return "No results found."
+    blocks = []
+    for i, r in enumerate(results, 1):
+        lines = [f"[{i}] {r.get('title') or '(untitled)'}"]
+        ids = ", ".join(f"{label}: {r[field]}" for label, field in
+                        (("DOI", "doi"), ("PMID", "pmid"), ("Published", "published")) if r.get(field))
+        if ids:
+            lines.append(ids)
+        if r.get("url"):
+            lines.append(r["url"])
+        if r.get("abstract"):
+            abstract = r["abstract"]
+            lines.append(abstract if len(abstract) <= max_abstract else abstract[:max_abstract] + "...")
+        lines.append("Found by: " + ", ".join(r["sources"]))
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+# -- backends -----------------------------------------------------------------
+
+
+class DuckDuckGoBackend:
+    """Web search through the duckduckgo_search package, like DuckDuckGoSearchRun."""
+
+    name = "duckduckgo"
+
+    def __init__(self, region="wt-wt", safesearch="moderate") -> None:
+        self.region = region
+        self.safesearch = safesearch
+
+    def search(self, query, max_results):
+        from duckduckgo_search import DDGS
+
+        with DDGS() as ddgs:
+            hits = ddgs.text(query, region=self.region, safesearch=self.safesearch,
+                             max_results=max_results) or []
+        return [{"title": h.get("title"), "url": h.get("href"), "abstract": h.get("body"),
+                 "doi": normalize_doi(h.get("href"))} for h in hits]
+
+
+class PubMedBackend:
+    """PubMed through the NCBI E-utilities (esearch, then esummary)."""
+
+    name = "pubmed"
+    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+    def __init__(self, api_key=None, email=None, timeout=20) -> None:
+        self.api_key = api_key if api_key is not None else os.getenv("NCBI_API_KEY")
+        self.email = email
+        self.timeout = timeout
+
+    def _get(self, endpoint, **params):
+        import requests
+
+        params.update(db="pubmed", retmode="json")
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if self.email:
+            params["email"] = self.email
+        reply = requests.get(self.base_url + endpoint, params=params, timeout=self.timeout)
+        reply.raise_for_status()
+        return reply.json()
+
+    def search(self, query, max_results):
+        ids = self._get("esearch.fcgi", term=query, retmax=max_results)["esearchresult"]["idlist"]
+        if not ids:
+            return []
+        summary = self._get("esummary.fcgi", id=",".join(ids))["result"]
+        results = []
+        for pmid in ids:
+            doc = summary.get(pmid)
+            if doc is None:
+                continue
+            doi = next((a["value"] for a in doc.get("articleids", []) if a.get("idtype") == "doi"), None)
+            results.append({
+                "title": doc.get("title"),
+                "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+                "pmid": pmid,
+                "doi": normalize_doi(doi),
+                "published": doc.get("pubdate"),
+                "authors": ", ".join(a["name"] for a in doc.get("authors", []) if a.get("name")),
+                "venue": doc.get("fulljournalname") or doc.get("source"),
+            })
+        return results
+
+
+class SemanticScholarBackend:
+    """Semantic Scholar's paper search (Graph API)."""
+
+    name = "semanticscholar"
+    base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
+    fields = "title,abstract,url,year,venue,authors,externalIds"
+
+    def __init__(self, api_key=None, timeout=20) -> None:
+        self.api_key = api_key if api_key is not None else os.getenv("S2_API_KEY")
+        self.timeout = timeout
+
+    def search(self, query, max_results):
+        import requests
+
+        headers = {"x-api-key": self.api_key} if self.api_key else {}
+        reply = requests.get(self.base_url, params={"query": query, "limit": max_results, "fields": self.fields},
+                             headers=headers, timeout=self.timeout)
+        reply.raise_for_status()
+        results = []
+        for paper in reply.json().get("data") or []:
+            ids = paper.get("externalIds") or {}
+            results.append({
+                "title": paper.get("title"),
+                "url": paper.get("url"),
+                "doi": normalize_doi(ids.get("DOI")),
+                "pmid": ids.get("PubMed"),
+                "abstract": paper.get("abstract"),
+                "published": str(paper["year"]) if paper.get("year") else None,
+                "authors": ", ".join(a["name"] for a in paper.get("authors") or [] if a.get("name")),
+                "venue": paper.get("venue"),
+            })
+        return results
+
+
+class LocalBackend:
+    """Stand-in backend over a fixed list of results or a JSON file of them.
+
+    search() returns the results whose title or abstract shares a word with
+    the query, best match first, after `delay` seconds. If `fail` is set it
+    raises RuntimeError instead. `calls` counts searches.
+    """
+
+    def __init__(self, name, results, delay=0.0, fail=False) -> None:
+        self.name = name
+        if isinstance(results, str):
+            with open(results, encoding="utf-8") as f:
+                results = json.load(f)
+        self.results = list(results)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def search(self, query, max_results):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is unavailable")
+        terms = set(re.findall(r"\w+", query.lower()))
+        scored = []
+        for i, result in enumerate(self.results):
+            words = set(re.findall(r"\w+", f"{result.get('title', '')} {result.get('abstract', '')}".lower()))
+            score = len(terms & words)
+            if score:
+                scored.append((-score, i, result))
+        return [dict(result) for _, _, result in sorted(scored, key=lambda s: s[:2])[:max_results]]
+
+
+def default_backends():
+    return [DuckDuckGoBackend(), PubMedBackend(), SemanticScholarBackend()]
+
+
+# -- cache ----------------------------------------------------------------------
+
+
+class SearchCache:
+    """SQLite-backed TTL cache of per-backend search results."""
+
+    def __init__(self, path=DEFAULT_PATH, ttl=7 * 24 * 3600) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                         "key TEXT PRIMARY KEY, backend TEXT, query TEXT, value BLOB, created REAL)")
+
+    @staticmethod
+    def key(backend, query, max_results):
+        canonical = json.dumps([backend, " ".join(query.split()), max_results], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, backend, query, max_results):
+        """Cached results, or None if missing or older than ttl."""
+        key = self.key(backend, query, max_results)
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, backend, query, max_results, results):
+        value = zlib.compress(json.dumps(results).encode("utf-8"), 1)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                             (self.key(backend, query, max_results), backend, query, value, time.time()))
+
+    def expire(self):
+        """Delete entries older than ttl; returns how many."""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            return self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# -- fan-out --------------------------------------------------------------------
+
+
+class FederatedSearch:
+    """Concurrent search over several backends with merged, cached results.
+
+    Pass cache=False to disable caching. Identical searches in flight at
+    the same time share one backend call.
+    """
+
+    def __init__(self,
+                 backends=None,
+                 cache=None,
+                 max_results=5,
+                 timeout=30.0) -> None:
+        self.backends = list(backends) if backends is not None else default_backends()
+        self.cache = SearchCache() if cache is None else (cache or None)
+        self.max_results = max_results
+        self.timeout = timeout
+        self.searches = 0
+        self.errors = {}        # backend name -> count
+        self.timeouts = {}
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self._pool = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.backends)),
+                                        thread_name_prefix="search")
+
+    def _backend_search(self, backend, query, max_results):
+        if self.cache is not None:
+            cached = self.cache.get(backend.name, query, max_results)
+            if cached is not None:
+                return cached
+        key = (backend.name, query, max_results)
+
+        def fetch():
+            with tracing.span("search.backend", backend=backend.name) as span:
+                results = backend.search(query, max_results)
+                span.set(results=len(results))
+            if self.cache is not None:
+                self.cache.put(backend.name, query, max_results, results)
+            return results
+
+        return self._single_flight.do(key, fetch)
+
+    def search_each(self, query, max_results=None):
+        """[(backend name, results, error)] for one query.
+
+        results is None and error a message where a backend failed or timed
+        out; otherwise error is None.
+        """
+        max_results = self.max_results if max_results is None else max_results
+        with self._lock:
+            self.searches += 1
+        futures = [self._pool.submit(contextvars.copy_context().run, self._backend_search, b, query, max_results)
+                   for b in self.backends]
+        wait(futures, timeout=self.timeout)
+        out = []
+        for backend, future in zip(self.backends, futures):
+            if not future.done():
+                # Left running; if it finishes, its results still reach the cache.
+                with self._lock:
+                    self.timeouts[backend.name] = self.timeouts.get(backend.name, 0) + 1
+                out.append((backend.name, None, f"timed out after {self.timeout} s"))
+            elif future.exception() is not None:
+                with self._lock:
+                    self.errors[backend.name] = self.errors.get(backend.name, 0) + 1
+                error = future.exception()
+                out.append((backend.name, None, f"{type(error).__name__}: {error}"))
+            else:
+                out.append((backend.name, future.result(), None))
+        return out
+
+    def _search(self, query, max_results):
+        with tracing.span("search", backends=len(self.backends)) as span:
+            each = self.search_each(query, max_results)
+            merged = merge_results([(name, results) for name, results, _ in each if results is not None])
+            errors = {name: error for name, _, error in each if error is not None}
+            span.set(results=len(merged), failed=len(errors))
+        return merged, errors
+
+    def search(self, query, max_results=None):
+        """Merged, deduplicated results of every backend for a query."""
+        return self._search(query, max_results)[0]
+
+    def run(self, query, max_results=None):
+        """search() formatted as text, with a note on any backend that failed."""
+        merged, errors = self._search(query, max_results)
+        text = format_results(merged)
+        if errors:
+            text += "\n\n(" + "; ".join(f"{name} unavailable: {message}"
+                                        for name, message in errors.items()) + ")"
+        return text
+
+    def stats(self):
+        return {
+            "searches": self.searches,
+            "errors": dict(self.errors),
+            "timeouts": dict(self.timeouts),
+            "coalesced": self._single_flight.coalesced,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        if self.cache is not None:
+            self.cache.close()
+
+
+class LiteratureSearchTool(BaseTool):
+    """LangChain tool over a FederatedSearch, for crewAI agents."""
+
+    name: str = "literature_search"
+    description: str = (
+        "Searches the web (DuckDuckGo), PubMed and Semantic Scholar at the same time and returns "
+        "one deduplicated list of papers and pages with titles, DOIs, PMIDs, links and abstracts. "
+        "Input should be a search query.")
+    search: Any = None
+    max_results: Optional[int] = None
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.search is None:
+            self.search = FederatedSearch()
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        return self.search.run(query, self.max_results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search DuckDuckGo, PubMed and Semantic Scholar at once.")
+    parser.add_argument("query")
+    parser.add_argument("--max-results", type=int, default=5, help="per backend")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--cache", default=DEFAULT_PATH)
+    parser.add_argument("--ttl", type=float, default=7 * 24 * 3600, help="seconds")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the merged results as JSON")
+    args = parser.parse_args()
+
+    cache = False if args.no_cache else SearchCache(args.cache, ttl=args.ttl)
+    search = FederatedSearch(cache=cache, max_results=args.max_results, timeout=args.timeout)
+    start = time.perf_counter()
+    if args.json:
+        print(json.dumps(search.search(args.query), indent=2))
+    else:
+        print(search.run(args.query))
+    print(f"{time.perf_counter() - start:.2f} s, {json.dumps(search.stats())}", file=sys.stderr)
+    search.close()
+
+
+if __name__ == "__main__":
+    main()
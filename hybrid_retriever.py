@@ -0,0 +1,215 @@
+#
+# Hybrid BM25 + vector retrieval over a LocalVectorStore
+#
+# Dense retrieval alone misses exact terms such as pathogen and parameter
+# names, and it scores a lot of vectors. HybridRetriever first ranks chunks
+# with BM25 over a compact inverted index. Only the top candidates are
+# rescored by cosine similarity against the query embedding, and the two
+# scores are fused with configurable weights. When fewer than k chunks
+# match, all of them are kept and the rest of the k come from dense search.
+# A query with no indexed terms falls back to the store's dense search.
+#
+# The index lives in <store>/bm25 as CSR postings:
+#   vocab.json    terms; a term's id is its position in the list
+#   offsets.npy   postings of term t are [offsets[t], offsets[t + 1])
+#   rows.npy      int32 store rows, per term in row order
+#   tfs.npy       uint16 term frequencies
+#   doc_len.npy   int32 token count per store row
+#   meta.json     k1, b, number of documents, total tokens, rows covered
+# Rows added to the store later are indexed when the retriever is opened.
+# Deleted rows are dropped from the candidates. They still count in the
+# document statistics until the index is rebuilt.
+#
+
+import json
+import os
+import re
+from collections import Counter
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import tracing
+from local_vectorstore import LocalVectorStore
+
+# Keeps hyphenated and dotted names (sars-cov-2, il-6, r0.5) as one token.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+STOPWORDS = frozenset("""a an and are as at be by for from has have in into is it its of on or
+that the their this to was were which with we our not can may also these those than then there
+been such using used""".split())
+
+
+def tokenize(text):
+    """Lowercased terms, plus the parts of hyphenated or dotted terms."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token or "_" in token or "." in token:
+            tokens.extend(p for p in re.split(r"[-_.]", token) if p and p not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """BM25 over CSR postings, addressed by LocalVectorStore row."""
+
+    def __init__(self, path=None, k1=1.5, b=0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.documents = 0
+        self.tokens = 0
+        self.covered = 0
+
+        if path is not None and os.path.exists(os.path.join(path, "meta.json")):
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            self.k1, self.b = meta["k1"], meta["b"]
+            self.documents, self.tokens, self.covered = meta["documents"], meta["tokens"], meta["covered"]
+            with open(os.path.join(path, "vocab.json")) as f:
+                self.vocab = {term: i for i, term in enumerate(json.load(f))}
+            for name in ("offsets", "rows", "tfs", "doc_len"):
+                setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+
+    def add(self, docs):
+        """Index (row, text) pairs; rows must be new to the index."""
+        term_ids, rows, tfs = [], [], []
+        lengths = {}
+        for row, text in docs:
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                rows.append(row)
+                tfs.append(min(tf, 65535))
+        if not lengths:
+            return
+
+        # Expand the existing postings back to (term, row, tf) triples and
+        # re-sort them together with the new ones.
+        old_terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        all_terms = np.concatenate([old_terms, np.asarray(term_ids, dtype=np.int64)])
+        all_rows = np.concatenate([self.rows, np.asarray(rows, dtype=np.int32)])
+        all_tfs = np.concatenate([self.tfs, np.asarray(tfs, dtype=np.uint16)])
+        order = np.lexsort((all_rows, all_terms))
+        self.rows, self.tfs = all_rows[order], all_tfs[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(all_terms, minlength=len(self.vocab)))])
+
+        top = max(lengths) + 1
+        doc_len = np.zeros(max(top, len(self.doc_len)), dtype=np.int32)
+        doc_len[:len(self.doc_len)] = self.doc_len
+        for row, n in lengths.items():
+            doc_len[row] = n
+        self.doc_len = doc_len
+        self.documents += len(lengths)
+        self.tokens += sum(lengths.values())
+        self.covered = max(self.covered, top)
+
+    def search(self, query, n=200):
+        """Top-n (rows, scores) by BM25, best first."""
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not terms or not self.documents:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        avgdl = self.tokens / self.documents
+        rows, scores = [], []
+        for t in terms:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            r = np.asarray(self.rows[lo:hi])
+            tf = np.asarray(self.tfs[lo:hi], dtype=np.float32)
+            df = hi - lo
+            idf = np.log(1.0 + (self.documents - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * np.asarray(self.doc_len)[r] / avgdl)
+            rows.append(r)
+            scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+        if len(unique) > n:
+            top = np.argpartition(-totals, n - 1)[:n]
+            unique, totals = unique[top], totals[top]
+        order = np.argsort(-totals)
+        return unique[order].astype(np.int64), totals[order]
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name in ("offsets", "rows", "tfs", "doc_len"):
+            np.save(os.path.join(self.path, name + ".npy"), np.asarray(getattr(self, name)))
+        terms = [None] * len(self.vocab)
+        for term, i in self.vocab.items():
+            terms[i] = term
+        with open(os.path.join(self.path, "vocab.json"), "w") as f:
+            json.dump(terms, f)
+        # meta.json last: it marks the other files as complete.
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "documents": self.documents,
+                       "tokens": self.tokens, "covered": self.covered}, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    @classmethod
+    def for_store(cls, store, rebuild=False):
+        """Open the store's index, indexing rows added since it was saved."""
+        path = os.path.join(store.path, "bm25")
+        index = cls() if rebuild else cls(path)
+        index.path = path
+        count = store.meta["count"]
+        if index.covered < count:
+            index.add((row, record["text"]) for row, record in store.records(index.covered))
+            index.covered = count
+            index.save()
+        return index
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 candidate prefilter with dense rescoring and weighted fusion."""
+
+    store: LocalVectorStore
+    index: Any = None
+    k: int = 4
+    candidates: int = 200
+    lexical_weight: float = 0.3
+    dense_weight: float = 0.7
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.index is None:
+            self.index = BM25Index.for_store(self.store)
+
+    def search(self, query):
+        """Top-k (record, fused score) pairs for a query string."""
+        with tracing.span("retrieve", k=self.k) as span:
+            embedding = self.store.embeddings.embed_query(query)
+            rows, lexical = self.index.search(query, self.candidates)
+            live = self.store.live_mask(rows)
+            rows, lexical = rows[live], lexical[live]
+            span.set(candidates=len(rows))
+            if len(rows) == 0:
+                return self.store.search_vector(embedding, self.k)
+
+            dense = self.store.score_rows(rows, embedding)
+            # BM25 scores are unbounded: scale them to [0, 1] by the best match.
+            fused = self.lexical_weight * lexical / lexical[0] + self.dense_weight * dense
+            top = np.argsort(-fused)[:self.k]
+            results = [(self.store.record(int(rows[i])), float(fused[i])) for i in top]
+            if len(results) < self.k:
+                # Too few lexical matches: keep them all and fill the remaining
+                # places with dense hits, which have no lexical score.
+                seen = {record["id"] for record, _ in results}
+                padding = [(record, self.dense_weight * score)
+                           for record, score in self.store.search_vector(embedding, self.k + len(results))
+                           if record["id"] not in seen]
+                results += padding[:self.k - len(results)]
+                results.sort(key=lambda item: -item[1])
+            return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [Document(page_content=r["text"], metadata=r["metadata"]) for r, _ in self.search(query)]
@@ -0,0 +1,126 @@
+#
+# Ingestion manifest for pdf_store_loader.py
+#
+# Records, for every ingested file, its size, mtime and content hash along
+# with the page and chunk counts it produced. On the next run only new and
+# modified files are processed and files that disappeared are reported for
+# removal, so the cost of a run is proportional to what changed.
+#
+
+import hashlib
+import json
+import os
+import time
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Plan:
+    """What a run has to do: files to add, replace and remove."""
+
+    def __init__(self, new, modified, unchanged, deleted) -> None:
+        self.new = new
+        self.modified = modified
+        self.unchanged = unchanged
+        self.deleted = deleted
+
+    @property
+    def todo(self):
+        return self.new + self.modified
+
+    def __str__(self):
+        return (f"new: {len(self.new)}\tmodified: {len(self.modified)}\t"
+                f"unchanged: {len(self.unchanged)}\tdeleted: {len(self.deleted)}")
+
+
+class IngestManifest:
+    """JSON manifest of ingested documents keyed by path."""
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.documents = {}
+        # Settings (e.g. chunk size, model) every recorded document was
+        # ingested with. Each record also keeps its own settings, so a run
+        # that stops halfway leaves the rest of the documents marked stale.
+        self.settings = None
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.documents = saved["documents"]
+            self.settings = saved.get("settings")
+
+    def plan(self, paths, force=False, settings=None):
+        """Compare paths with the manifest.
+
+        Size and mtime are checked first; the content hash is only computed
+        when they differ, so a touched but identical file counts as unchanged.
+        With force every known path is treated as modified, and with
+        settings every path recorded under different settings.
+        """
+        new, modified, unchanged = [], [], []
+        for path in paths:
+            st = os.stat(path)
+            entry = self.documents.get(path)
+            if entry is None:
+                new.append(path)
+            elif force or self.stale(entry, settings):
+                modified.append(path)
+            elif entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                unchanged.append(path)
+            elif file_hash(path) == entry["sha256"]:
+                entry["size"], entry["mtime"] = st.st_size, st.st_mtime
+                unchanged.append(path)
+            else:
+                modified.append(path)
+        seen = set(paths)
+        deleted = [path for path in self.documents if path not in seen]
+        return Plan(new, modified, unchanged, deleted)
+
+    def stale(self, entry, settings):
+        """True if entry was ingested with settings other than these."""
+        # Records from before per-document settings carry the manifest's.
+        recorded = entry.get("settings", self.settings)
+        return settings is not None and recorded is not None and recorded != settings
+
+    def record(self, path, pages, chunks, sha256=None, settings=None):
+        st = os.stat(path)
+        self.documents[path] = {
+            "sha256": sha256 or file_hash(path),
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "pages": pages,
+            "chunks": chunks,
+            "ingested": time.time(),
+        }
+        if settings is not None:
+            self.documents[path]["settings"] = settings
+
+    def settle(self, settings):
+        """Make settings the manifest's once every document has them."""
+        if all(not self.stale(entry, settings) for entry in self.documents.values()):
+            self.settings = settings
+
+    def remove(self, path):
+        self.documents.pop(path, None)
+
+    def totals(self):
+        return {
+            "documents": len(self.documents),
+            "pages": sum(d["pages"] for d in self.documents.values()),
+            "chunks": sum(d["chunks"] for d in self.documents.values()),
+        }
+
+    def save(self):
+        # Write then rename so a crash never leaves a truncated manifest.
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 1, "settings": self.settings, "documents": self.documents}, f, indent=1)
+        os.replace(tmp, self.path)
@@ -0,0 +1,458 @@
+#
+# Local memory-mapped vector store with an IVF approximate-neighbour index
+#
+# openai-rag-arxiv.py used to rebuild an in-process Chroma collection on
+# every run and pdf_store_loader had no store of its own. LocalVectorStore
+# keeps everything in one directory:
+#
+#   meta.json        dimension, dtype, committed row count and byte sizes,
+#                    index state
+#   vectors.bin      one row per chunk: float32, float16, or int8 with a
+#   scales.bin       per-row float32 scale (int8 only)
+#   docs.bin         JSON {"id", "text", "metadata"} per row, back to back,
+#   doc_offsets.bin  with the int64 start offset of every row
+#   ids.txt          row ids, one per line (loaded only when needed)
+#   deleted.bin      one byte per row, 1 = deleted
+#   assign.bin       int32 IVF list of every row (-1 before training)
+#   centroids.npy, ivf_order.npy, ivf_bounds.npy   the trained IVF index
+#
+# Vectors are L2-normalized on insert and scored by inner product (cosine).
+# Opening a store maps the files and reads meta.json, so it is quick
+# whatever the size. Queries score only the nprobe nearest IVF lists.
+# Added rows are appended and assigned to their nearest list. The index is
+# retrained when the store has doubled since the last training. Deletes
+# mark rows deleted and never rewrite the vectors.
+#
+# It implements the LangChain VectorStore interface, so callers of
+# vectorstore.as_retriever() can switch over unchanged.
+#
+
+import json
+import mmap
+import os
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+import tracing
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def nearest(data, centroids, block=4096):
+    """Index of the closest centroid for each row, a block at a time."""
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block):
+        out[start:start + block] = np.argmax(data[start:start + block] @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(data, k, iters=10, seed=0):
+    """Spherical k-means on unit rows; returns (k, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = nearest(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[~empty] = np.add.reduceat(data[order], starts[~empty])
+        # Reseed empty lists with random points so every list stays in use.
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class LocalVectorStore(VectorStore):
+    """Memory-mapped, persistent vector store with an IVF index."""
+
+    def __init__(self,
+                 path,
+                 embedding=None,
+                 dtype="float32",
+                 nprobe=16,
+                 min_train=4096,
+                 autoflush=True) -> None:
+        self.path = path
+        self._embedding = embedding
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.autoflush = autoflush
+        os.makedirs(path, exist_ok=True)
+
+        self._meta_path = self._file("meta.json")
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            if dtype not in DTYPES:
+                raise ValueError(f"dtype must be one of {DTYPES}")
+            self.meta = {"version": 1, "dim": None, "dtype": dtype, "count": 0,
+                         "docs_bytes": 0, "ids_bytes": 0, "indexed": 0, "nlist": 0}
+        self.dtype = np.dtype(self.meta["dtype"])
+
+        self._files = {}
+        count = self.meta["count"]
+        if "ids_bytes" not in self.meta:
+            # Written before ids.txt was covered by meta.json.
+            self.meta["ids_bytes"] = self._committed_ids_bytes(count)
+        # Drop anything appended after the last flush.
+        for name, size in self._row_file_sizes(count).items():
+            self._append_file(name).truncate(size)
+
+        self._deleted = bytearray(self._read_file("deleted.bin", count))
+        self._assign = np.frombuffer(self._read_file("assign.bin", count * 4), dtype=np.int32).copy()
+        self._ids = None
+        self._views = None
+
+        self._centroids = self._order = self._bounds = None
+        if self.meta["nlist"]:
+            self._centroids = np.load(self._file("centroids.npy"))
+            self._order = np.load(self._file("ivf_order.npy"), mmap_mode="r")
+            self._bounds = np.load(self._file("ivf_bounds.npy"))
+
+    # -- files --------------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _row_file_sizes(self, count):
+        dim = self.meta["dim"] or 0
+        sizes = {
+            "vectors.bin": count * dim * self.dtype.itemsize,
+            "doc_offsets.bin": count * 8,
+            "docs.bin": self.meta["docs_bytes"],
+            "ids.txt": self.meta["ids_bytes"],
+            "deleted.bin": count,
+            "assign.bin": count * 4,
+        }
+        if self.dtype == np.int8:
+            sizes["scales.bin"] = count * 4
+        return sizes
+
+    def _committed_ids_bytes(self, count):
+        size = 0
+        if count:
+            with open(self._file("ids.txt"), "rb") as f:
+                for _, line in zip(range(count), f):
+                    size += len(line)
+        return size
+
+    def _append_file(self, name):
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(self._file(name), "ab")
+        return f
+
+    def _read_file(self, name, size):
+        if not size:
+            return b""
+        with open(self._file(name), "rb") as f:
+            return f.read(size)
+
+    def _mapped(self):
+        # Memory maps of the committed rows, refreshed after appends.
+        count, dim = self.meta["count"], self.meta["dim"]
+        if self._views is not None and self._views["count"] == count:
+            return self._views
+        for f in self._files.values():
+            f.flush()
+        views = {"count": count}
+        if count:
+            views["vectors"] = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r",
+                                         shape=(count, dim))
+            views["offsets"] = np.memmap(self._file("doc_offsets.bin"), dtype=np.int64, mode="r",
+                                         shape=(count,))
+            if self.dtype == np.int8:
+                views["scales"] = np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r",
+                                            shape=(count,))
+            with open(self._file("docs.bin"), "rb") as f:
+                views["docs"] = mmap.mmap(f.fileno(), self.meta["docs_bytes"], access=mmap.ACCESS_READ)
+        self._views = views
+        return views
+
+    def flush(self):
+        """Commit appended rows by rewriting meta.json atomically."""
+        for f in self._files.values():
+            f.flush()
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_path)
+
+    def close(self):
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._views = None
+
+    # -- ids ----------------------------------------------------------------
+
+    def _id_rows(self):
+        if self._ids is None:
+            self._ids = {}
+            if self.meta["count"]:
+                with open(self._file("ids.txt")) as f:
+                    for row, line in zip(range(self.meta["count"]), f):
+                        if not self._deleted[row]:
+                            self._ids[line.rstrip("\n")] = row
+        return self._ids
+
+    # -- writing ------------------------------------------------------------
+
+    def _encode_rows(self, vectors):
+        if self.dtype == np.int8:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.dtype), None
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """Append precomputed vectors; existing ids are replaced."""
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = _normalize(embeddings)
+        if self.meta["dim"] is None:
+            self.meta["dim"] = int(vectors.shape[1])
+        elif vectors.shape[1] != self.meta["dim"]:
+            raise ValueError(f"expected {self.meta['dim']}-dimensional vectors, got {vectors.shape[1]}")
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = [str(i) for i in ids] if ids is not None else [uuid.uuid4().hex for _ in texts]
+
+        known = self._id_rows()
+        self._mark_deleted([known[i] for i in ids if i in known])
+
+        first = self.meta["count"]
+        rows, scales = self._encode_rows(vectors)
+        self._append_file("vectors.bin").write(rows.tobytes())
+        if scales is not None:
+            self._append_file("scales.bin").write(scales.tobytes())
+
+        offsets = np.empty(len(texts), dtype=np.int64)
+        position = self.meta["docs_bytes"]
+        docs = self._append_file("docs.bin")
+        for n, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            data = json.dumps({"id": doc_id, "text": text, "metadata": metadata}).encode("utf-8")
+            offsets[n] = position
+            docs.write(data)
+            position += len(data)
+        self._append_file("doc_offsets.bin").write(offsets.tobytes())
+        id_lines = "".join(i + "\n" for i in ids).encode("utf-8")
+        self._append_file("ids.txt").write(id_lines)
+        self._append_file("deleted.bin").write(bytes(len(texts)))
+        self._deleted.extend(bytes(len(texts)))
+
+        if self._centroids is not None:
+            assign = nearest(vectors, self._centroids)
+        else:
+            assign = np.full(len(texts), -1, dtype=np.int32)
+        self._append_file("assign.bin").write(assign.tobytes())
+        self._assign = np.concatenate([self._assign, assign])
+
+        for n, doc_id in enumerate(ids):
+            known[doc_id] = first + n
+        self.meta["count"] = first + len(texts)
+        self.meta["docs_bytes"] = position
+        self.meta["ids_bytes"] += len(id_lines)
+
+        if self.live_count() >= self.min_train and self.meta["count"] >= 2 * max(self.meta["indexed"], 1):
+            self.build_index()
+        elif self.autoflush:
+            self.flush()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if self._embedding is None:
+            raise ValueError("LocalVectorStore needs an embedding to add texts")
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def _mark_deleted(self, rows):
+        if not rows:
+            return
+        with open(self._file("deleted.bin"), "r+b") as f:
+            for row in rows:
+                self._deleted[row] = 1
+                f.seek(row)
+                f.write(b"\x01")
+
+    def delete(self, ids=None, **kwargs):
+        if ids is None:
+            return False
+        known = self._id_rows()
+        rows = [known.pop(str(i)) for i in ids if str(i) in known]
+        self._mark_deleted(rows)
+        if self.autoflush:
+            self.flush()
+        return True
+
+    def delete_prefix(self, prefix):
+        """Delete every row whose id starts with prefix; returns the count."""
+        doomed = [i for i in self._id_rows() if i.startswith(prefix)]
+        self.delete(doomed)
+        return len(doomed)
+
+    # -- index --------------------------------------------------------------
+
+    def build_index(self, nlist=None, iters=10, sample=None, seed=0):
+        """(Re)train the IVF lists over the live rows and persist them.
+
+        nlist defaults to 2 * sqrt(live rows); k-means is trained on a
+        sample of 40 rows per list unless sample is given.
+        """
+        views = self._mapped()
+        count = self.meta["count"]
+        live = np.flatnonzero(np.frombuffer(self._deleted, dtype=np.uint8) == 0)
+        if len(live) == 0:
+            return
+        nlist = nlist or int(np.clip(2 * np.sqrt(len(live)), 1, 65536))
+        nlist = min(nlist, len(live))
+        sample = min(sample or 40 * nlist, len(live))
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(live, size=sample, replace=False))
+        centroids = kmeans(self._rows_as_float(views, train_rows), nlist, iters, seed)
+
+        assign = np.full(count, -1, dtype=np.int32)
+        for start in range(0, len(live), 16384):
+            block = live[start:start + 16384]
+            assign[block] = nearest(self._rows_as_float(views, block), centroids)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        order = order[np.count_nonzero(assign < 0):]  # deleted rows sort first
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(assign[assign >= 0], minlength=nlist))])
+
+        np.save(self._file("centroids.npy"), centroids)
+        np.save(self._file("ivf_order.npy"), order)
+        np.save(self._file("ivf_bounds.npy"), bounds)
+        f = self._files.pop("assign.bin", None)
+        if f is not None:
+            f.close()
+        with open(self._file("assign.bin"), "wb") as f:
+            f.write(assign.tobytes())
+        self._assign = assign
+        self._centroids, self._order, self._bounds = centroids, order, bounds
+        self.meta.update(indexed=count, nlist=int(nlist))
+        self.flush()
+
+    # -- reading ------------------------------------------------------------
+
+    def _rows_as_float(self, views, rows):
+        vectors = np.asarray(views["vectors"][rows], dtype=np.float32)
+        if self.dtype == np.int8:
+            vectors *= np.asarray(views["scales"][rows])[:, None]
+        return vectors
+
+    def _candidates(self, query):
+        count = self.meta["count"]
+        if self._centroids is None:
+            return np.arange(count)
+        nprobe = min(self.nprobe, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        parts = [self._order[self._bounds[l]:self._bounds[l + 1]] for l in probe]
+        indexed = self.meta["indexed"]
+        tail = self._assign[indexed:count]
+        parts.append(indexed + np.flatnonzero(np.isin(tail, probe)))
+        return np.sort(np.concatenate(parts))
+
+    def _record(self, views, row):
+        start = int(views["offsets"][row])
+        end = int(views["offsets"][row + 1]) if row + 1 < views["count"] else self.meta["docs_bytes"]
+        return json.loads(views["docs"][start:end])
+
+    def record(self, row):
+        """The {"id", "text", "metadata"} record stored at a row."""
+        return self._record(self._mapped(), row)
+
+    def records(self, start=0):
+        """Yield (row, record) for every live row from start, in row order."""
+        views = self._mapped()
+        for row in range(start, views["count"]):
+            if not self._deleted[row]:
+                yield row, self._record(views, row)
+
+    def live_mask(self, rows):
+        """True for each of rows that has not been deleted."""
+        return np.frombuffer(self._deleted, dtype=np.uint8)[rows] == 0
+
+    def score_rows(self, rows, embedding):
+        """Cosine similarity of a query vector to the given rows."""
+        views = self._mapped()
+        query = _normalize(embedding)
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), 16384):
+            block = rows[start:start + 16384]
+            scores[start:start + len(block)] = self._rows_as_float(views, block) @ query
+        return scores
+
+    def search_vector(self, embedding, k=4, filter=None):
+        """Top-k (record, score) pairs for a query vector."""
+        with tracing.span("retrieve.vector", k=k):
+            return self._search_vector(embedding, k, filter)
+
+    def _search_vector(self, embedding, k, filter):
+        if not self.meta["count"]:
+            return []
+        views = self._mapped()
+        rows = self._candidates(_normalize(embedding))
+        rows = rows[self.live_mask(rows)]
+        if len(rows) == 0:
+            return []
+        scores = self.score_rows(rows, embedding)
+
+        fetch = min(len(rows), k if filter is None else 4 * k)
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            record = self._record(views, int(rows[i]))
+            if filter and any(record["metadata"].get(key) != value for key, value in filter.items()):
+                continue
+            results.append((record, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [(Document(page_content=r["text"], metadata=r["metadata"]), score)
+                for r, score in self.search_vector(embedding, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities; map [-1, 1] onto [0, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def live_count(self):
+        return self.meta["count"] - self._deleted.count(1)
+
+    def __len__(self):
+        return self.live_count()
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path="vectorstore", **kwargs):
+        store = cls(path, embedding=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,228 @@
+#
+# A local stand-in for the Argo chat API, for benchmarks and offline runs
+#
+# Answers POSTs of an Argo payload with {"response": "..."} after a
+# configurable latency plus uniform jitter. A configurable fraction of
+# requests fail with error_status (and a Retry-After header if retry_after
+# is set). The reply is response_chars characters
+# long. Requests whose path ends in "stream" get the reply as server-sent
+# events, in chunks of stream_chunk characters. Connections are kept alive
+# (HTTP/1.1), like the real service behind its proxy.
+#
+#   python mock_argo.py --port 8765 --latency 0.2 --jitter 0.1 --error-rate 0.02
+#
+# or from Python:
+#
+#   with MockArgoServer(latency=0.05) as server:
+#       ArgoWrapper(url=server.url).invoke("hello")
+#
+# MockArgoServer serves from a thread of the calling process.
+# start_process() runs it in a child process, so that its CPU time is not
+# counted against the client being measured.
+#
+
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, the body waits
+    # for the client's delayed ACK and every reply gains ~40 ms.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, b'{"error": "invalid JSON"}')
+            return
+
+        rng = server.rng()
+        delay = server.latency + (rng.uniform(0, server.jitter) if server.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        with server.lock:
+            server.requests += 1
+            failed = rng.random() < server.error_rate
+            if failed:
+                server.errors += 1
+        if failed:
+            headers = [("Retry-After", str(server.retry_after))] if server.retry_after is not None else []
+            self._send(server.error_status, b'{"error": "mock overload"}', headers=headers)
+            return
+
+        text = server.text
+        if self.path.rstrip("/").endswith("stream"):
+            events = "".join(f"data: {json.dumps({'response': text[i:i + server.stream_chunk]})}\n\n"
+                             for i in range(0, len(text), server.stream_chunk))
+            self._send(200, (events + "data: [DONE]\n\n").encode(), "text/event-stream")
+        else:
+            self._send(200, json.dumps({"response": text}).encode())
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Enough for a few hundred clients connecting at once.
+    request_queue_size = 1024
+
+
+class MockArgoServer:
+    """Threaded HTTP server imitating the Argo chat endpoint."""
+
+    def __init__(self,
+                 host="127.0.0.1",
+                 port=0,
+                 latency=0.05,
+                 jitter=0.0,
+                 error_rate=0.0,
+                 error_status=503,
+                 response_chars=512,
+                 stream_chunk=32,
+                 seed=None,
+                 retry_after=None) -> None:
+        self.httpd = _Server((host, port), _Handler)
+        httpd = self.httpd
+        httpd.latency = latency
+        httpd.jitter = jitter
+        httpd.error_rate = error_rate
+        httpd.error_status = error_status
+        httpd.retry_after = retry_after
+        httpd.stream_chunk = stream_chunk
+        httpd.requests = 0
+        httpd.errors = 0
+        httpd.lock = threading.Lock()
+        local = threading.local()
+        seeds = random.Random(seed)
+
+        def rng():
+            # One generator per handler thread, seeded from the server seed.
+            if not hasattr(local, "rng"):
+                with httpd.lock:
+                    local.rng = random.Random(seeds.random())
+            return local.rng
+        httpd.rng = rng
+
+        httpd.text = ("The mock Argo service replies with this sentence again and again. " *
+                      (response_chars // 60 + 1))[:response_chars]
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/argoapi/api/v1/resource/chat/"
+
+    @property
+    def stream_url(self):
+        return self.url + "stream"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {"requests": self.httpd.requests, "errors": self.httpd.errors}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def _serve(connection, kwargs):
+    server = MockArgoServer(**kwargs)
+    connection.send((server.url, server.stream_url))
+    server.start()
+    # Block until the parent asks for stats or closes the pipe.
+    try:
+        while connection.recv() == "stats":
+            connection.send(server.stats())
+    except EOFError:
+        pass
+    server.stop()
+
+
+class MockArgoProcess:
+    """A MockArgoServer running in a child process."""
+
+    def __init__(self, **kwargs) -> None:
+        self._connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child, kwargs), daemon=True)
+        self.process.start()
+        self.url, self.stream_url = self._connection.recv()
+
+    def stats(self):
+        self._connection.send("stats")
+        return self._connection.recv()
+
+    def stop(self):
+        self._connection.send("stop")
+        self._connection.close()
+        self.process.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def start_process(**kwargs):
+    """Start a MockArgoServer in a child process; returns a MockArgoProcess."""
+    return MockArgoProcess(**kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Argo chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before each reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random delay, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--response-chars", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with errors")
+    args = parser.parse_args()
+
+    server = MockArgoServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                            args.error_status, args.response_chars, seed=args.seed,
+                            retry_after=args.retry_after)
+    print(f"Mock Argo at {server.url} (streaming: {server.stream_url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
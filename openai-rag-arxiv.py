@@ -1,9 +1,6 @@
 from langchain import hub
 
-from langchain.document_loaders import ArxivLoader
-from langchain.retrievers import ArxivRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
 
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.chat_models import ChatOpenAI
@@ -11,21 +8,32 @@ from langchain.chat_models import ChatOpenAI
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema import StrOutputParser
 
+from arxiv_cache import CachedArxivLoader
+from embedding_cache import CachedEmbeddings
+from hybrid_retriever import HybridRetriever
+from local_vectorstore import LocalVectorStore
+from streaming_pipeline import StreamingIngest
+
 
 import os
 import getpass
 os.environ['OPENAI_API_KEY'] = getpass.getpass("Enter your openai api key: ")
 
-# cleanup previous
-# vectorstore.delete_collection()
-
-docs = ArxivLoader(query="Antibiotic design using deep learning", load_max_docs=10).load()
+# Chunks and queries embedded by earlier runs are read back from disk
+openai_embeddings = OpenAIEmbeddings()
+embeddings = CachedEmbeddings(openai_embeddings, "embedding_cache", model_name=openai_embeddings.model)
 
+# The store persists between runs; delete the arxiv_store directory to rebuild it
+vectorstore = LocalVectorStore("arxiv_store", embedding=embeddings)
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-splits = text_splitter.split_documents(docs)
-
-vectorstore = Chroma.from_documents(documents=splits, embedding=OpenAIEmbeddings())
-retriever = vectorstore.as_retriever()
+# Documents are split, embedded and stored a batch at a time; an interrupted
+# run resumes from arxiv_store/checkpoint.json
+ingest = StreamingIngest(vectorstore, text_splitter, batch_size=64, checkpoint="arxiv_store/checkpoint.json")
+if not ingest.complete:
+    # Papers are fetched once into ~/.cache/arxiv (ARXIV_OFFLINE=1 never fetches)
+    ingest.run(CachedArxivLoader(query="Antibiotic design using deep learning", load_max_docs=10).lazy_load())
+# BM25 picks candidate chunks by exact terms; only those are compared by embedding
+retriever = HybridRetriever(store=vectorstore)
 
 prompt = hub.pull("rlm/rag-prompt")
 llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
@@ -49,6 +57,4 @@ resp = rag_chain.invoke(
 
 print(f'{resp.format()}')
 
-# vectorstore.delete_collection()
-
 
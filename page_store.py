@@ -0,0 +1,175 @@
+#
+# Extracted page text store
+#
+# PyPDF extraction is the slowest part of ingestion, so the text and
+# metadata of every extracted page are kept on disk and keyed by the PDF's
+# content hash. Re-splitting with a new chunk_size/chunk_overlap, or
+# re-embedding with another model, then reads pages from here instead of
+# parsing the PDFs again.
+#
+# Layout of the store directory:
+#   texts.bin    UTF-8 page texts, back to back (memory-mapped for reads)
+#   offsets.bin  int64 start offset of every page in texts.bin
+#   index.json   sha256 -> first row, page count and per-page metadata
+#
+# texts.bin and offsets.bin are append-only. index.json is rewritten
+# atomically on flush() and records how far the data files are valid, so
+# a crash between flushes only loses the pages appended since.
+#
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+
+class PageStore:
+    """Append-only, memory-mapped store of extracted page texts."""
+
+    def __init__(self, path, readonly=False) -> None:
+        self.path = path
+        self.readonly = readonly
+        self._texts_path = os.path.join(path, "texts.bin")
+        self._offsets_path = os.path.join(path, "offsets.bin")
+        self._index_path = os.path.join(path, "index.json")
+        self.index = {"rows": 0, "bytes": 0, "docs": {}}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self.index = json.load(f)
+        self._map = None
+        self._offsets = None
+        self._texts_file = None
+        self._offsets_file = None
+
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+            self._texts_file = open(self._texts_path, "ab")
+            self._offsets_file = open(self._offsets_path, "ab")
+            # Drop anything appended after the last flush.
+            self._texts_file.truncate(self.index["bytes"])
+            self._offsets_file.truncate(self.index["rows"] * 8)
+
+    def __contains__(self, sha256):
+        return sha256 in self.index["docs"]
+
+    def __len__(self):
+        return len(self.index["docs"])
+
+    def _views(self):
+        # (Re)map the data files when rows were added since the last read.
+        rows, size = self.index["rows"], self.index["bytes"]
+        if self._offsets is None or len(self._offsets) < rows:
+            if self._texts_file is not None:
+                self._texts_file.flush()
+                self._offsets_file.flush()
+            if rows:
+                self._offsets = np.memmap(self._offsets_path, dtype=np.int64, mode="r", shape=(rows,))
+            else:
+                self._offsets = np.zeros(0, dtype=np.int64)
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            if size:
+                with open(self._texts_path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        return self._offsets, self._map
+
+    def get(self, sha256, source=None):
+        """Return [(text, metadata), ...] for the PDF with this hash, or None.
+
+        If source is given it replaces the 'source' field of the metadata,
+        so pages of a renamed or copied file point at the new path.
+        """
+        doc = self.index["docs"].get(sha256)
+        if doc is None:
+            return None
+        offsets, texts = self._views()
+        first, count = doc["first"], doc["count"]
+        end_of = self.index["bytes"]
+        pages = []
+        for row in range(first, first + count):
+            start = int(offsets[row])
+            end = int(offsets[row + 1]) if row + 1 < len(offsets) else end_of
+            metadata = dict(doc["metadata"][row - first])
+            if source is not None:
+                metadata["source"] = source
+            pages.append((texts[start:end].decode("utf-8") if end > start else "", metadata))
+        return pages
+
+    def put(self, sha256, pages):
+        """Append the pages [(text, metadata), ...] of one PDF."""
+        if self.readonly:
+            raise ValueError("PageStore opened read-only")
+        if sha256 in self.index["docs"]:
+            return
+        first = self.index["rows"]
+        offsets = np.empty(len(pages), dtype=np.int64)
+        position = self.index["bytes"]
+        for i, (text, _) in enumerate(pages):
+            data = text.encode("utf-8")
+            offsets[i] = position
+            self._texts_file.write(data)
+            position += len(data)
+        self._offsets_file.write(offsets.tobytes())
+        self.index["rows"] += len(pages)
+        self.index["bytes"] = position
+        self.index["docs"][sha256] = {
+            "first": first,
+            "count": len(pages),
+            "metadata": [metadata for _, metadata in pages],
+        }
+
+    def remove(self, sha256):
+        """Forget a document; its bytes are reclaimed by compact()."""
+        self.index["docs"].pop(sha256, None)
+
+    def garbage(self):
+        """Fraction of stored pages that no document refers to any more."""
+        live = sum(d["count"] for d in self.index["docs"].values())
+        return 1.0 - live / self.index["rows"] if self.index["rows"] else 0.0
+
+    def flush(self):
+        if self.readonly:
+            return
+        self._texts_file.flush()
+        self._offsets_file.flush()
+        os.fsync(self._texts_file.fileno())
+        os.fsync(self._offsets_file.fileno())
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self._index_path)
+
+    def compact(self):
+        """Rewrite the store keeping only the documents still in the index."""
+        if self.readonly:
+            raise ValueError("PageStore opened read-only")
+        docs = {sha: self.get(sha) for sha in self.index["docs"]}
+        self.close()
+        for name in (self._texts_path, self._offsets_path, self._index_path):
+            if os.path.exists(name):
+                os.remove(name)
+        self.__init__(self.path)
+        for sha, pages in docs.items():
+            self.put(sha, pages)
+        self.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._offsets = None
+        if self._texts_file is not None:
+            self.flush()
+            self._texts_file.close()
+            self._offsets_file.close()
+            self._texts_file = self._offsets_file = None
+
+    def stats(self):
+        return {
+            "documents": len(self.index["docs"]),
+            "pages": self.index["rows"],
+            "bytes": self.index["bytes"],
+            "garbage": self.garbage(),
+        }
@@ -1,47 +1,394 @@
-from langchain.document_loaders import PyPDFLoader
-from langchain.embeddings import HuggingFaceEmbeddings
+#
+# Parallel PDF ingestion: parse -> split -> embed -> store
+#
+# PDFs are parsed, split and embedded across a process pool. Each worker
+# loads the all-MiniLM-L6-v2 model once, not once per file. Results flow
+# through bounded queues to a single store writer, so memory stays flat
+# however many files are queued. Per-stage throughput is printed at the end.
+#
+# A manifest in the store directory (see ingest_manifest.py) makes runs
+# incremental: unchanged PDFs are skipped, modified ones have their old
+# chunks replaced and deleted ones are removed from the store.
+#
+# Extracted page text is kept in a page store (see page_store.py) keyed by
+# content hash. Changing --chunk-size/--chunk-overlap re-splits and
+# re-embeds every document from there without parsing any PDF again.
+#
+# Chunks go to a LocalVectorStore (see local_vectorstore.py) by default, or
+# to a persistent Chroma collection with --backend chroma.
+#
+# --trace <file> writes the parse/split/embed/store time of every document
+# as JSON lines (see tracing.py), with latency percentiles at the end.
+#
+#   python pdf_store_loader.py --pdfs pdfs --store vector_store --workers 8
+#
 
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from os import listdir
 from os.path import isfile, join, dirname, realpath
 
-print(dirname(realpath(__file__)))
-from _util import _print
+import tracing
+from embedding_cache import CachedEmbeddings
+from embedding_engine import EmbeddingEngine
+from ingest_manifest import IngestManifest, file_hash
+from local_vectorstore import DTYPES, LocalVectorStore
+from page_store import PageStore
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
 
-t = _print('Start')
+# Per-process state set up by _init_worker.
+_embeddings = None
+_splitter = None
+_pages = None
 
-mypath="pdfs"
-onlyfiles = [f for f in listdir(mypath) if isfile(join(mypath, f))]
-print(f'file_count: {len(onlyfiles)}')
 
+def _init_worker(model_name, chunk_size, chunk_overlap, threads, page_store_path=None,
+                 embedding_cache_path=None):
+    global _embeddings, _splitter, _pages
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # The pool already spreads files over processes, so each worker runs a
+    # single-process engine; it still packs length-sorted batches.
+    _embeddings = EmbeddingEngine(model_name=model_name, workers=1)
+    if embedding_cache_path is not None:
+        # Chunks already embedded by any earlier run or worker are reused.
+        _embeddings = CachedEmbeddings(_embeddings, embedding_cache_path, model_name=model_name)
+    _splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if page_store_path is not None:
+        _pages = PageStore(page_store_path, readonly=True)
 
 
-# This needs to run parallel
-t = _print("Loading documents", t)
-document_count = page_count = 0
-pages = []    # one pdf has one or more pages
-for pdf in onlyfiles:
-    if pdf.endswith(".pdf"):
-        
-        loader = PyPDFLoader("pdfs/" + pdf)
-        document_count = document_count + 1
+def _process_pdf(path):
+    """Parse, split and embed one PDF inside a worker process.
 
-        pages = loader.load_and_split()
-        page_count = page_count + len(pages)
-        
-        print(f'document_count: {document_count}\tpage_count: {page_count}')
+    Pages already in the page store are read from it instead of parsed;
+    freshly extracted pages are returned so the writer can add them.
+    """
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.schema import Document
 
-        # Need to get the embeddings and embed these new pages
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        # Equivalent to SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    t0 = time.perf_counter()
+    sha256 = file_hash(path)
+    stored = _pages.get(sha256, source=path) if _pages is not None else None
+    if stored is not None:
+        pages = [Document(page_content=text, metadata=metadata) for text, metadata in stored]
+        extracted = None
+    else:
+        pages = PyPDFLoader(path).load()
+        extracted = [(p.page_content, p.metadata) for p in pages]
+    t1 = time.perf_counter()
+    chunks = _splitter.split_documents(pages)
+    t2 = time.perf_counter()
+    texts = [c.page_content for c in chunks]
+    vectors = _embeddings.encode(texts)
+    t3 = time.perf_counter()
+    return {
+        "source": path,
+        "sha256": sha256,
+        "extracted": extracted,
+        "texts": texts,
+        "metadatas": [c.metadata for c in chunks],
+        "vectors": vectors,
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "parse": t1 - t0,
+        "split": t2 - t1,
+        "embed": t3 - t2,
+    }
 
-        # Tokenize
-        # Then should investigate the best way to embed. How big of chunks.
-        # Then need to load into a vector store
 
+class LocalSink:
+    """Store stage: writes embedded chunks into a LocalVectorStore.
 
+    The result can be opened with LocalVectorStore(path, embedding=...).
+    """
 
-t = _print("Done loading documents", t)
+    def __init__(self, path, dtype="float32") -> None:
+        self.store = LocalVectorStore(path, dtype=dtype)
 
+    def add(self, result):
+        ids = [f"{result['source']}:{m.get('page', 0)}:{i}"
+               for i, m in enumerate(result["metadatas"])]
+        self.store.add_embeddings(result["texts"], result["vectors"], result["metadatas"], ids)
 
+    def delete(self, source):
+        self.store.delete_prefix(f"{source}:")
+
+    def close(self):
+        self.store.close()
+
+
+class ChromaSink:
+    """Store stage: writes embedded chunks into a persistent Chroma collection.
+
+    The result can be opened with
+    Chroma(persist_directory=path, collection_name=name, embedding_function=...).
+    """
+
+    def __init__(self, path, collection="pdfs", batch_size=4096) -> None:
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(collection)
+        self.batch_size = batch_size
+
+    def add(self, result):
+        ids = [f"{result['source']}:{m.get('page', 0)}:{i}"
+               for i, m in enumerate(result["metadatas"])]
+        for i in range(0, len(ids), self.batch_size):
+            j = i + self.batch_size
+            self.collection.upsert(ids=ids[i:j],
+                                   embeddings=result["vectors"][i:j].tolist(),
+                                   documents=result["texts"][i:j],
+                                   metadatas=result["metadatas"][i:j])
+
+    def delete(self, source):
+        self.collection.delete(where={"source": source})
+
+    def close(self):
+        pass
+
+
+class StageStats:
+    """Busy time and item counts per stage, for throughput reporting."""
+
+    def __init__(self) -> None:
+        self.documents = 0
+        self.pages = 0
+        self.chunks = 0
+        self.reparsed = 0
+        self.busy = {"parse": 0.0, "split": 0.0, "embed": 0.0, "store": 0.0}
+        self.failed = []
+
+    def add(self, result):
+        self.documents += 1
+        self.pages += result["pages"]
+        self.chunks += result["chunks"]
+        if result.get("extracted") is not None:
+            self.reparsed += 1
+        for stage in ("parse", "split", "embed"):
+            self.busy[stage] += result[stage]
+
+    def report(self, wall, workers):
+        def rate(n, seconds):
+            return n / seconds if seconds else 0.0
+        # Worker stages run in parallel, so their busy time is spread over
+        # the pool; divide by workers to get the effective stage rate.
+        lines = [
+            f"documents: {self.documents}\tpages: {self.pages}\tchunks: {self.chunks}\t"
+            f"parsed: {self.reparsed}\tfrom page store: {self.documents - self.reparsed}\tfailed: {len(self.failed)}",
+            f"parse: {rate(self.pages, self.busy['parse'] / workers):.1f} pages/s",
+            f"split: {rate(self.chunks, self.busy['split'] / workers):.1f} chunks/s",
+            f"embed: {rate(self.chunks, self.busy['embed'] / workers):.1f} chunks/s",
+            f"store: {rate(self.chunks, self.busy['store']):.1f} chunks/s",
+            f"overall: {rate(self.pages, wall):.1f} pages/s, {rate(self.chunks, wall):.1f} chunks/s in {wall:.1f}s",
+        ]
+        return "\n".join(lines)
+
+
+def list_pdfs(path):
+    return sorted(join(path, f) for f in listdir(path)
+                  if f.endswith(".pdf") and isfile(join(path, f)))
+
+
+def ingest(paths, sink, manifest=None, page_store=None, embedding_cache=None,
+           workers=None, queue_size=None,
+           model_name=MODEL_NAME, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+           save_every=50):
+    """Run the pipeline over paths and return its StageStats.
+
+    At most queue_size PDFs are being processed or waiting to be stored at
+    any time, which bounds memory regardless of how many paths are given.
+    With a manifest only new and modified paths are processed, and paths
+    that are in the manifest but not in paths are deleted from the sink.
+    The manifest also remembers the split and embedding settings of every
+    document; documents ingested with other settings are redone, reading
+    their pages from page_store.
+    embedding_cache is a CachedEmbeddings directory shared by the workers.
+    An exception raised while storing (sink, page store or manifest) stops
+    the run and is raised here.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    stats = StageStats()
+    results = queue.Queue(maxsize=queue_size)
+
+    replace = set()
+    settings = None
+    if manifest is not None:
+        settings = {"model_name": model_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+        plan = manifest.plan(paths, settings=settings)
+        print(plan)
+        for path in plan.deleted:
+            sink.delete(path)
+            if page_store is not None:
+                page_store.remove(manifest.documents[path]["sha256"])
+            manifest.remove(path)
+        replace = set(plan.modified)
+        paths = plan.todo
+
+    # The first exception raised while storing; the main loop re-raises it.
+    store_errors = []
+
+    def store():
+        while True:
+            result = results.get()
+            if result is None:
+                return
+            if store_errors:
+                # Keep draining so the producer never blocks on a full queue.
+                continue
+            try:
+                store_result(result)
+            except BaseException as e:
+                store_errors.append(e)
+
+    def store_result(result):
+        t = time.perf_counter()
+        source = result["source"]
+        if source in replace:
+            sink.delete(source)
+        if result["texts"]:
+            sink.add(result)
+        if page_store is not None and result["extracted"] is not None:
+            old = manifest.documents.get(source) if manifest is not None else None
+            if old is not None and old["sha256"] != result["sha256"]:
+                page_store.remove(old["sha256"])
+            page_store.put(result["sha256"], result["extracted"])
+        stats.busy["store"] += time.perf_counter() - t
+        stats.add(result)
+        if tracing.enabled():
+            # The worker stages ran in another process; record their timings here.
+            for stage in ("parse", "split", "embed"):
+                tracing.record(stage, result[stage], source=source)
+            tracing.record("store", time.perf_counter() - t, source=source, chunks=result["chunks"])
+        if manifest is not None:
+            manifest.record(source, result["pages"], result["chunks"], result["sha256"], settings)
+        if stats.documents % save_every == 0:
+            # Pages first, so the manifest never refers to unsaved pages.
+            if page_store is not None:
+                page_store.flush()
+            if manifest is not None:
+                manifest.save()
+
+    writer = threading.Thread(target=store, daemon=True)
+    writer.start()
+
+    pending = {}
+    paths = iter(paths)
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(model_name, chunk_size, chunk_overlap, threads,
+                                           page_store.path if page_store is not None else None,
+                                           embedding_cache)) as pool:
+            while not store_errors:
+                while len(pending) < queue_size:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    pending[pool.submit(_process_pdf, path)] = path
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error processing {path}: {e}")
+                        stats.failed.append(path)
+                        continue
+                    results.put(result)
+            for future in pending:
+                future.cancel()
+    finally:
+        results.put(None)
+        writer.join()
+    if store_errors:
+        raise store_errors[0]
+    if manifest is not None:
+        manifest.settle(settings)
+    if page_store is not None:
+        if page_store.garbage() > 0.5:
+            page_store.compact()
+        page_store.flush()
+    if manifest is not None:
+        manifest.save()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse, split, embed and store a directory of PDFs.")
+    parser.add_argument("--pdfs", default="pdfs", help="directory of PDF files")
+    parser.add_argument("--store", default=None,
+                        help="persistent vector store directory (default: vector_store, or chroma_db)")
+    parser.add_argument("--backend", choices=("local", "chroma"), default="local")
+    parser.add_argument("--collection", default="pdfs", help="Chroma collection name")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                        help="vector storage type of a new local store")
+    parser.add_argument("--manifest", default=None,
+                        help="ingestion manifest (default: <store>/manifest.json)")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the manifest and re-ingest every file")
+    parser.add_argument("--page-store", default=None,
+                        help="extracted page text store (default: <store>/pages)")
+    parser.add_argument("--embedding-cache", default=None,
+                        help="embedding cache directory (default: <store>/embeddings)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--queue-size", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--trace", default=None, help="write stage timings as JSON lines to this file")
+    args = parser.parse_args()
+    if args.store is None:
+        args.store = "vector_store" if args.backend == "local" else "chroma_db"
+
+    if args.trace:
+        tracing.enable(args.trace)
+    print(dirname(realpath(__file__)))
+
+    onlyfiles = list_pdfs(args.pdfs)
+    print(f'file_count: {len(onlyfiles)}')
+
+    start = time.perf_counter()
+    if args.backend == "local":
+        sink = LocalSink(args.store, args.dtype)
+    else:
+        sink = ChromaSink(args.store, args.collection)
+    manifest = IngestManifest(args.manifest or join(args.store, "manifest.json"))
+    page_store = PageStore(args.page_store or join(args.store, "pages"))
+    if args.full:
+        for path in list(manifest.documents):
+            sink.delete(path)
+        manifest.documents.clear()
+    stats = ingest(onlyfiles, sink,
+                   manifest=manifest,
+                   page_store=page_store,
+                   embedding_cache=args.embedding_cache or join(args.store, "embeddings"),
+                   workers=args.workers,
+                   queue_size=args.queue_size,
+                   chunk_size=args.chunk_size,
+                   chunk_overlap=args.chunk_overlap)
+    page_store.close()
+    sink.close()
+    print(stats.report(time.perf_counter() - start, args.workers))
+    totals = manifest.totals()
+    print(f'document_count: {totals["documents"]}\tpage_count: {totals["pages"]}\tchunk_count: {totals["chunks"]}')
+
+
+if __name__ == "__main__":
+    main()
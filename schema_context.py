@@ -0,0 +1,222 @@
+#
+# Schema context builder: only the relevant EpiHiper schema fragments
+#
+# PRISMA_test.py used to paste the whole pretty-printed diseaseModelSchema.json
+# into the task1 prompt. SchemaContextBuilder takes a schema from the
+# SchemaRegistry (see schema_registry.py) and splits it into one fragment
+# per top-level property and per local definition. It follows every $ref
+# into typeRegistry.json, so each referenced type becomes a fragment of
+# its own. Fragments are compact JSON that refer to
+# each other by name ({"$ref": "nonNegativeNumber"}). They leave out
+# bookkeeping ($schema, $id, $$target, annotations), validation-only
+# detail (pattern, $comment) and titles that repeat the fragment name.
+#
+# build() keeps the schema's summary, every top-level property and the
+# types they use up to max_depth references away. Required properties and
+# those whose words appear in the query come first; other optional
+# properties (such as transmissibility, which a query rarely names) come
+# last, so an optional token budget drops them first. Deeper types, and any
+# fragment past the budget, are only named. It returns the context text
+# with a report of token counts before and after.
+#
+#   python schema_context.py diseaseModelSchema.json "flavivirus outbreak"
+#
+
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+
+from schema_registry import REGISTRY, default_registry
+from tracing import count_tokens
+
+NOISE_KEYS = {"$schema", "$id", "$$target"}
+# Validation-only detail that does not help choose parameter values.
+DETAIL_KEYS = {"pattern", "$comment"}
+NOISE_REFS = {"annotation"}
+STOPWORDS = {"a", "an", "the", "of", "and", "or", "in", "on", "for", "to", "with", "using", "use",
+             "model", "models", "agent", "based", "current", "is", "are", "be", "this", "that"}
+_WORD = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+")
+
+Fragment = namedtuple("Fragment", "name, pointer, value, refs, words")
+
+def words(text):
+    """Lowercased words, with camelCase split (entryState -> entry, state)."""
+    return {w.lower() for w in _WORD.findall(text)} - STOPWORDS
+
+
+def compact(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+class SchemaContextBuilder:
+    """Splits EpiHiper schemas into fragments and selects them per query."""
+
+    def __init__(self, registry=None, max_depth=2) -> None:
+        self.registry = registry if registry is not None else default_registry()
+        self.max_depth = max_depth
+        self._fragments = {}
+
+    def document(self, filename):
+        return self.registry.document(filename)
+
+    def _ref_name(self, ref, filename):
+        # "./typeRegistry.json#/definitions/x" and "#/definitions/x" -> "x";
+        # anything else keeps its file name.
+        target, _, pointer = ref.partition("#")
+        target = os.path.basename(target) or filename
+        if pointer.startswith("/definitions/") and pointer.count("/") == 2:
+            name = pointer[len("/definitions/"):]
+            return name if target in (REGISTRY, filename) else f"{target}:{name}"
+        return f"{target}#{pointer}" if pointer else target
+
+    def _clean(self, node, filename, refs, name=None):
+        if isinstance(node, dict):
+            out = {}
+            for key, value in node.items():
+                if key in NOISE_KEYS or key in DETAIL_KEYS:
+                    continue
+                if key == "patternProperties" and set(value) == {"^ann:"}:
+                    continue
+                if key == "title" and value == name:
+                    continue
+                if key in ("allOf", "anyOf", "oneOf") and isinstance(value, list):
+                    value = [v for v in value if not (isinstance(v, dict) and v.keys() == {"$ref"}
+                                                      and self._ref_name(v["$ref"], filename) in NOISE_REFS)]
+                    if len(value) == 1 and key == "allOf":
+                        out.update(self._clean(value[0], filename, refs))
+                        continue
+                if key == "$ref" and isinstance(value, str):
+                    target = self._ref_name(value, filename)
+                    refs.append(target)
+                    out[key] = target
+                else:
+                    out[key] = self._clean(value, filename, refs)
+            return out
+        if isinstance(node, list):
+            return [self._clean(v, filename, refs) for v in node]
+        return node
+
+    def _fragment(self, name, pointer, node, filename):
+        refs = []
+        value = self._clean(node, filename, refs, name)
+        text = " ".join([name] + [s for s in _strings(node)])
+        return Fragment(name, pointer, value, list(dict.fromkeys(refs)), words(text))
+
+    def definition(self, name):
+        """The fragment for a type name as written by _ref_name."""
+        if name not in self._fragments:
+            if ":" in name:
+                filename, _, key = name.partition(":")
+            elif "#" in name or name.endswith(".json") or name not in self.registry:
+                self._fragments[name] = None
+                return None
+            else:
+                filename, key = self.registry.pointer(name).split("#")[0], name
+            try:
+                node = self.registry.definition(key, filename)
+            except KeyError:
+                node = None
+            # An empty definition ({}, any value) is still a fragment.
+            self._fragments[name] = (self._fragment(name, f"{filename}#/definitions/{key}", node, filename)
+                                     if node is not None else None)
+        return self._fragments[name]
+
+    def fragments(self, filename):
+        """(summary, property fragments, local definition fragments) of a schema."""
+        root = self.document(filename)
+        summary = {k: v for k, v in root.items()
+                   if k in ("title", "description", "type", "required", "additionalProperties")}
+        summary["properties"] = sorted(root.get("properties", {}))
+        properties = [self._fragment(k, f"{filename}#/properties/{k}", v, filename)
+                      for k, v in root.get("properties", {}).items()]
+        definitions = [self._fragment(k, f"{filename}#/definitions/{k}", v, filename)
+                       for k, v in root.get("definitions", {}).items()]
+        return summary, properties, definitions
+
+    def select(self, filename, query):
+        """Fragments for a query, in priority order: required or matching
+        properties, the types the properties reference (breadth first up to
+        max_depth), then the other optional properties."""
+        root = self.document(filename)
+        required = set(root.get("required", []))
+        query_words = words(query)
+        _, properties, definitions = self.fragments(filename)
+        local = {f.name: f for f in definitions}
+
+        chosen = [f for f in properties if f.name in required or f.words & query_words]
+        optional = [f for f in properties if f not in chosen]
+        seen = {f.name for f in properties}
+        frontier = [ref for f in chosen + optional for ref in f.refs]
+        for _ in range(self.max_depth):
+            following = []
+            for name in frontier:
+                if name in seen:
+                    continue
+                seen.add(name)
+                fragment = local.get(name) or self.definition(name)
+                if fragment is not None:
+                    chosen.append(fragment)
+                    following.extend(fragment.refs)
+            frontier = following
+        named_only = sorted({name for name in frontier if name not in seen})
+        return chosen + optional, named_only
+
+    def build(self, filename, query, max_tokens=None):
+        """Context text for a schema and query, and a token count report.
+
+        With max_tokens, fragments that would exceed the budget are left
+        out (lowest priority first) and only named.
+        """
+        summary, _, _ = self.fragments(filename)
+        chosen, named_only = self.select(filename, query)
+        lines = [f"Schema {filename}: {compact(summary)}"]
+        used = count_tokens(lines[0])
+        shown, dropped = [], []
+        for fragment in chosen:
+            line = f"{fragment.name}: {compact(fragment.value)}"
+            cost = count_tokens(line)
+            if max_tokens is not None and used + cost > max_tokens:
+                dropped.append(fragment.name)
+                continue
+            used += cost
+            shown.append((fragment, line))
+
+        lines.append("Properties:")
+        lines.extend(line for f, line in shown if "#/properties/" in f.pointer)
+        lines.append("Types referenced with $ref:")
+        lines.extend(line for f, line in shown if "#/properties/" not in f.pointer)
+        named_only = dropped + named_only
+        if named_only:
+            lines.append("Further types (not shown): " + ", ".join(named_only))
+        context = "\n".join(lines)
+
+        report = {
+            "schema": filename,
+            "tokens_before": count_tokens(self.registry.text(filename)),
+            "tokens_after": count_tokens(context),
+            "fragments": [f.name for f, _ in shown],
+            "named_only": named_only,
+        }
+        return context, report
+
+
+def _strings(node):
+    # Key names and descriptive strings, for matching against queries.
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("title", "description") and isinstance(value, str):
+                yield value
+            elif key not in NOISE_KEYS and key != "$ref":
+                yield key
+                yield from _strings(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _strings(value)
+
+
+if __name__ == "__main__":
+    context, report = SchemaContextBuilder().build(sys.argv[1], " ".join(sys.argv[2:]))
+    print(context)
+    print(json.dumps(report))
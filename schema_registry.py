@@ -0,0 +1,168 @@
+#
+# Indexed, lazily loaded registry of the EpiHiper schema files
+#
+# PRISMA_test.py used to read every file under EpiHiper-Schema-master/ and
+# schema tools parsed typeRegistry.json again for each lookup.
+# SchemaRegistry indexes the schema directory once and keeps, per file,
+# its size, mtime, $id, title and definition names. It saves the index to
+# ~/.cache/epihiper. Later runs stat the files and re-read only those that
+# changed. Documents are parsed on first access and kept. $ref resolution
+# is memoized per (document, reference).
+#
+#   registry = SchemaRegistry()
+#   registry.definition("distribution")                  # by name
+#   registry.get("typeRegistry.json#/definitions/value")  # by JSON pointer
+#   registry.resolve("./typeRegistry.json#/definitions/uniqueId", "diseaseModelSchema.json")
+#
+
+import hashlib
+import json
+import os
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EpiHiper-Schema-master", "schema")
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "epihiper")
+# Where a definition name is looked up first when several files define it.
+REGISTRY = "typeRegistry.json"
+
+
+def unwrap(data):
+    # The EpiHiper schema files hold a one-element list.
+    return data[0] if isinstance(data, list) and len(data) == 1 else data
+
+
+def walk_pointer(node, pointer):
+    """Follow an RFC 6901 JSON pointer ("/definitions/x") into node."""
+    if pointer in ("", "/"):
+        return node
+    for token in pointer.lstrip("/").split("/"):
+        token = token.replace("~1", "/").replace("~0", "~")
+        node = node[int(token)] if isinstance(node, list) else node[token]
+    return node
+
+
+class SchemaRegistry:
+    """Index of schema files and definitions with lazy, memoized access."""
+
+    def __init__(self, schema_dir=SCHEMA_DIR, index_path=None) -> None:
+        self.schema_dir = os.path.abspath(schema_dir)
+        if index_path is None:
+            digest = hashlib.sha256(self.schema_dir.encode("utf-8")).hexdigest()[:16]
+            index_path = os.path.join(INDEX_DIR, f"schema-index-{digest}.json")
+        self.index_path = index_path
+        self._documents = {}
+        self._resolved = {}
+        self.index = self._load_index()
+
+    # -- index --------------------------------------------------------------
+
+    def _scan(self, name, stat):
+        with open(os.path.join(self.schema_dir, name)) as f:
+            root = unwrap(json.load(f))
+        self._documents[name] = root
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+        if isinstance(root, dict):
+            entry.update(id=root.get("$id"), title=root.get("title"),
+                         definitions=sorted(root.get("definitions", {})),
+                         properties=sorted(root.get("properties", {})))
+        return entry
+
+    def _load_index(self):
+        index = {"version": 1, "schema_dir": self.schema_dir, "files": {}}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except ValueError:
+                pass
+
+        files, changed = {}, False
+        for name in sorted(os.listdir(self.schema_dir)):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.schema_dir, name))
+            entry = index["files"].get(name)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                try:
+                    entry = self._scan(name, stat)
+                except ValueError as e:
+                    entry = {"size": stat.st_size, "mtime": stat.st_mtime, "error": str(e)}
+                changed = True
+            files[name] = entry
+        changed = changed or set(files) != set(index["files"])
+        index["files"] = files
+
+        definitions = {}
+        for name, entry in files.items():
+            for definition in entry.get("definitions", ()):
+                definitions.setdefault(definition, []).append(name)
+        for name, owners in definitions.items():
+            owners.sort(key=lambda f: f != REGISTRY)
+        self.definitions = definitions
+
+        if changed:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, self.index_path)
+        return index
+
+    # -- access -------------------------------------------------------------
+
+    def files(self, suffix=".json"):
+        """Indexed file names ending in suffix, e.g. "Schema.json" or "Rules.json"."""
+        return [name for name in self.index["files"] if name.endswith(suffix)]
+
+    def document(self, name):
+        """Parsed root of a schema file, loaded on first use."""
+        name = os.path.basename(name)
+        if name not in self._documents:
+            if name not in self.index["files"]:
+                raise KeyError(f"no schema file {name} in {self.schema_dir}")
+            with open(os.path.join(self.schema_dir, name)) as f:
+                self._documents[name] = unwrap(json.load(f))
+        return self._documents[name]
+
+    def text(self, name):
+        with open(os.path.join(self.schema_dir, os.path.basename(name))) as f:
+            return f.read()
+
+    def get(self, pointer, base=None):
+        """Node at "file.json#/json/pointer" (or "#/pointer" within base)."""
+        name, _, fragment = pointer.partition("#")
+        return walk_pointer(self.document(os.path.basename(name) or base), fragment)
+
+    def resolve(self, ref, base=None):
+        """Node a $ref points at, as written in file base; memoized."""
+        key = (base, ref)
+        if key not in self._resolved:
+            self._resolved[key] = self.get(ref, base)
+        return self._resolved[key]
+
+    def definition(self, name, file=None):
+        """A definition by name, from file or else the first file defining it."""
+        owners = [file] if file is not None else self.definitions.get(name)
+        if not owners:
+            raise KeyError(f"no schema defines {name}")
+        return self.resolve(f"{owners[0]}#/definitions/{name}")
+
+    def pointer(self, name):
+        """The JSON pointer of a definition name, e.g. typeRegistry.json#/definitions/x."""
+        owners = self.definitions.get(name)
+        if not owners:
+            raise KeyError(f"no schema defines {name}")
+        return f"{owners[0]}#/definitions/{name}"
+
+    def __contains__(self, name):
+        return name in self.definitions
+
+
+_default = None
+
+
+def default_registry():
+    """Process-wide registry over the bundled EpiHiper-Schema-master."""
+    global _default
+    if _default is None:
+        _default = SchemaRegistry()
+    return _default
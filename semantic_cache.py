@@ -0,0 +1,174 @@
+#
+# Semantic (embedding-similarity) prompt cache for the Argo LLM wrappers
+#
+# Agents such as param_executor in PRISMA_test.py keep issuing prompts that
+# differ only in whitespace or trivial wording. Each prompt is embedded with
+# all-MiniLM-L6-v2 (as in embedding_test.py) and compared against an
+# in-memory matrix of earlier prompts sent with the same model, system
+# prompt and sampling parameters. A cosine similarity at or above threshold
+# returns the stored reply. A prompt is embedded at most once per miss: an
+# empty cache skips the embedding in get(), and the vector get() computed is
+# reused by the put() that follows.
+#
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(prompt):
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def _context_key(url, payload):
+    # Everything except the prompt must match for a semantic hit.
+    rest = {k: v for k, v in payload.items() if k != "prompt"}
+    canonical = json.dumps([url, rest], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """Bounded in-memory vector index of prompt embeddings and their replies.
+
+    Like argo_cache.ResponseCache it only serves deterministic calls
+    (temperature 0) unless force=True. When max_entries is reached the
+    least recently used entry is replaced.
+    """
+
+    def __init__(self,
+                 embeddings=None,
+                 threshold=0.95,
+                 max_entries=2048,
+                 force=False) -> None:
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.force = force
+
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+        self.embed_time = 0.0
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._contexts = [None] * max_entries
+        self._texts = [None] * max_entries
+        self._replies = [None] * max_entries
+        self._latency = np.zeros(max_entries, dtype=np.float64)
+        self._used = np.full(max_entries, -np.inf)
+        self._exact = {}
+        self._size = 0
+        # Vectors of prompts that missed in get(), awaiting their put().
+        self._pending = OrderedDict()
+        self._pending_max = 256
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from embedding_engine import EmbeddingEngine
+            self._embeddings = EmbeddingEngine()
+        return self._embeddings
+
+    def _embed(self, text):
+        start = time.perf_counter()
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        self.embed_time += time.perf_counter() - start
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remember(self, text, vector):
+        # Called with the lock held.
+        self._pending[text] = vector
+        self._pending.move_to_end(text)
+        while len(self._pending) > self._pending_max:
+            self._pending.popitem(last=False)
+
+    def applies(self, payload):
+        return self.force or payload.get("temperature") == 0
+
+    def get(self, url, payload):
+        """Return the reply of the most similar cached prompt, or None."""
+        context = _context_key(url, payload)
+        text = _normalize(payload["prompt"][0])
+
+        with self._lock:
+            self.lookups += 1
+            slot = self._exact.get((context, text))
+            if slot is not None:
+                self.exact_hits += 1
+                return self._hit(slot)
+            if self._size == 0:
+                return None
+
+        vector = self._embed(text)
+        with self._lock:
+            self._remember(text, vector)
+            scores = self._vectors[:self._size] @ vector
+            mask = np.fromiter((c == context for c in self._contexts[:self._size]),
+                               dtype=bool, count=self._size)
+            scores[~mask] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                return None
+            return self._hit(slot)
+
+    def _hit(self, slot):
+        self.hits += 1
+        self.saved_latency += float(self._latency[slot])
+        self._used[slot] = time.monotonic()
+        return self._replies[slot]
+
+    def put(self, url, payload, reply, latency=0.0):
+        context = _context_key(url, payload)
+        text = _normalize(payload["prompt"][0])
+        with self._lock:
+            if (context, text) in self._exact:
+                return
+            vector = self._pending.pop(text, None)
+        if vector is None:
+            vector = self._embed(text)
+
+        with self._lock:
+            if (context, text) in self._exact:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._used))
+                del self._exact[(self._contexts[slot], self._texts[slot])]
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._contexts[slot] = context
+            self._texts[slot] = text
+            self._replies[slot] = reply
+            self._latency[slot] = latency
+            self._used[slot] = time.monotonic()
+            self._exact[(context, text)] = slot
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_latency": self.saved_latency,
+            "embed_time": self.embed_time,
+            "entries": self._size,
+            "evictions": self.evictions,
+        }
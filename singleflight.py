@@ -0,0 +1,86 @@
+#
+# Single-flight deduplication of concurrent identical calls
+#
+# When several crewAI agents or batched chain branches send the same prompt
+# at the same moment, only the first caller for a key goes upstream; the
+# others wait for it and receive the same result, or the same exception.
+# Threads coalesce with threads and asyncio tasks with tasks on the same
+# event loop.
+#
+
+import asyncio
+import threading
+import weakref
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def do(self, key, fn):
+        """Run fn() unless a call for key is already in flight; then share it."""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn):
+        """Async counterpart of do; fn is a coroutine function."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            tasks = self._tasks.setdefault(loop, {})
+            task = tasks.get(key)
+            if task is None:
+                task = tasks[key] = loop.create_task(fn())
+                task.add_done_callback(lambda t: tasks.pop(key, None))
+            else:
+                self.coalesced += 1
+        # Shielded so that one cancelled waiter does not cancel the others.
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls) + sum(len(t) for t in self._tasks.values())
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+        }
@@ -0,0 +1,185 @@
+#
+# Streaming ingestion: documents -> chunks -> embedding batches -> store
+#
+# openai-rag-arxiv.py used to load every document, split them all into one
+# list and hand that list to the vector store, so memory grew with the
+# corpus. StreamingIngest chains generators instead. Documents are pulled
+# one at a time and their chunks grouped into batches of batch_size. A
+# background thread embeds the batches and hands them over through a queue
+# of at most `prefetch` batches, and the caller's thread writes them to the
+# store. When the writer falls behind the queue fills and the embedding
+# thread blocks, so at most (prefetch + 2) batches are held at once,
+# plus the chunks of the document being split.
+#
+# After each batch is written and the store committed, a checkpoint file
+# records the (document, chunk) position reached. A rerun after a crash
+# skips everything up to that point. Chunk ids are "<document>:<chunk>", so
+# a batch that is written twice replaces itself. The document source must
+# yield the same documents in the same order on every run.
+#
+# The store needs add_embeddings(texts, vectors, metadatas, ids) and
+# flush(), as LocalVectorStore has.
+#
+
+import json
+import os
+import queue
+import resource
+import threading
+import time
+
+import tracing
+
+_DONE = object()
+
+
+def batched(items, size):
+    """Yield lists of up to size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded(items, maxsize):
+    """Run a generator in a thread, at most maxsize items ahead of the caller."""
+    handoff = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        handoff.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            handoff.put((_DONE, None))
+        except BaseException as e:
+            handoff.put((_DONE, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = handoff.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StreamingIngest:
+    """Split, embed and store a document stream with checkpointed progress."""
+
+    def __init__(self,
+                 store,
+                 splitter,
+                 embeddings=None,
+                 batch_size=256,
+                 prefetch=2,
+                 checkpoint=None) -> None:
+        self.store = store
+        self.splitter = splitter
+        self.embeddings = embeddings if embeddings is not None else store.embeddings
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.checkpoint = checkpoint
+        self.settings = {"chunk_size": getattr(splitter, "_chunk_size", None),
+                         "chunk_overlap": getattr(splitter, "_chunk_overlap", None)}
+        self.state = {"version": 1, "settings": self.settings, "document": -1, "chunk": -1,
+                      "documents": 0, "chunks": 0, "complete": False}
+        self.busy = {"split": 0.0, "embed": 0.0, "store": 0.0}
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            if state["settings"] != self.settings:
+                raise ValueError(f"{checkpoint} was written with {state['settings']}, not {self.settings}; "
+                                 "remove it and the store to re-ingest")
+            self.state = state
+
+    @property
+    def complete(self):
+        return self.state["complete"]
+
+    def _save(self):
+        if self.checkpoint is None:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.checkpoint)
+
+    def chunks(self, documents):
+        """Yield (document, chunk, text, metadata) past the checkpoint."""
+        last_doc, last_chunk = self.state["document"], self.state["chunk"]
+        for d, doc in enumerate(documents):
+            if d < last_doc:
+                continue
+            start = time.perf_counter()
+            texts = self.splitter.split_text(doc.page_content)
+            elapsed = time.perf_counter() - start
+            self.busy["split"] += elapsed
+            tracing.record("split", elapsed, document=d, chunks=len(texts))
+            for c, text in enumerate(texts):
+                if d == last_doc and c <= last_chunk:
+                    continue
+                yield d, c, text, dict(doc.metadata, document=d, chunk=c, last=c == len(texts) - 1)
+
+    def _embedded(self, documents):
+        for batch in batched(self.chunks(documents), self.batch_size):
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents([text for _, _, text, _ in batch])
+            elapsed = time.perf_counter() - start
+            self.busy["embed"] += elapsed
+            tracing.record("embed", elapsed, chunks=len(batch))
+            yield batch, vectors
+
+    def run(self, documents):
+        """Ingest an iterable of Documents; returns the checkpoint state."""
+        for batch, vectors in bounded(self._embedded(documents), self.prefetch):
+            start = time.perf_counter()
+            metadatas = []
+            for d, c, _, metadata in batch:
+                if metadata.pop("last"):
+                    self.state["documents"] = d + 1
+                metadatas.append(metadata)
+            self.store.add_embeddings([text for _, _, text, _ in batch], vectors, metadatas,
+                                      [f"{d}:{c}" for d, c, _, _ in batch])
+            self.store.flush()
+            d, c = batch[-1][0], batch[-1][1]
+            self.state.update(document=d, chunk=c, chunks=self.state["chunks"] + len(batch))
+            self._save()
+            elapsed = time.perf_counter() - start
+            self.busy["store"] += elapsed
+            tracing.record("store", elapsed, chunks=len(batch))
+        self.state["complete"] = True
+        self._save()
+        return self.state
+
+    def stats(self):
+        return {
+            "documents": self.state["documents"],
+            "chunks": self.state["chunks"],
+            "split_s": self.busy["split"],
+            "embed_s": self.busy["embed"],
+            "store_s": self.busy["store"],
+            "peak_rss_mb": _peak_rss_mb(),
+        }
@@ -0,0 +1,411 @@
+#
+# Parallel task DAG for the per-parameter sub-questions of PRISMA_test.py
+#
+# task1 (param_executor) produces sub-questions grouped by model parameter.
+# Under Process.sequential, task2 then answered all of them one by one in a
+# single agent loop. parse_subquestions() turns task1's output into
+# Branches (one parameter with its questions). answer_subquestions() then
+# builds this DAG:
+#
+#   search:<parameter>:<i>  ->  answer:<parameter>  ->  join
+#
+# One search node per question (through FederatedSearch, if given), one LLM
+# call per parameter, and a join node that puts the answers back together
+# in parameter order for the PRISMA_expert review. TaskDAG runs every node
+# whose dependencies are done, at most `workers` at a time, so wall-clock
+# time follows the critical path rather than the number of parameters.
+#
+#   branches = parse_subquestions(plan_text)
+#   answers, dag = answer_subquestions(branches, llm, search=FederatedSearch(), workers=8)
+#   print(dag.stats()["critical_path_s"], dag.stats()["wall_s"])
+#
+# A node that raises is recorded in dag.errors and its dependents are
+# skipped, except tolerant nodes (join), which run with whatever inputs
+# succeeded.
+#
+#   python task_dag.py plan.txt --workers 8 --url http://127.0.0.1:8765/argoapi/api/v1/resource/chat/
+#
+
+import argparse
+import contextvars
+import json
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+
+class _Node:
+    def __init__(self, name, fn, deps, tolerant):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.tolerant = tolerant
+
+
+class TaskDAG:
+    """Tasks with dependencies, run concurrently in dependency order.
+
+    Each task is fn(inputs), where inputs maps the names of its
+    dependencies to their results.
+    """
+
+    def __init__(self) -> None:
+        self.nodes = {}
+        self.results = {}
+        self.errors = {}        # name -> exception
+        self.skipped = []
+        self.timings = {}       # name -> (start, end), seconds from the start of run()
+        self.wall = 0.0
+
+    def add(self, name, fn, deps=(), tolerant=False):
+        """Add a task; tolerant tasks also run when some dependencies failed."""
+        if name in self.nodes:
+            raise ValueError(f"duplicate task {name!r}")
+        self.nodes[name] = _Node(name, fn, deps, tolerant)
+        return name
+
+    def order(self):
+        """Task names in a dependency-respecting order; ValueError on cycles."""
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"task {node.name!r} depends on unknown task {dep!r}")
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "active":
+                raise ValueError("dependency cycle: " + " -> ".join(path + [name]))
+            state[name] = "active"
+            for dep in self.nodes[name].deps:
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        return order
+
+    def _call(self, node, inputs, start):
+        began = time.perf_counter() - start
+        try:
+            with tracing.span("dag.task", task=node.name):
+                return node.fn(inputs)
+        finally:
+            self.timings[node.name] = (began, time.perf_counter() - start)
+
+    def run(self, workers=4):
+        """Run every task; returns {name: result} of those that succeeded."""
+        order = self.order()
+        waiting = {name: set(self.nodes[name].deps) for name in order}
+        dependents = {name: [] for name in order}
+        for name in order:
+            for dep in self.nodes[name].deps:
+                dependents[dep].append(name)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dag") as pool:
+            running = {}
+
+            def submit(name):
+                node = self.nodes[name]
+                inputs = {dep: self.results[dep] for dep in node.deps if dep in self.results}
+                future = pool.submit(contextvars.copy_context().run, self._call, node, inputs, start)
+                running[future] = name
+
+            def settle(name):
+                # name has finished, failed or been skipped; release its dependents.
+                for child in dependents[name]:
+                    waiting[child].discard(name)
+                    if waiting[child]:
+                        continue
+                    node = self.nodes[child]
+                    if node.tolerant or all(dep in self.results for dep in node.deps):
+                        submit(child)
+                    else:
+                        self.skipped.append(child)
+                        settle(child)
+
+            for name in order:
+                if not waiting[name]:
+                    submit(name)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        self.errors[name] = future.exception()
+                    else:
+                        self.results[name] = future.result()
+                    settle(name)
+        self.wall = time.perf_counter() - start
+        return dict(self.results)
+
+    def critical_path(self):
+        """(task names, seconds) of the longest chain of measured task times."""
+        finish, previous = {}, {}
+        for name in self.order():
+            if name not in self.timings:
+                continue
+            start, end = self.timings[name]
+            best = max((dep for dep in self.nodes[name].deps if dep in finish),
+                       key=lambda dep: finish[dep], default=None)
+            finish[name] = (end - start) + (finish[best] if best is not None else 0.0)
+            previous[name] = best
+        if not finish:
+            return [], 0.0
+        name = max(finish, key=finish.get)
+        total, path = finish[name], []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], total
+
+    def stats(self):
+        path, seconds = self.critical_path()
+        return {
+            "tasks": len(self.nodes),
+            "succeeded": len(self.results),
+            "failed": {name: f"{type(e).__name__}: {e}" for name, e in self.errors.items()},
+            "skipped": list(self.skipped),
+            "wall_s": round(self.wall, 3),
+            "task_s": round(sum(end - start for start, end in self.timings.values()), 3),
+            "critical_path": path,
+            "critical_path_s": round(seconds, 3),
+        }
+
+
+# -- sub-questions ------------------------------------------------------------
+
+
+class Branch:
+    """One model parameter and the sub-questions that inform its value."""
+
+    def __init__(self, parameter, questions=None) -> None:
+        self.parameter = parameter
+        self.questions = list(questions or [])
+
+    def __repr__(self):
+        return f"Branch({self.parameter!r}, {self.questions!r})"
+
+
+GENERAL = "general"
+
+_MARKER = re.compile(r"^\s*(?:#{1,6}\s*|>\s*|(?:[-*+•]|\(?\d+[.)]|\(?[a-zA-Z][.)])\s+)*")
+_EMPHASIS = re.compile(r"\*\*|__|`")
+# Labels that introduce a list rather than name a parameter.
+_LABEL = re.compile(r"^(?:sub-?\s*questions?|questions?|search strateg(?:y|ies)|strateg(?:y|ies)|"
+                    r"parameters?(?: list)?|list of .*|steps?|instructions?|notes?|sources?|"
+                    r"(?:sub-?\s*)?question\s*\d*|q\d+)$", re.IGNORECASE)
+_PARAMETER_PREFIX = re.compile(r"^(?:model\s+)?(?:parameter|choice|config(?:uration)?(?: file)?)\s*\d*\s*[:\-]\s*",
+                               re.IGNORECASE)
+_QUESTION_KEYS = ("questions", "sub_questions", "sub-questions", "subquestions", "subQuestions")
+
+
+def _clean(line):
+    return _EMPHASIS.sub("", _MARKER.sub("", line)).strip()
+
+
+def _parameter_name(text):
+    name = _PARAMETER_PREFIX.sub("", text.strip().rstrip(":").strip())
+    if not name or _LABEL.match(name) or len(name) > 80:
+        return None
+    return name
+
+
+def _from_json(value):
+    """Branches from {"param": [questions]} or [{"parameter", "questions"}], or None."""
+    branches = []
+    if isinstance(value, dict):
+        items = list(value.items())
+        if any(isinstance(v, list) for k, v in items if k in ("parameters", "branches")):
+            return _from_json(next(v for k, v in items if k in ("parameters", "branches")))
+        for key, questions in items:
+            if not (isinstance(questions, list) and questions and all(isinstance(q, str) for q in questions)):
+                return None
+            branches.append(Branch(key, questions))
+    elif isinstance(value, list):
+        for item in value:
+            if not isinstance(item, dict):
+                return None
+            name = item.get("parameter") or item.get("name")
+            questions = next((item[k] for k in _QUESTION_KEYS if isinstance(item.get(k), list)), None)
+            if not name or not questions:
+                return None
+            branches.append(Branch(str(name), [str(q) for q in questions]))
+    else:
+        return None
+    if not any("?" in q for b in branches for q in b.questions):
+        return None
+    return branches
+
+
+def _json_branches(text):
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except ValueError:
+            continue
+        branches = _from_json(value)
+        if branches:
+            return branches
+    return None
+
+
+def _text_branches(text):
+    branches, current = [], None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith(("{", "}", "[", "]", '"')):
+            continue
+        cleaned = _clean(stripped)
+        if not cleaned:
+            continue
+        if "?" in cleaned:
+            question = cleaned
+            prefix, colon, rest = cleaned.partition(":")
+            if colon and "?" not in prefix and "?" in rest:
+                name = _parameter_name(prefix)
+                if name is not None and len(prefix) <= 60:
+                    current = name
+                question = rest.strip()
+            if "?" in question:
+                branches.append((current or GENERAL, question))
+            continue
+        # A heading: marked up, bold, ending in a colon or starting with
+        # "Parameter N:", and short.
+        headed = (stripped != cleaned or stripped.endswith(":") or _PARAMETER_PREFIX.match(cleaned)) \
+            and len(cleaned) <= 80
+        if headed and not cleaned.endswith("."):
+            name = _parameter_name(cleaned)
+            if name is not None:
+                current = name
+    return branches
+
+
+def parse_subquestions(text):
+    """[Branch] from task1's output, in order of first appearance.
+
+    JSON ({"parameter": [questions]} or [{"parameter", "questions"}]) is
+    used if present. Otherwise questions (lines with "?") are grouped under
+    the closest heading, bold line, "name:" or "Parameter N: name" line
+    above them; questions before any heading go into a "general" branch.
+    Parameters are merged case-insensitively and repeated questions dropped.
+    """
+    found = _json_branches(text)
+    pairs = ([(b.parameter, q) for b in found for q in b.questions] if found is not None
+             else _text_branches(text))
+    branches = {}
+    for parameter, question in pairs:
+        branch = branches.setdefault(parameter.lower(), Branch(parameter))
+        if question not in branch.questions:
+            branch.questions.append(question)
+    return list(branches.values())
+
+
+# -- the PRISMA_test DAG --------------------------------------------------------
+
+
+def _text(reply):
+    if isinstance(reply, dict):
+        return reply.get("response", "")
+    return getattr(reply, "content", reply)
+
+
+def answer_prompt(branch, evidence, context=""):
+    questions = "\n".join(f"- {q}" for q in branch.questions)
+    parts = [f'You are estimating the agent-based model parameter "{branch.parameter}".']
+    if context:
+        parts.append(f"Context:\n{context}")
+    parts.append(f"Sub-questions:\n{questions}")
+    if evidence:
+        parts.append("Search results:\n" + "\n\n".join(evidence))
+    parts.append("Answer each sub-question from the search results, citing them by DOI, PMID or URL. "
+                 f"End with a suggested value or range for {branch.parameter} and how sure you are of it.")
+    return "\n\n".join(parts)
+
+
+def join_answers(branches, answers):
+    """One document of per-parameter answers, in branch order."""
+    sections = []
+    for branch in branches:
+        answer = answers.get(branch.parameter)
+        sections.append(f"## {branch.parameter}\n"
+                        + (answer if answer is not None else "(no answer: this branch failed)"))
+    return "\n\n".join(sections)
+
+
+def build_dag(branches, llm, search=None, context=""):
+    """TaskDAG of search, answer and join tasks for the branches.
+
+    llm needs invoke(prompt); search, if given, run(query) -> text (a
+    FederatedSearch or LiteratureSearchTool).
+    """
+    dag = TaskDAG()
+    answer_names = {}
+    for branch in branches:
+        searches = []
+        if search is not None:
+            for i, question in enumerate(branch.questions):
+                searches.append(dag.add(f"search:{branch.parameter}:{i}",
+                                        lambda inputs, q=question: search.run(q)))
+
+        def answer(inputs, branch=branch, searches=searches):
+            evidence = [f"Q: {q}\n" + (inputs[name] if name in inputs else "(search failed)")
+                        for q, name in zip(branch.questions, searches)]
+            return _text(llm.invoke(answer_prompt(branch, evidence, context)))
+
+        # Answer even if some searches failed, with the evidence that came back.
+        answer_names[branch.parameter] = dag.add(f"answer:{branch.parameter}", answer, searches, tolerant=True)
+
+    def join(inputs):
+        return join_answers(branches, {p: inputs.get(name) for p, name in answer_names.items()})
+
+    dag.add("join", join, list(answer_names.values()), tolerant=True)
+    return dag
+
+
+def answer_subquestions(branches, llm, search=None, workers=4, context=""):
+    """Run build_dag(); returns (joined answers, the TaskDAG)."""
+    dag = build_dag(branches, llm, search, context)
+    with tracing.span("dag", branches=len(branches), workers=workers):
+        results = dag.run(workers)
+    return results["join"], dag
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer task1's sub-questions in parallel, branch by branch.")
+    parser.add_argument("plan", help="file with task1's output ('-' for stdin)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--url", default=None, help="Argo chat URL (e.g. a mock_argo.py server)")
+    parser.add_argument("--search", action="store_true", help="search with FederatedSearch before answering")
+    parser.add_argument("--context", default="", help="e.g. the user query")
+    parser.add_argument("--dry-run", action="store_true", help="only print the parsed branches")
+    args = parser.parse_args()
+
+    text = sys.stdin.read() if args.plan == "-" else open(args.plan, encoding="utf-8").read()
+    branches = parse_subquestions(text)
+    if args.dry_run:
+        print(json.dumps([{"parameter": b.parameter, "questions": b.questions} for b in branches], indent=2))
+        return
+
+    from ARGO import ArgoWrapper
+    from CustomLLM import ARGO_LLM
+
+    llm = ARGO_LLM(argo=ArgoWrapper(url=args.url))
+    search = None
+    if args.search:
+        from federated_search import FederatedSearch
+        search = FederatedSearch()
+    answers, dag = answer_subquestions(branches, llm, search, args.workers, args.context)
+    print(answers)
+    print(json.dumps(dag.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
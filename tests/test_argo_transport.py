@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import tracing
+from argo_limiter import ArgoLimiter
+from argo_transport import ArgoTransport
+from mock_argo import MockArgoServer
+
+
+def payload(prompt="hello"):
+    return {"model": "gpt4", "temperature": 0, "system": "", "prompt": [prompt]}
+
+
+def in_flight(transport):
+    return transport.limiter.for_model("gpt4").stats()["in_flight"]
+
+
+def test_stream_holds_limiter_slot_until_exhausted():
+    transport = ArgoTransport(limiter=ArgoLimiter(), single_flight=None)
+    with MockArgoServer(latency=0.0, response_chars=256, stream_chunk=16) as server:
+        pieces = transport.stream(server.stream_url, payload())
+        first = next(pieces)
+        assert in_flight(transport) == 1
+        text = first + "".join(pieces)
+        assert in_flight(transport) == 0
+        assert len(text) == 256
+    limiter = transport.limiter.for_model("gpt4")
+    assert limiter.stats()["successes"] == 1
+    transport.close()
+
+
+def test_abandoned_stream_releases_limiter_slot():
+    transport = ArgoTransport(limiter=ArgoLimiter(), single_flight=None)
+    with MockArgoServer(latency=0.0, response_chars=256, stream_chunk=16) as server:
+        pieces = transport.stream(server.stream_url, payload())
+        next(pieces)
+        pieces.close()
+        assert in_flight(transport) == 0
+    transport.close()
+
+
+def test_async_stream_holds_limiter_slot_until_exhausted():
+    transport = ArgoTransport(limiter=ArgoLimiter(), single_flight=None)
+
+    async def main():
+        seen = []
+        try:
+            async for piece in transport.astream(server.stream_url, payload()):
+                seen.append(in_flight(transport))
+        finally:
+            await transport.aclose()
+        return seen
+
+    with MockArgoServer(latency=0.0, response_chars=256, stream_chunk=16) as server:
+        seen = asyncio.run(main())
+    assert seen and set(seen) == {1}
+    assert in_flight(transport) == 0
+
+
+def llm_spans(path):
+    with open(path) as f:
+        return [s for s in map(json.loads, f) if s["type"] == "span" and s["name"] == "llm"]
+
+
+def test_stream_stopped_early_is_traced(tmp_path):
+    tracing.enable(str(tmp_path / "trace.jsonl"))
+    transport = ArgoTransport(limiter=None, single_flight=None)
+    try:
+        with MockArgoServer(latency=0.0, response_chars=256, stream_chunk=16) as server:
+            pieces = transport.stream(server.stream_url, payload())
+            next(pieces)
+            pieces.close()
+            assert "".join(transport.stream(server.stream_url, payload())) != ""
+    finally:
+        tracing.disable()
+        transport.close()
+    early, full = llm_spans(tmp_path / "trace.jsonl")
+    assert early["attrs"]["error"] == "GeneratorExit"
+    assert 0 < early["attrs"]["response_chars"] < 256
+    assert "error" not in full["attrs"] and full["attrs"]["response_chars"] == 256
+
+
+def test_async_stream_stopped_early_is_traced(tmp_path):
+    tracing.enable(str(tmp_path / "trace.jsonl"))
+    transport = ArgoTransport(limiter=None, single_flight=None)
+
+    async def main():
+        pieces = transport.astream(server.stream_url, payload())
+        try:
+            await pieces.__anext__()
+            await pieces.aclose()
+        finally:
+            await transport.aclose()
+
+    try:
+        with MockArgoServer(latency=0.0, response_chars=256, stream_chunk=16) as server:
+            asyncio.run(main())
+    finally:
+        tracing.disable()
+    [early] = llm_spans(tmp_path / "trace.jsonl")
+    assert early["attrs"]["error"] == "GeneratorExit"
+    assert early["attrs"]["stream"] is True
@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+
+import pytest
+
+from arxiv_cache import ArxivCache, CachedArxivLoader, CachedArxivRetriever, LocalCorpus
+
+PAPERS = {
+    "2101.00001": ("Deep learning for antibiotic discovery", "We screen molecules with a neural network."),
+    "2101.00002": ("Zika transmission in Aedes mosquitoes", "Estimates of the extrinsic incubation period."),
+    "2101.00003": ("Dengue serial interval", "Household data on dengue transmission."),
+    "q-bio_0601001": ("Antibiotic resistance models", "Agent based models of resistance spread."),
+}
+
+
+class CountingCorpus(LocalCorpus):
+    def __init__(self, path):
+        super().__init__(path)
+        self.searches = 0
+        self.fetches = 0
+
+    def search(self, query, max_results):
+        self.searches += 1
+        return super().search(query, max_results)
+
+    def fetch(self, paper, directory):
+        self.fetches += 1
+        return super().fetch(paper, directory)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "corpus"
+    path.mkdir()
+    for paper_id, (title, summary) in PAPERS.items():
+        (path / f"{paper_id}.json").write_text(json.dumps({"Title": title, "Summary": summary}))
+        (path / f"{paper_id}.txt").write_text(f"{title}\n\n{summary}\n" + "body " * 200)
+    return CountingCorpus(str(path))
+
+
+def make_cache(tmp_path, corpus, **kwargs):
+    return ArxivCache(str(tmp_path / "cache"), source=corpus, **kwargs)
+
+
+def test_query_results_and_papers_are_cached(tmp_path, corpus):
+    cache = make_cache(tmp_path, corpus)
+    first = cache.search("antibiotic discovery", 2)
+    assert [i for i, _ in first] == ["2101.00001", "q-bio/0601001"]
+    assert corpus.searches == 1 and corpus.fetches == 2
+
+    docs = CachedArxivLoader("antibiotic discovery", 2, cache=cache).load()
+    assert corpus.searches == 1 and corpus.fetches == 2
+    assert docs[0].page_content.startswith("Deep learning for antibiotic discovery")
+    assert docs[1].metadata["Title"] == "Antibiotic resistance models"
+    stats = cache.stats()
+    assert stats["query_hits"] == 1 and stats["hits"] == 2 and stats["papers"] == 2
+
+
+def test_expired_query_is_searched_again(tmp_path, corpus):
+    cache = make_cache(tmp_path, corpus, query_ttl=0.05)
+    cache.search("dengue", 1)
+    time.sleep(0.1)
+    cache.search("dengue", 1)
+    assert corpus.searches == 2
+    assert corpus.fetches == 1
+
+
+def test_offline_answers_from_disk(tmp_path, corpus):
+    make_cache(tmp_path, corpus).search("zika transmission", 1)
+    corpus.searches = corpus.fetches = 0
+
+    offline = make_cache(tmp_path, corpus, offline=True)
+    assert [i for i, _ in offline.search("zika transmission", 1)] == ["2101.00002"]
+    # Unknown query: keyword match over what is on disk.
+    assert [i for i, _ in offline.search("aedes incubation", 3)] == ["2101.00002"]
+    assert offline.search("antibiotic", 3) == []
+    assert corpus.searches == 0 and corpus.fetches == 0
+
+
+def test_least_recently_used_papers_are_evicted(tmp_path, corpus):
+    cache = make_cache(tmp_path, corpus)
+    cache.search("zika", 1)
+    size = cache.stats()["bytes"]
+    cache.max_bytes = int(2.5 * size)
+    cache.search("dengue", 1)
+    cache.get(["2101.00002"])           # zika is now the most recent
+    cache.search("antibiotic discovery", 1)
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["papers"] == 2
+    assert not (tmp_path / "cache" / "papers" / "2101.00003").exists()
+    assert [i for i, _ in cache.get(["2101.00002"])] == ["2101.00002"]
+
+
+def test_retriever_fetches_pdfs_only_for_full_text(tmp_path, corpus):
+    cache = make_cache(tmp_path, corpus)
+    summaries = CachedArxivRetriever(cache=cache, load_max_docs=2).invoke("dengue transmission")
+    assert [d.metadata["Title"] for d in summaries] == ["Dengue serial interval",
+                                                       "Zika transmission in Aedes mosquitoes"]
+    assert summaries[0].page_content == "Household data on dengue transmission."
+    assert corpus.fetches == 0
+
+    full = CachedArxivRetriever(cache=cache, load_max_docs=2, get_full_documents=True).invoke(
+        "dengue transmission")
+    assert corpus.searches == 1 and corpus.fetches == 2
+    assert full[0].page_content.startswith("Dengue serial interval\n\nHousehold")
+
+
+def test_failed_fetch_is_logged_and_skipped(tmp_path, corpus, caplog):
+    (tmp_path / "corpus" / "2101.00003.txt").unlink()
+    cache = make_cache(tmp_path, corpus)
+    with caplog.at_level(logging.WARNING, logger="arxiv_cache"):
+        results = cache.search("dengue transmission", 3)
+    assert [i for i, _ in results] == ["2101.00002"]
+    assert "could not fetch arXiv paper 2101.00003" in caplog.text
+    assert cache.stats()["failures"] == 1
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Vectors from the text length; counts the texts it is asked to embed."""
+
+    model = "counting"
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_langchain_methods_return_lists(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), str(tmp_path))
+    vectors = cache.embed_documents(["one", "three"])
+    assert isinstance(vectors, list)
+    assert all(isinstance(v, list) and all(isinstance(x, float) for x in v) for v in vectors)
+    assert vectors == [[3.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    query = cache.embed_query("one")
+    assert query == [3.0, 1.0, 0.5]
+    assert cache.embed_documents([]) == []
+
+
+def test_encode_returns_array_and_computes_misses_once(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, str(tmp_path))
+    assert cache.model_name == "counting"
+    first = cache.encode(["a", "bb", "a"])
+    assert isinstance(first, np.ndarray) and first.dtype == np.float32 and first.shape == (3, 3)
+    assert inner.embedded == 2
+    cache.encode(["bb", "  a "])
+    assert inner.embedded == 2
+    assert cache.stats()["memory_hits"] == 2
+
+    reopened = CachedEmbeddings(inner, str(tmp_path))
+    np.testing.assert_array_equal(reopened.encode(["a", "bb"]), first[:2])
+    assert inner.embedded == 2
+    assert reopened.stats()["disk_hits"] == 2
+
+
+class WideEmbeddings(CountingEmbeddings):
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[1.0] * 5 for _ in texts]
+
+
+def test_reopening_with_another_model_or_dtype_is_refused(tmp_path):
+    CachedEmbeddings(CountingEmbeddings(), str(tmp_path)).encode(["a"])
+    with pytest.raises(ValueError, match="'counting', not 'other'"):
+        CachedEmbeddings(CountingEmbeddings(), str(tmp_path), model_name="other")
+    with pytest.raises(ValueError, match="stores float32, not float16"):
+        CachedEmbeddings(CountingEmbeddings(), str(tmp_path), dtype="float16")
+    assert CachedEmbeddings(CountingEmbeddings(), str(tmp_path)).dtype == np.float32
+
+
+def test_vectors_of_another_width_are_not_appended(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), str(tmp_path))
+    cache.encode(["a"])
+    size = (tmp_path / "vectors.bin").stat().st_size
+    # Same model name, different width (e.g. a changed model behind one name).
+    wide = CachedEmbeddings(WideEmbeddings(), str(tmp_path))
+    with pytest.raises(ValueError, match="3-dimensional vectors, got shape \\(1, 5\\)"):
+        wide.encode(["b"])
+    assert (tmp_path / "vectors.bin").stat().st_size == size
+    assert len(CachedEmbeddings(CountingEmbeddings(), str(tmp_path))) == 1
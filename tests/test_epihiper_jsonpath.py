@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from epihiper_validator import EpiHiperValidator, jsonpath, jsonpath_nodes
+
+CONFIG = {
+    "states": [{"id": "S", "infectivity": 0.0}, {"id": "I", "infectivity": 1.0}],
+    "transitions": [{"id": "SE", "probability": 0.4, "entryState": "S"},
+                    {"id": "SI", "probability": 0.6, "entryState": "S"}],
+    "transmissibility": 0.3,
+}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("$.transmissibility", [0.3]),
+    ("$.states[*].id", ["S", "I"]),
+    ("$.states.*.id", ["S", "I"]),
+    ("$['transitions'][1].probability", [0.6]),
+    ("$..probability", [0.4, 0.6]),
+    ('$.transitions[?(@.id == "SI")].probability', [0.6]),
+    ("$.transmissibility[*]", []),
+])
+def test_jsonpath_subset(path, expected):
+    assert jsonpath(CONFIG, path) == expected
+
+
+def test_wildcard_index_locations():
+    assert [loc for loc, _ in jsonpath_nodes(CONFIG, "$.transitions[*].probability")] == [
+        ("transitions", 0, "probability"), ("transitions", 1, "probability")]
+
+
+def test_unsupported_path_lists_the_subset():
+    with pytest.raises(ValueError, match=r"supported: .*\[\*\]"):
+        jsonpath(CONFIG, "$.transitions[0:2].probability")
+
+
+def test_ensemble_cli_reports_unsupported_path(tmp_path):
+    base = tmp_path / "diseaseModel.json"
+    base.write_text('{"transmissibility": 0.3}')
+    result = subprocess.run([sys.executable, "epihiper_ensemble.py", str(base), "-n", "2",
+                             "--out", str(tmp_path / "sweep"), "--path", "$.states[-1].id",
+                             "--distribution", "fixed", "--value", "1"],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode == 2
+    assert "Traceback" not in result.stderr
+    assert "unsupported JSONPath '$.states[-1].id' (supported:" in result.stderr
+
+
+def disease_model(**transition):
+    return {"states": [{"id": "S", "susceptibility": 1, "infectivity": 0},
+                       {"id": "I", "susceptibility": 0, "infectivity": 1}],
+            "initialState": "S", "transmissions": [],
+            "transitions": [dict({"id": "t", "entryState": "S", "exitState": "I", "probability": 1,
+                                  "dwellTime": {"fixed": 1}}, **transition)]}
+
+
+def probability_errors(instance):
+    rules = EpiHiperValidator().rules("diseaseModelRules.json")
+    return [e for e in rules.validate(instance) if e.get("pattern") == "ProbabilityCheck"]
+
+
+def test_probability_rule():
+    assert probability_errors(disease_model()) == []
+    [error] = probability_errors(disease_model(probability=0.5))
+    assert error["message"] == "State[S]: The sum of the probability of all exit transitions must be 1."
+
+
+def test_malformed_data_fails_the_rule_not_the_batch():
+    [error] = probability_errors(disease_model(probability="0.5"))
+    assert error["kind"] == "rule" and error["message"].startswith("cannot evaluate for S: ")
+
+    broken = disease_model()
+    broken["states"][0]["id"] = 'S")]'
+    errors = probability_errors(broken)
+    assert [e["message"] for e in errors] == [
+        "cannot evaluate for S\")]: unsupported JSONPath "
+        "'$..transitions[?(@.entryState == \"S\")]\")].probability' (supported: "
+        + "$, .name, ..name, .*, ..*, [*], [n], ['name'] and [?(@.name == \"value\")])"]
@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from federated_search import FederatedSearch, LocalBackend, SearchCache, merge_results, normalize_url
+
+WEB = [
+    {"title": "Zika incubation period", "url": "https://doi.org/10.1000/ZIKA.1"},
+    {"title": "Dengue outbreak news", "url": "https://www.example.org/dengue/?utm_source=feed"},
+]
+PUBMED = [
+    {"title": "Zika incubation period (PubMed)", "pmid": "123", "doi": "10.1000/zika.1",
+     "url": "https://pubmed.ncbi.nlm.nih.gov/123/", "abstract": "We estimate the incubation period."},
+    {"title": "Dengue serial interval", "url": "https://pubmed.ncbi.nlm.nih.gov/456/"},
+]
+SCHOLAR = [
+    {"title": "Dengue serial interval", "pmid": "456", "url": "https://www.semanticscholar.org/paper/abc"},
+    {"title": "Dengue outbreak news", "url": "http://example.org/dengue"},
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SearchCache(str(tmp_path / "results.sqlite"), ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_merge_dedups_by_doi_pmid_and_url():
+    merged = merge_results([("web", WEB), ("pubmed", PUBMED), ("scholar", SCHOLAR)])
+    assert len(merged) == 3
+    by_title = {r["title"]: r for r in merged}
+    zika = by_title["Zika incubation period"]
+    assert zika["doi"] == "10.1000/zika.1"
+    assert zika["pmid"] == "123"
+    assert zika["abstract"] == "We estimate the incubation period."
+    assert zika["sources"] == ["web", "pubmed"]
+    # PMID from the PubMed URL on one side, a pmid field on the other.
+    assert by_title["Dengue serial interval"]["sources"] == ["pubmed", "scholar"]
+    # Scheme, "www.", tracking parameters and the trailing "/" do not matter.
+    assert by_title["Dengue outbreak news"]["sources"] == ["web", "scholar"]
+
+
+def test_merge_links_groups_through_a_result_with_both_ids():
+    merged = merge_results([("a", [{"title": "by doi", "doi": "10.1234/x"}]),
+                            ("b", [{"title": "by pmid", "pmid": "9"}]),
+                            ("c", [{"title": "both", "doi": "10.1234/X", "pmid": "9"}])])
+    assert len(merged) == 1
+    assert merged[0]["sources"] == ["a", "b", "c"]
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://www.Example.org/a/?utm_medium=x&id=3#top") == "example.org/a?id=3"
+
+
+def test_backends_run_concurrently(cache):
+    backends = [LocalBackend(name, results, delay=0.3)
+                for name, results in (("web", WEB), ("pubmed", PUBMED), ("scholar", SCHOLAR))]
+    search = FederatedSearch(backends, cache=cache)
+    start = time.perf_counter()
+    merged = search.search("zika dengue incubation serial outbreak")
+    assert time.perf_counter() - start < 0.6
+    assert len(merged) == 3
+
+
+def test_results_are_cached_until_ttl(tmp_path):
+    cache = SearchCache(str(tmp_path / "results.sqlite"), ttl=0.2)
+    backend = LocalBackend("pubmed", PUBMED)
+    search = FederatedSearch([backend], cache=cache)
+    search.search("zika")
+    search.search("zika")
+    assert backend.calls == 1
+    assert cache.stats()["hits"] == 1
+    time.sleep(0.3)
+    search.search("zika")
+    assert backend.calls == 2
+    assert cache.expire() == 0
+
+
+def test_failures_and_timeouts_are_reported_and_not_cached(cache):
+    backends = [LocalBackend("pubmed", PUBMED), LocalBackend("down", PUBMED, fail=True),
+                LocalBackend("slow", PUBMED, delay=1.0)]
+    search = FederatedSearch(backends, cache=cache, timeout=0.2)
+    each = {name: (results, error) for name, results, error in search.search_each("zika")}
+    assert each["pubmed"][1] is None and each["pubmed"][0]
+    assert each["down"] == (None, "RuntimeError: down is unavailable")
+    assert each["slow"][0] is None and each["slow"][1].startswith("timed out")
+    text = search.run("zika")
+    assert "Zika incubation period" in text
+    assert "down unavailable: RuntimeError" in text
+    assert cache.get("down", "zika", 5) is None
+    assert search.stats()["errors"] == {"down": 2}
+    assert search.stats()["timeouts"]["slow"] >= 1
+
+
+class FlakyBackend(LocalBackend):
+    """Fails for queries that mention "broken"."""
+
+    def search(self, query, max_results):
+        if "broken" in query:
+            raise RuntimeError("flaky is unavailable")
+        return super().search(query, max_results)
+
+
+def test_concurrent_runs_report_their_own_errors():
+    search = FederatedSearch([LocalBackend("pubmed", PUBMED), FlakyBackend("flaky", SCHOLAR)], cache=False)
+    queries = [f"{'broken' if i % 2 else 'fine'} dengue {i}" for i in range(400)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        texts = list(pool.map(search.run, queries))
+    for query, text in zip(queries, texts):
+        assert ("flaky unavailable" in text) == ("broken" in query)
@@ -0,0 +1,54 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from hybrid_retriever import HybridRetriever
+from local_vectorstore import LocalVectorStore
+
+DOCS = {
+    "alpha transmission in mosquitoes": [1.0, 0.0],
+    "beta transmission in ticks": [0.95, 0.05],
+    "gamma incubation in humans": [0.9, 0.1],
+    "delta recovery in humans": [0.85, 0.15],
+    "epsilon serial interval": [0.8, 0.2],
+    "a new strain was reported": [0.0, 1.0],
+}
+
+
+class TableEmbeddings(Embeddings):
+    """Fixed vectors per text; queries point at the first documents, away
+    from the only one that contains the query term."""
+
+    def embed_documents(self, texts):
+        return [DOCS[t] for t in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+def make_retriever(tmp_path, k):
+    store = LocalVectorStore(str(tmp_path / "store"), embedding=TableEmbeddings())
+    store.add_texts(list(DOCS), ids=[f"d{i}" for i in range(len(DOCS))])
+    return HybridRetriever(store=store, k=k)
+
+
+def test_fewer_lexical_matches_than_k_are_kept(tmp_path):
+    for k in (1, 4):
+        results = make_retriever(tmp_path / str(k), k).search("new")
+        texts = [record["text"] for record, _ in results]
+        assert len(texts) == k
+        assert "a new strain was reported" in texts
+
+
+def test_padding_comes_from_dense_hits_without_duplicates(tmp_path):
+    results = make_retriever(tmp_path, 4).search("new humans")
+    ids = [record["id"] for record, _ in results]
+    assert len(ids) == len(set(ids)) == 4
+    assert {"d2", "d3", "d5"} <= set(ids)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_query_without_indexed_terms_is_dense(tmp_path):
+    results = make_retriever(tmp_path, 2).search("zzz")
+    assert [record["id"] for record, _ in results] == ["d0", "d1"]
+    assert np.isclose(results[0][1], 1.0)
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+from local_vectorstore import LocalVectorStore
+
+VECTORS = {"a": [1.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [0.0, 0.0, 1.0], "d": [0.7, 0.7, 0.0]}
+
+
+def add(store, *ids):
+    return store.add_embeddings([f"text {i}" for i in ids], [VECTORS[i] for i in ids], ids=list(ids))
+
+
+def live_ids(store):
+    return [record["id"] for _, record in store.records()]
+
+
+def crash(store):
+    # Appended bytes reach the files, but meta.json is never rewritten.
+    for f in store._files.values():
+        f.flush()
+    store._files = {}
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_search_and_reopen(tmp_path, dtype):
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    add(store, "a", "b", "c")
+    [(record, score)] = store.search_vector([0.9, 0.1, 0.0], k=1)
+    assert record["id"] == "a" and record["text"] == "text a"
+    store.close()
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert len(reopened) == 3
+    assert [r["id"] for r, _ in reopened.search_vector([0.0, 0.1, 0.9], k=2)] == ["c", "b"]
+
+
+def test_replace_and_delete_by_id(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    add(store, "a", "b")
+    store.add_embeddings(["new a"], [VECTORS["c"]], ids=["a"])
+    assert live_ids(store) == ["b", "a"]
+    store.delete(["b"])
+    store.close()
+    reopened = LocalVectorStore(str(tmp_path))
+    assert live_ids(reopened) == ["a"]
+    assert reopened.record(2)["text"] == "new a"
+
+
+def test_rows_appended_after_the_last_flush_are_dropped(tmp_path):
+    store = LocalVectorStore(str(tmp_path), autoflush=False)
+    add(store, "a", "b")
+    store.flush()
+    add(store, "c")
+    crash(store)
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert len(reopened) == 2
+    add(reopened, "d")
+    assert reopened._id_rows() == {"a": 0, "b": 1, "d": 2}
+    reopened.close()
+
+    again = LocalVectorStore(str(tmp_path))
+    assert again._id_rows() == {"a": 0, "b": 1, "d": 2}
+    again.delete(["d"])
+    again.add_embeddings(["b again"], [VECTORS["b"]], ids=["b"])
+    assert live_ids(again) == ["a", "b"]
+    assert again.record(3)["text"] == "b again"
+
+
+def test_store_without_ids_bytes_in_meta(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    add(store, "a", "b")
+    store.close()
+    meta_path = tmp_path / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    del meta["ids_bytes"]
+    meta_path.write_text(json.dumps(meta))
+    with open(tmp_path / "ids.txt", "a") as f:
+        f.write("stale\n")
+
+    reopened = LocalVectorStore(str(tmp_path))
+    add(reopened, "c")
+    assert reopened._id_rows() == {"a": 0, "b": 1, "c": 2}
+
+
+def test_ivf_index_finds_neighbours(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 8)).astype(np.float32)
+    store = LocalVectorStore(str(tmp_path), min_train=100, nprobe=4)
+    store.add_embeddings([str(i) for i in range(500)], vectors, ids=[str(i) for i in range(500)])
+    assert store.meta["nlist"] > 0
+    [(record, _)] = store.search_vector(vectors[123], k=1)
+    assert record["id"] == "123"
@@ -0,0 +1,41 @@
+import json
+
+from schema_context import SchemaContextBuilder
+from schema_registry import SchemaRegistry
+
+QUERY = "Model the current flavivirus outbreak using an agent based model"
+
+
+def test_optional_properties_are_kept():
+    context, report = SchemaContextBuilder().build("diseaseModelSchema.json", QUERY)
+    lines = context.splitlines()
+    assert any(line.startswith("transmissibility: ") for line in lines)
+    assert "transmissibility" in report["fragments"]
+    assert set(report) == {"schema", "tokens_before", "tokens_after", "fragments", "named_only"}
+    assert report["tokens_after"] < report["tokens_before"]
+
+
+def test_budget_drops_unmatched_optional_properties_first():
+    builder = SchemaContextBuilder()
+    _, full = builder.build("diseaseModelSchema.json", QUERY)
+    assert full["fragments"][-1] == "transmissibility"
+    _, report = builder.build("diseaseModelSchema.json", QUERY, max_tokens=full["tokens_after"] - 10)
+    assert "transmissibility" in report["named_only"]
+    assert report["fragments"] == full["fragments"][:-1]
+    _, matched = builder.build("diseaseModelSchema.json", "transmissibility of flavivirus")
+    assert matched["fragments"].index("transmissibility") < matched["fragments"].index("uniqueId")
+
+
+def test_empty_definitions_are_fragments(tmp_path):
+    schemas = tmp_path / "schema"
+    schemas.mkdir()
+    (schemas / "typeRegistry.json").write_text(json.dumps({
+        "definitions": {"anything": {}, "rate": {"type": "number", "minimum": 0}}}))
+    (schemas / "toySchema.json").write_text(json.dumps({
+        "title": "Toy", "type": "object", "required": ["growth", "payload"],
+        "properties": {"growth": {"$ref": "./typeRegistry.json#/definitions/rate"},
+                       "payload": {"$ref": "./typeRegistry.json#/definitions/anything"}}}))
+    registry = SchemaRegistry(str(schemas), index_path=str(tmp_path / "index.json"))
+    context, report = SchemaContextBuilder(registry).build("toySchema.json", "toy")
+    assert report["fragments"] == ["growth", "payload", "rate", "anything"]
+    assert "anything: {}" in context.splitlines()
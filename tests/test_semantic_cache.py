@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from argo_transport import ArgoTransport
+from mock_argo import MockArgoServer
+from semantic_cache import SemanticCache
+
+URL = "http://argo.invalid/api/v1/resource/chat/"
+
+
+class WordEmbeddings(Embeddings):
+    """Bag-of-words vectors over a tiny vocabulary; records calling threads."""
+
+    vocab = ["incubation", "period", "zika", "dengue", "recovery", "rate"]
+
+    def __init__(self):
+        self.calls = 0
+        self.threads = set()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        words = text.lower().split()
+        return [float(words.count(w)) for w in self.vocab]
+
+
+def payload(prompt):
+    return {"model": "gpt4", "temperature": 0, "system": "", "prompt": [prompt]}
+
+
+def test_empty_cache_does_not_embed():
+    embeddings = WordEmbeddings()
+    cache = SemanticCache(embeddings)
+    assert cache.get(URL, payload("zika incubation period")) is None
+    assert embeddings.calls == 0
+
+
+def test_miss_then_put_embeds_once():
+    embeddings = WordEmbeddings()
+    cache = SemanticCache(embeddings)
+    cache.put(URL, payload("zika incubation period"), {"response": "3-14 days"})
+    assert embeddings.calls == 1
+
+    assert cache.get(URL, payload("dengue recovery rate")) is None
+    cache.put(URL, payload("dengue recovery rate"), {"response": "1/7 per day"})
+    assert embeddings.calls == 2
+
+    assert cache.get(URL, payload("  zika   incubation period")) == {"response": "3-14 days"}
+    assert cache.get(URL, payload("period zika incubation")) == {"response": "3-14 days"}
+    assert embeddings.calls == 3
+    assert cache.stats()["hits"] == 2
+
+
+def test_context_must_match():
+    cache = SemanticCache(WordEmbeddings())
+    cache.put(URL, payload("zika incubation period"), {"response": "3-14 days"})
+    other = dict(payload("zika incubation period"), model="gpt35")
+    assert cache.get(URL, other) is None
+
+
+def test_async_request_embeds_off_the_event_loop():
+    embeddings = WordEmbeddings()
+    cache = SemanticCache(embeddings)
+
+    async def main():
+        transport = ArgoTransport(limiter=None)
+        try:
+            first = await transport.arequest(server.url, payload("zika incubation period"),
+                                             semantic_cache=cache)
+            second = await transport.arequest(server.url, payload("period zika incubation"),
+                                              semantic_cache=cache)
+        finally:
+            await transport.aclose()
+        return first, second, threading.get_ident()
+
+    with MockArgoServer(latency=0.0, response_chars=40) as server:
+        first, second, loop_thread = asyncio.run(main())
+    assert first == second
+    assert server.stats()["requests"] == 1
+    assert embeddings.calls == 2
+    assert loop_thread not in embeddings.threads
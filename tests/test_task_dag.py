@@ -0,0 +1,110 @@
+from task_dag import GENERAL, Branch, answer_subquestions, parse_subquestions
+
+
+def as_dict(branches):
+    return {b.parameter: b.questions for b in branches}
+
+
+def test_markdown_headings_bold_and_colon_lines():
+    text = """Here is my plan.
+What pathogen is modelled?
+
+## Transmissibility
+1. What is the basic reproduction number of Zika?
+2. How does R0 vary by region?
+
+**Incubation period**
+- What is the intrinsic incubation period?
+
+Recovery rate:
+* How long are patients infectious?
+"""
+    assert as_dict(parse_subquestions(text)) == {
+        GENERAL: ["What pathogen is modelled?"],
+        "Transmissibility": ["What is the basic reproduction number of Zika?",
+                             "How does R0 vary by region?"],
+        "Incubation period": ["What is the intrinsic incubation period?"],
+        "Recovery rate": ["How long are patients infectious?"],
+    }
+
+
+def test_plain_parameter_prefix_lines_are_headings():
+    text = """Parameter 1: Transmissibility
+What is R0 for dengue?
+Parameter 2 - Incubation period
+What is the extrinsic incubation period in Aedes aegypti?
+Model parameter 3: Recovery rate
+How long does viremia last?
+"""
+    assert as_dict(parse_subquestions(text)) == {
+        "Transmissibility": ["What is R0 for dengue?"],
+        "Incubation period": ["What is the extrinsic incubation period in Aedes aegypti?"],
+        "Recovery rate": ["How long does viremia last?"],
+    }
+
+
+def test_inline_name_and_labels():
+    text = """Sub-questions:
+- Transmissibility: What is R0?
+- Question 2: Is transmission seasonal?
+Notes:
+- transmissibility: What is R0?
+"""
+    assert as_dict(parse_subquestions(text)) == {
+        "Transmissibility": ["What is R0?", "Is transmission seasonal?"],
+    }
+
+
+def test_json_mapping_in_prose():
+    text = """Sure, here they are:
+```json
+{"Transmissibility": ["What is R0?", "Does R0 vary?"], "Incubation period": ["How long is it?"]}
+```"""
+    assert as_dict(parse_subquestions(text)) == {
+        "Transmissibility": ["What is R0?", "Does R0 vary?"],
+        "Incubation period": ["How long is it?"],
+    }
+
+
+def test_json_list_and_wrapped_list():
+    items = """[{"parameter": "Transmissibility", "questions": ["What is R0?"]},
+                {"name": "recovery rate", "sub_questions": ["How long is the infectious period?"]},
+                {"parameter": "transmissibility", "questions": ["What is R0?", "Is it seasonal?"]}]"""
+    expected = {
+        "Transmissibility": ["What is R0?", "Is it seasonal?"],
+        "recovery rate": ["How long is the infectious period?"],
+    }
+    assert as_dict(parse_subquestions(items)) == expected
+    assert as_dict(parse_subquestions('{"parameters": %s}' % items)) == expected
+
+
+def test_json_without_questions_falls_back_to_text():
+    text = """{"model": "SEIR"}
+## Transmissibility
+What is R0?"""
+    assert as_dict(parse_subquestions(text)) == {"Transmissibility": ["What is R0?"]}
+
+
+class EchoLLM:
+    """Returns the prompt, so tests can see what the answer node was given."""
+
+    def invoke(self, prompt):
+        return {"response": prompt}
+
+
+class FlakySearch:
+    def run(self, query):
+        if "vary" in query:
+            raise RuntimeError("search backend down")
+        return f"results for {query}"
+
+
+def test_answer_runs_when_a_search_fails():
+    branches = [Branch("Transmissibility", ["What is R0?", "Does R0 vary by region?"])]
+    answers, dag = answer_subquestions(branches, EchoLLM(), search=FlakySearch(), workers=2)
+    stats = dag.stats()
+    assert list(stats["failed"]) == ["search:Transmissibility:1"]
+    assert stats["skipped"] == []
+    assert "answer:Transmissibility" in dag.results
+    assert "results for What is R0?" in answers
+    assert "Q: Does R0 vary by region?\n(search failed)" in answers
@@ -0,0 +1,300 @@
+#
+# Lightweight tracing: nested spans, stage latency histograms, counters
+#
+# Off by default. While off, span() returns one shared no-op object and
+# record()/count()/llm_usage() return at once, so instrumented hot paths
+# pay about one attribute check. enable() (or ARC_TRACE=<file> in the
+# environment) turns it on:
+#
+#   import tracing
+#   tracing.enable("trace.jsonl")
+#   with tracing.span("retrieve", k=4) as span:
+#       ...
+#       span.set(results=len(docs))
+#   tracing.record("embed", seconds)   # a duration measured elsewhere,
+#                                      # e.g. in a worker process
+#   print(tracing.stats())
+#
+# Spans nest through a contextvar, so threads and asyncio tasks each see
+# their own current span. Each finished span adds its duration to a
+# log-bucketed histogram for its name. The stages instrumented in this repo
+# are parse, split, embed, store, retrieve and llm. Each finished span is
+# also written as one JSON line to the export file:
+#
+#   {"type": "span", "name": "llm", "id": 7, "parent": 3, "start": <epoch>,
+#    "ms": 812.4, "attrs": {"model": "gpt4", "prompt_chars": 5120, ...}}
+#
+# At exit (or on flush()) a {"type": "stats"} line with every stage's
+# count/mean/p50/p95/p99/max and all counters is appended.
+#
+
+import atexit
+import contextvars
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+# Histogram buckets grow by 2**(1/4) from 1 microsecond, up to ~18 minutes.
+_BUCKET_BASE = 1e-6
+_BUCKETS_PER_OCTAVE = 4
+_BUCKETS = 30 * _BUCKETS_PER_OCTAVE
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_ids = itertools.count(1)
+_encoding = None
+
+
+def count_tokens(text):
+    """cl100k_base token count when tiktoken is installed, else ~4 chars/token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class Histogram:
+    """Latency histogram with logarithmic buckets."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= _BUCKET_BASE:
+            bucket = 0
+        else:
+            bucket = min(_BUCKETS, int(math.log2(seconds / _BUCKET_BASE) * _BUCKETS_PER_OCTAVE) + 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                upper = _BUCKET_BASE * 2 ** (bucket / _BUCKETS_PER_OCTAVE)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": 1000.0 * self.total / self.count if self.count else 0.0,
+            "min_ms": 1000.0 * self.min if self.count else 0.0,
+            "p50_ms": 1000.0 * self.percentile(50),
+            "p95_ms": 1000.0 * self.percentile(95),
+            "p99_ms": 1000.0 * self.percentile(99),
+            "max_ms": 1000.0 * self.max,
+        }
+
+
+class _NoopSpan:
+    id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed, nestable section; use it as a context manager."""
+
+    __slots__ = ("tracer", "name", "attrs", "id", "parent", "start", "_wall", "_token")
+
+    def __init__(self, tracer, name, attrs) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_ids)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent = parent.id if parent is not None else None
+        self._token = _current.set(self)
+        self._wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        seconds = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if kind is not None:
+            self.attrs["error"] = kind.__name__
+        self.tracer._finish(self.name, seconds, self.id, self.parent, self._wall, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Add attributes to the exported span line."""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Collects spans into histograms and writes them as JSON lines."""
+
+    def __init__(self, path=None, enabled=True) -> None:
+        self.enabled = enabled
+        self.path = path
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def span(self, name, /, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def record(self, name, seconds, /, **attrs):
+        """Add a duration measured elsewhere as a finished span."""
+        if not self.enabled:
+            return
+        parent = _current.get()
+        self._finish(name, seconds, next(_ids), parent.id if parent is not None else None,
+                     time.time() - seconds, attrs)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def llm_usage(self, prompt, response):
+        """Count prompt/response characters and tokens; returns them as span attributes."""
+        if not self.enabled:
+            return {}
+        usage = {"prompt_chars": len(prompt), "response_chars": len(response),
+                 "prompt_tokens": count_tokens(prompt), "response_tokens": count_tokens(response)}
+        with self._lock:
+            self.counters["llm.calls"] = self.counters.get("llm.calls", 0) + 1
+            for key, value in usage.items():
+                self.counters[f"llm.{key}"] = self.counters.get(f"llm.{key}", 0) + value
+        return usage
+
+    def _finish(self, name, seconds, span_id, parent, wall, attrs):
+        line = None
+        if self.path is not None:
+            line = json.dumps({"type": "span", "name": name, "id": span_id, "parent": parent,
+                               "start": wall, "ms": 1000.0 * seconds, "attrs": attrs}, default=str)
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+            if line is not None:
+                self._write(line)
+
+    def _write(self, line):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(line + "\n")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stages": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def flush(self):
+        """Append a stats line to the export file."""
+        if self.path is None:
+            return
+        line = json.dumps({"type": "stats", "time": time.time(), **self.stats()})
+        with self._lock:
+            self._write(line)
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer = Tracer(enabled=False)
+
+
+def enable(path=None):
+    """Start tracing into a new process-wide Tracer; path is the JSON-lines export file."""
+    global _tracer
+    disable()
+    _tracer = Tracer(path)
+    if path is not None:
+        atexit.register(_tracer.close)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    if _tracer.enabled and _tracer.path is not None:
+        atexit.unregister(_tracer.close)
+        _tracer.close()
+    _tracer = Tracer(enabled=False)
+
+
+def tracer():
+    """The process-wide Tracer."""
+    return _tracer
+
+
+def enabled():
+    return _tracer.enabled
+
+
+def span(name, /, **attrs):
+    if not _tracer.enabled:
+        return NOOP_SPAN
+    return Span(_tracer, name, attrs)
+
+
+def record(name, seconds, /, **attrs):
+    if _tracer.enabled:
+        _tracer.record(name, seconds, **attrs)
+
+
+def count(name, value=1):
+    if _tracer.enabled:
+        _tracer.count(name, value)
+
+
+def llm_usage(prompt, response):
+    if not _tracer.enabled:
+        return {}
+    return _tracer.llm_usage(prompt, response)
+
+
+def stats():
+    return _tracer.stats()
+
+
+if os.getenv("ARC_TRACE"):
+    enable(os.getenv("ARC_TRACE"))